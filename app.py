@@ -1,55 +1,364 @@
 """
 Medilink Hospital Management System
 Main Flask Application
+
+The application is built at import: configuration (including .env) is
+loaded and every route, admin ones included, is registered, so ``app:app``
+and ``flask run`` serve the whole site. ``create_app()`` is not a factory;
+it returns this same app after warming the pool and templates, so serving
+through it has them ready before the first request:
+
+    gunicorn "app:create_app()"
+
+What is deferred is narrower: model modules are imported on first use
+(LazyModel), and controllers only a few routes need (record export and
+search) are imported inside those routes.
 """
 
+# Created ahead of the other imports so they count towards startup time
+from controllers.startup import StartupTimer, LazyModel, prewarm
+startup = StartupTimer()
+
 import pymysql
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import (Flask, Response, render_template, stream_template, request, redirect, url_for,
+                   session, flash, g, has_app_context, has_request_context, jsonify)
+from werkzeug.middleware.proxy_fix import ProxyFix
 from config import config
+from database.pool import ConnectionPool
+from database.replicas import ReplicaSet, parse_hosts
+from database.sharding import ShardRouter, ShardMoving, parse_shards
+from controllers.booking import (BookingEngine, BookingResult, BOOKED, SLOT_TAKEN, INVALID as BOOKING_INVALID,
+                                 FAILED as BOOKING_FAILED)
+from controllers.cache import ReadThroughCache, backend_from_url
+from controllers.patient_directory import PatientPage, decode_cursor, PAGE_SIZE as PATIENT_PAGE_SIZE
+from controllers.schedule import ScheduleIndex
+from controllers import availability
+from controllers.record_timeline import RecordTimeline
+from controllers import instrumentation
+from controllers.passwords import PasswordService, HashingBusy, isolate_workers
+from controllers.sessions import SessionStore, ServerSessionInterface
+from controllers.ratelimit import RateLimiter
+from controllers.reset_tokens import ResetTokenCoalescer, ExpiredTokenSweeper
+from controllers.validation import validate_patient
+from controllers import analytics
+from controllers.jobs import JobQueue
+from controllers import notifications
+from controllers import archive
+from controllers.conditional import VersionStamps, ConditionalPages, template_release
+from controllers import templating
+from controllers import live_events
+from controllers.live_events import EventBroker, BrokerFull, pubsub_from_url
+from controllers.events import appointment_created, appointment_status_changed, record_saved
+from routes.admin_routes import register_admin_routes
 import os
+import threading
 from datetime import datetime
 
+startup.mark('imports')
+
 app = Flask(__name__)
 
 env = os.environ.get('FLASK_ENV', 'development')
 app.config.from_object(config[env])
 
+if app.config['TRUSTED_PROXIES']:
+    # Behind a load balancer remote_addr would be the proxy, and every client would share one rate limit
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'],
+                            x_proto=app.config['TRUSTED_PROXIES'])
+
 class MySQL:
+    """
+    Request-scoped MySQL connections with optional read replicas.
+    
+    With MYSQL_REPLICAS set, ``connection`` in a GET/HEAD request is served
+    by a healthy replica; every other request, background work and scripts
+    use the primary. After a user's own write their reads stay on the
+    primary for READ_STICKY_SECONDS so they see it straight away, and code
+    that must read the latest data can ask for ``primary_connection`` or
+    call ``use_primary()``.
+    
+    With MYSQL_SHARDS set, patient data lives on shards (see
+    database/sharding.py): a request about one patient gets that patient's
+    shard as ``connection``, ``patient_connection()`` and ``patient_pool()``
+    reach a given patient's shard, and ``everywhere()`` reads from all of
+    them. Routes keyed by an appointment or record id call
+    ``use_shard_of()`` first so ``connection`` finds the row. Without shards
+    these fall back to the single database.
+    """
     def __init__(self, app=None):
         self.app = app
+        self.pool = None
+        self.replicas = None
         self._connection = None
         if app:
             self.init_app(app)
     
     def init_app(self, app):
         self.app = app
+        pool_options = dict(
+            min_size=app.config.get('MYSQL_POOL_MIN_SIZE', 2),
+            max_size=app.config.get('MYSQL_POOL_MAX_SIZE', 10),
+            timeout=app.config.get('MYSQL_POOL_TIMEOUT', 5),
+            recycle=app.config.get('MYSQL_POOL_RECYCLE', 1800),
+            idle_timeout=app.config.get('MYSQL_POOL_IDLE_TIMEOUT', 300),
+            ping_after=app.config.get('MYSQL_POOL_PING_AFTER', 5)
+        )
+        self.pool = ConnectionPool(
+            connect_args=dict(
+                host=app.config.get('MYSQL_HOST', 'localhost'),
+                user=app.config.get('MYSQL_USER', 'root'),
+                password=app.config.get('MYSQL_PASSWORD', ''),
+                database=app.config.get('MYSQL_DB', 'medilink'),
+                cursorclass=pymysql.cursors.DictCursor
+            ),
+            **pool_options
+        )
+        self.replicas = ReplicaSet(
+            self.pool.connect_args,
+            parse_hosts(app.config.get('MYSQL_REPLICAS')),
+            user=app.config.get('MYSQL_REPLICA_USER'),
+            password=app.config.get('MYSQL_REPLICA_PASSWORD'),
+            max_lag=app.config.get('REPLICA_MAX_LAG', 5),
+            check_interval=app.config.get('REPLICA_CHECK_INTERVAL', 5),
+            sticky_seconds=app.config.get('READ_STICKY_SECONDS', 10),
+            pool_options=pool_options
+        )
+        self.shards = ShardRouter(
+            self.pool,
+            parse_shards(app.config.get('MYSQL_SHARDS')),
+            pool_options=pool_options,
+            refresh=app.config.get('SHARD_MAP_REFRESH', 5)
+        )
+        if self.shards.sharded:
+            appointment_status_changed.connect(self.shards.release_slot)
+        app.teardown_appcontext(self.teardown)
+        if self.replicas:
+            app.after_request(self.replicas.remember_write)
+    
+    def all_pools(self):
+        shard_pools = self.shards.pools if self.shards.sharded else []
+        return [self.pool] + self.replicas.pools() + shard_pools
+    
+    def teardown(self, exception):
+        """Return the app context's connections to their pools"""
+        conn = g.pop('_mysql_connection', None)
+        if conn is not None:
+            self.pool.release(conn)
+        self.replicas.release()
+        self.shards.release()
+    
+    def use_primary(self):
+        """Send the rest of this request's queries to the primary"""
+        self.replicas.use_primary()
+    
+    def use_patient(self, patient_id):
+        """Send the rest of this request's patient data queries to this patient's shard"""
+        g._mysql_patient = patient_id
+    
+    def use_shard_of(self, table, key, value):
+        """Route this request to the shard holding a row found by its own id"""
+        if self.shards.sharded:
+            patient_id = self.shards.locate(table, key, value)
+            if patient_id is not None:
+                self.use_patient(patient_id)
     
     @property
     def connection(self):
+        if self.shards.sharded:
+            patient_id = self.shards.request_patient()
+            if patient_id is not None:
+                return self.patient_connection(patient_id)
+        conn = self.replicas.request_connection()
+        if conn is not None:
+            return conn
+        return self.primary_connection
+    
+    @property
+    def primary_connection(self):
+        if has_app_context():
+            conn = g.get('_mysql_connection')
+            if conn is None:
+                conn = self.pool.acquire()
+                g._mysql_connection = conn
+            return conn
+        
+        # Scripts running outside an app context keep a private connection
         if self._connection is None or not self._connection.open:
-            self._connection = pymysql.connect(
-                host=self.app.config.get('MYSQL_HOST', 'localhost'),
-                user=self.app.config.get('MYSQL_USER', 'root'),
-                password=self.app.config.get('MYSQL_PASSWORD', ''),
-                database=self.app.config.get('MYSQL_DB', 'medilink'),
-                cursorclass=pymysql.cursors.DictCursor
-            )
+            self._connection = pymysql.connect(**self.pool.connect_args)
         return self._connection
+    
+    def patient_connection(self, patient_id, primary=False):
+        """Connection for one patient's data: their shard, else the usual connection"""
+        if not self.shards.sharded:
+            return self.primary_connection if primary else self.connection
+        if has_request_context() and request.method not in ('GET', 'HEAD'):
+            self.shards.check_writable(patient_id)
+        return self.shards.connection_for(patient_id)
+    
+    def patient_pool(self, patient_id):
+        return self.shards.pool_for(patient_id) if self.shards.sharded else self.pool
+    
+    def everywhere(self, key=None, reverse=False):
+        """Read connection over all patient data; rows merged by key across shards"""
+        if not self.shards.sharded:
+            return self.connection
+        return self.shards.everywhere(key, reverse)
 
 mysql = MySQL(app)
+booking_engine = BookingEngine(mysql)
+doctor_directory = ReadThroughCache(
+    'doctors',
+    ttl=app.config['DOCTOR_CACHE_TTL'],
+    max_entries=app.config['CACHE_MAX_ENTRIES'],
+    backend=backend_from_url(app.config['CACHE_SHARED_URL'])
+)
+archiver = archive.Archiver(
+    mysql.shards.pools,
+    appointment_days=app.config['APPOINTMENT_ARCHIVE_AFTER_DAYS'],
+    record_days=app.config['RECORD_ARCHIVE_AFTER_DAYS'],
+    batch_size=app.config['ARCHIVE_BATCH_SIZE'],
+    max_batches=app.config['ARCHIVE_MAX_BATCHES']
+)
+archiving = app.config['ARCHIVE_INTERVAL'] > 0
+schedule_index = ScheduleIndex(
+    mysql,
+    ttl=app.config['SCHEDULE_INDEX_TTL'],
+    max_days=app.config['SCHEDULE_INDEX_MAX_DAYS'],
+    archived_before=archiver.appointments_archived_before if archiving else None
+).connect()
+slot_grid = availability.SlotGrid(
+    app.config['CLINIC_OPEN_TIME'],
+    app.config['CLINIC_CLOSE_TIME'],
+    app.config['APPOINTMENT_SLOT_MINUTES']
+)
+record_timeline = RecordTimeline(
+    mysql,
+    ttl=app.config['RECORD_TIMELINE_TTL'],
+    max_patients=app.config['RECORD_TIMELINE_MAX_PATIENTS'],
+    archived=archiving,
+    full_text=app.config['RECORD_TIMELINE_FULL_TEXT'],
+    backend=backend_from_url(app.config['CACHE_SHARED_URL'])
+).connect()
+password_service = PasswordService(
+    workers=app.config['PASSWORD_HASH_WORKERS'],
+    max_pending=app.config['PASSWORD_HASH_MAX_PENDING'],
+    method=app.config['PASSWORD_HASH_METHOD']
+)
+session_store = None
+if app.config['SESSION_STORE'] == 'server':
+    session_store = SessionStore(
+        lifetime=int(app.permanent_session_lifetime.total_seconds()),
+        max_entries=app.config['SESSION_MEMORY_MAX'],
+        memory_ttl=app.config['SESSION_MEMORY_TTL'],
+        backend=backend_from_url(app.config['SESSION_SHARED_URL']),
+        sweep_interval=app.config['SESSION_SWEEP_INTERVAL']
+    )
+    app.session_interface = ServerSessionInterface(session_store)
 
-from models.admin import Admin
-from models.doctor import Doctor
-from models.patient import Patient
-from models.appointment import Appointment
-from models.medical_record import MedicalRecord
-from models.password_reset import PasswordReset
+rate_limit_backend = backend_from_url(app.config['RATE_LIMIT_SHARED_URL'])
+reset_ip_limiter = RateLimiter(
+    'reset-ip', app.config['RESET_LIMIT_IP_PER_MINUTE'], burst=10, backend=rate_limit_backend)
+reset_email_limiter = RateLimiter(
+    'reset-email', app.config['RESET_LIMIT_EMAIL_PER_HOUR'] / 60.0,
+    burst=app.config['RESET_LIMIT_EMAIL_PER_HOUR'], backend=rate_limit_backend)
+reset_verify_limiter = RateLimiter(
+    'reset-verify', app.config['RESET_VERIFY_LIMIT_PER_MINUTE'], backend=rate_limit_backend)
+reset_tokens = ResetTokenCoalescer(app.config['PASSWORD_RESET_TOKEN_TTL'], backend=rate_limit_backend)
+reset_token_sweeper = ExpiredTokenSweeper(
+    mysql,
+    table=app.config['PASSWORD_RESET_TABLE'],
+    expires_column=app.config['PASSWORD_RESET_EXPIRES_COLUMN'],
+    interval=app.config['RESET_SWEEP_INTERVAL']
+)
 
-from routes.admin_routes import register_admin_routes
+appointment_rollups = analytics.AppointmentRollups(mysql).connect()
+job_queue = notifications.register(
+    JobQueue(
+        mysql,
+        workers=app.config['JOB_WORKERS'],
+        poll_interval=app.config['JOB_POLL_INTERVAL'],
+        max_attempts=app.config['JOB_MAX_ATTEMPTS'],
+        backoff=app.config['JOB_RETRY_BACKOFF']
+    ),
+    mysql,
+    batch_size=app.config['REMINDER_BATCH_SIZE']
+)
+if archiving:
+    archive.register(job_queue, archiver, app.config['ARCHIVE_INTERVAL'])
+app.before_request(job_queue.start)
+conditional = ConditionalPages(
+    VersionStamps(
+        backend=backend_from_url(app.config['CACHE_SHARED_URL']),
+        ttl=app.config['ETAG_STAMP_TTL']
+    ).connect(),
+    release=template_release(app.template_folder and os.path.join(app.root_path, app.template_folder)),
+    max_pages=app.config['ETAG_MAX_PAGES']
+)
+fragment_cache = templating.init_app(
+    app, conditional.stamps, backend=backend_from_url(app.config['CACHE_SHARED_URL']))
+event_broker = EventBroker(
+    pubsub_from_url(app.config['EVENTS_PUBSUB_URL'] or app.config['CACHE_SHARED_URL']),
+    history=app.config['EVENTS_HISTORY'],
+    max_subscribers=app.config['EVENTS_MAX_SUBSCRIBERS']
+).connect()
 
-register_admin_routes(app, mysql)
+startup.mark('extensions')
+
+if instrumentation.init_app(app, mysql):
+    instrumentation.add_gauges('startup', startup.stats)
+    instrumentation.add_gauges('doctor_cache', doctor_directory.stats)
+    instrumentation.add_gauges('schedule_index', schedule_index.stats)
+    instrumentation.add_gauges('record_timeline_cache', record_timeline.cache.stats)
+    instrumentation.add_gauges('password_hashing', password_service.stats)
+    if session_store is not None:
+        instrumentation.add_gauges('sessions', session_store.stats)
+    instrumentation.add_gauges('reset_ip_limiter', reset_ip_limiter.stats)
+    instrumentation.add_gauges('reset_email_limiter', reset_email_limiter.stats)
+    instrumentation.add_gauges('appointment_rollups', appointment_rollups.stats)
+    instrumentation.add_gauges('jobs', job_queue.stats)
+    instrumentation.add_gauges('conditional_pages', conditional.stats)
+    instrumentation.add_gauges('fragment_cache', fragment_cache.stats)
+    instrumentation.add_gauges('live_events', event_broker.stats)
+    instrumentation.add_gauges('archive', archiver.stats)
+    if mysql.replicas:
+        instrumentation.add_gauges('db_replicas', mysql.replicas.stats)
+    if mysql.shards.sharded:
+        instrumentation.add_gauges('db_shards', mysql.shards.stats)
+
+Admin = LazyModel('models.admin', 'Admin')
+Doctor = LazyModel('models.doctor', 'Doctor')
+Patient = LazyModel('models.patient', 'Patient')
+Appointment = LazyModel('models.appointment', 'Appointment')
+MedicalRecord = LazyModel('models.medical_record', 'MedicalRecord')
+PasswordReset = LazyModel('models.password_reset', 'PasswordReset')
+
+SESSION_REVOKING_ACTIONS = ('delete', 'deactivate', 'toggle')
+
+@app.after_request
+def invalidate_doctor_directory(response):
+    """Drop the cached doctor directory and page ETags after admin edits"""
+    if (request.method == 'POST' and request.endpoint
+            and request.endpoint.startswith('admin') and response.status_code < 400):
+        doctor_directory.invalidate('all')
+        conditional.invalidate_all()
+        revoke_doctor_sessions()
+    return response
+
+def revoke_doctor_sessions():
+    """Log a doctor out everywhere once an admin deactivates or deletes the account"""
+    doctor_id = (request.view_args or {}).get('doctor_id') or request.form.get('doctor_id')
+    if session_store is None or not doctor_id:
+        return
+    if any(action in request.endpoint for action in SESSION_REVOKING_ACTIONS):
+        session_store.revoke_user('doctor', doctor_id)
+
+def load_doctors():
+    """Doctor directory loader; reads the primary so a refill is never stale"""
+    mysql.use_primary()
+    return Doctor.get_all(mysql)
 
 @app.route('/')
+@conditional(lambda: [])
 def index():
     """Home page"""
     return render_template('index.html')
@@ -65,7 +374,11 @@ def doctor_login():
             flash('Please enter doctor ID and password', 'error')
             return redirect(url_for('doctor_login'))
         
-        doctor = Doctor.verify_password(mysql, doctor_code, password)
+        try:
+            doctor = password_service.authenticate(mysql, 'doctor', doctor_code, password)
+        except HashingBusy:
+            flash('Too many sign-ins right now. Please try again in a moment', 'error')
+            return render_template('doctor/login.html'), 503, {'Retry-After': '2'}
         
         if doctor:
             if not doctor.get('is_active', True):
@@ -97,7 +410,11 @@ def patient_login():
             flash('Please enter email and password', 'error')
             return redirect(url_for('patient_login'))
         
-        patient = Patient.verify_password(mysql, email, password)
+        try:
+            patient = password_service.authenticate(mysql, 'patient', email, password)
+        except HashingBusy:
+            flash('Too many sign-ins right now. Please try again in a moment', 'error')
+            return render_template('patient/login.html'), 503, {'Retry-After': '2'}
         
         if patient:
             session['user_type'] = 'patient'
@@ -114,63 +431,58 @@ def patient_login():
     
     return render_template('patient/login.html')
 
+def find_patient_by_email(email):
+    """Patient (user_id, full_name, email) by email from whichever shard holds it"""
+    cursor = mysql.everywhere().cursor()
+    cursor.execute("""
+        SELECT patient_id AS user_id, full_name, email FROM patients WHERE email = %s LIMIT 1
+    """, (email,))
+    patient = cursor.fetchone()
+    cursor.close()
+    return patient
+
+def create_patient(patient):
+    """Insert a patient; with shards the id comes from the catalog and the row goes to its shard"""
+    if not mysql.shards.sharded:
+        return Patient.create(mysql=mysql, **patient)
+    patient_id = mysql.shards.allocate_patient_id()
+    columns = ('patient_id',) + tuple(patient)
+    values = dict(patient, patient_id=patient_id, password=password_service.hash(patient['password']))
+    conn = mysql.patient_connection(patient_id, primary=True)
+    cursor = conn.cursor()
+    cursor.execute(f"INSERT INTO patients ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})",
+                   tuple(values[column] for column in columns))
+    conn.commit()
+    cursor.close()
+    return patient_id
+
 @app.route('/patient/register', methods=['GET', 'POST'])
 def patient_register():
     """Patient registration page"""
     if request.method == 'POST':
-        full_name = request.form.get('full_name', '').strip()
-        age = request.form.get('age', '').strip()
-        gender = request.form.get('gender', '').strip()
-        phone = request.form.get('phone', '').strip()
-        email = request.form.get('email', '').strip().lower()
-        password = request.form.get('password', '')
-        confirm_password = request.form.get('confirm_password', '')
-        address = request.form.get('address', '').strip()
-        blood_group = request.form.get('blood_group', '').strip()
-        emergency_contact = request.form.get('emergency_contact', '').strip()
-        
-        if not all([full_name, age, gender, phone, email, password]):
-            flash('Please fill all required fields', 'error')
-            return redirect(url_for('patient_register'))
-        
-        if password != confirm_password:
-            flash('Passwords do not match', 'error')
-            return redirect(url_for('patient_register'))
-        
-        if len(password) < 6:
-            flash('Password must be at least 6 characters long', 'error')
+        patient, error = validate_patient(
+            request.form, confirm_password=request.form.get('confirm_password', ''))
+        if error:
+            flash(error, 'error')
             return redirect(url_for('patient_register'))
         
-        try:
-            age = int(age)
-            if age < 1 or age > 150:
-                flash('Please enter a valid age', 'error')
-                return redirect(url_for('patient_register'))
-        except ValueError:
-            flash('Please enter a valid age', 'error')
-            return redirect(url_for('patient_register'))
-        
-        if Patient.email_exists(mysql, email):
+        if mysql.shards.sharded:
+            exists = find_patient_by_email(patient['email']) is not None
+        else:
+            exists = Patient.email_exists(mysql, patient['email'])
+        if exists:
             flash('User already registered with this email', 'error')
             return redirect(url_for('patient_register'))
         
         try:
-            patient_id = Patient.create(
-                mysql=mysql,
-                full_name=full_name,
-                age=age,
-                gender=gender,
-                phone=phone,
-                email=email,
-                password=password,
-                address=address if address else None,
-                blood_group=blood_group if blood_group else None,
-                emergency_contact=emergency_contact if emergency_contact else None
-            )
+            patient_id = create_patient(patient)
             
             flash('Registration successful! Please login to continue', 'success')
             return redirect(url_for('patient_login'))
             
+        except HashingBusy:
+            flash('Too many sign-ups right now. Please try again in a moment', 'error')
+            return render_template('patient/register.html'), 503, {'Retry-After': '2'}
         except Exception as e:
             flash('Registration failed. Please try again', 'error')
             print(f"Registration error: {e}")
@@ -189,16 +501,36 @@ def forgot_password():
             flash('Please enter your email and select user type', 'error')
             return redirect(url_for('forgot_password'))
         
-        user = PasswordReset.find_user_by_email(mysql, email, user_type)
+        ip_allowed, ip_retry = reset_ip_limiter.hit(request.remote_addr or 'unknown')
+        email_allowed, email_retry = reset_email_limiter.hit(email) if ip_allowed else (False, 0)
+        if not (ip_allowed and email_allowed):
+            flash('Too many reset requests. Please try again later.', 'error')
+            retry_after = str(int(max(ip_retry, email_retry)) + 1)
+            return render_template('forgot_password.html'), 429, {'Retry-After': retry_after}
         
-        if user:
-            token = PasswordReset.create_token(mysql, user_type, user['user_id'], email)
-            
-            reset_link = url_for('reset_password', token=token, _external=True)
-            print(f"\n{'='*60}")
-            print(f"PASSWORD RESET LINK FOR {user['full_name']} ({email}):")
-            print(f"{reset_link}")
-            print(f"{'='*60}\n")
+        reset_token_sweeper.start()
+        
+        # The coalescer may be per process, so a token it remembers must still be in the table
+        mysql.use_primary()
+        outstanding = reset_tokens.outstanding(
+            user_type, email, still_valid=lambda token: PasswordReset.verify_token(mysql, token))
+        if not outstanding:
+            if user_type == 'patient' and mysql.shards.sharded:
+                user = find_patient_by_email(email)
+            else:
+                user = PasswordReset.find_user_by_email(mysql, email, user_type)
+            if user:
+                token = PasswordReset.create_token(mysql, user_type, user['user_id'], email)
+                reset_tokens.remember(user_type, email, token, user['full_name'])
+                outstanding = {'token': token, 'full_name': user['full_name']}
+        
+        if outstanding:
+            reset_link = url_for('reset_password', token=outstanding['token'], _external=True)
+            job_queue.enqueue('reset_link', {
+                'email': email,
+                'full_name': outstanding['full_name'],
+                'link': reset_link
+            })
             
             flash('Password reset link has been generated. Check the console for the link.', 'success')
         else:
@@ -212,7 +544,14 @@ def forgot_password():
 @app.route('/reset-password/<token>', methods=['GET', 'POST'])
 def reset_password(token):
     """Reset password with token"""
+    allowed, _ = reset_verify_limiter.hit(request.remote_addr or 'unknown')
+    if not allowed:
+        flash('Too many attempts. Please try again later.', 'error')
+        return redirect(url_for('forgot_password'))
 
+    reset_token_sweeper.start()
+    # Links are often opened seconds after they were issued, maybe in another browser
+    mysql.use_primary()
     token_data = PasswordReset.verify_token(mysql, token)
     
     if not token_data:
@@ -236,10 +575,18 @@ def reset_password(token):
             return redirect(url_for('reset_password', token=token))
         
         try:
-            from werkzeug.security import generate_password_hash
-            hashed_password = generate_password_hash(password)
-            
-            cursor = mysql.connection.cursor()
+            hashed_password = password_service.hash(password)
+        except HashingBusy:
+            flash('Too many password changes right now. Please try again in a moment', 'error')
+            return (render_template('reset_password.html', token=token, email=token_data['email']),
+                    503, {'Retry-After': '2'})
+        
+        try:
+            if token_data['user_type'] == 'patient':
+                conn = mysql.patient_connection(token_data['user_id'], primary=True)
+            else:
+                conn = mysql.connection
+            cursor = conn.cursor()
             
             if token_data['user_type'] == 'patient':
                 cursor.execute("""
@@ -254,10 +601,11 @@ def reset_password(token):
                     UPDATE admins SET password = %s WHERE admin_id = %s
                 """, (hashed_password, token_data['user_id']))
             
-            mysql.connection.commit()
+            conn.commit()
             cursor.close()
             
             PasswordReset.delete_token(mysql, token)
+            reset_tokens.forget(token_data['user_type'], token_data['email'])
             
             flash('Password reset successful! Please login with your new password.', 'success')
             
@@ -307,7 +655,16 @@ def doctor_appointments():
     date_filter = request.args.get('date')
     status_filter = request.args.get('status')
     
-    appointments = Appointment.get_by_doctor(mysql, session.get('user_id'), date_filter, status_filter)
+    appointments = None
+    if date_filter:
+        try:
+            appointments = schedule_index.lookup(session.get('user_id'), date_filter, status_filter)
+        except ValueError:
+            appointments = None
+    if appointments is None and mysql.shards.sharded:
+        appointments = schedule_index.all_days(session.get('user_id'), date_filter, status_filter)
+    if appointments is None:
+        appointments = Appointment.get_by_doctor(mysql, session.get('user_id'), date_filter, status_filter)
     
     from datetime import date
     return render_template('doctor/appointments.html', 
@@ -329,12 +686,14 @@ def doctor_update_appointment_status(appointment_id):
         return redirect(url_for('doctor_appointments'))
     
     try:
+        mysql.use_shard_of('appointments', 'appointment_id', appointment_id)
         appointment = Appointment.find_by_id(mysql, appointment_id)
         if not appointment or appointment['doctor_id'] != session.get('user_id'):
             flash('Appointment not found or access denied', 'error')
             return redirect(url_for('doctor_appointments'))
         
         Appointment.update_status(mysql, appointment_id, status)
+        appointment_status_changed.send(appointment=appointment, status=status)
         flash(f'Appointment marked as {status}', 'success')
         
     except Exception as e:
@@ -343,6 +702,18 @@ def doctor_update_appointment_status(appointment_id):
         
     return redirect(url_for('doctor_appointments'))
 
+def patient_page():
+    """PatientPage for the ?q=, ?after= / ?before= and ?limit= arguments"""
+    search = request.args.get('q', '').strip()
+    before = decode_cursor(request.args.get('before'))
+    return PatientPage(
+        mysql.everywhere(key=lambda row: (row['full_name'], row['patient_id']), reverse=bool(before)),
+        after=decode_cursor(request.args.get('after')),
+        before=before,
+        search=search or None,
+        limit=request.args.get('limit', PATIENT_PAGE_SIZE, type=int)
+    )
+
 @app.route('/doctor/patients')
 def doctor_patients():
     """List all patients for doctor"""
@@ -350,10 +721,21 @@ def doctor_patients():
         flash('Please login to access doctor dashboard', 'error')
         return redirect(url_for('doctor_login'))
     
-    patients = Patient.get_all(mysql)
-    return render_template('doctor/patients.html', patients=patients)
+    page = patient_page()
+    return stream_template('doctor/patients.html', patients=page, page=page, search=page.search or '')
+
+@app.route('/doctor/api/patients')
+def doctor_patients_api():
+    """Keyset-paginated patient listing as JSON"""
+    if session.get('user_type') != 'doctor':
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    page = patient_page()
+    patients = page.fetch_all()
+    return jsonify({'patients': patients, 'next_cursor': page.next_cursor, 'prev_cursor': page.prev_cursor})
 
 @app.route('/doctor/patient/<int:patient_id>')
+@conditional(lambda patient_id: [('records', patient_id)] if session.get('user_type') == 'doctor' else None)
 def doctor_view_patient(patient_id):
     """View patient details and history"""
     if session.get('user_type') != 'doctor':
@@ -365,9 +747,34 @@ def doctor_view_patient(patient_id):
         flash('Patient not found', 'error')
         return redirect(url_for('doctor_patients'))
     
-    records = MedicalRecord.get_by_patient(mysql, patient_id)
+    timeline = record_timeline.page(patient_id, request.args.get('before'))
     
-    return render_template('doctor/patient_details.html', patient=patient, records=records)
+    return render_template('doctor/patient_details.html',
+                         patient=patient,
+                         records=timeline['records'],
+                         next_cursor=timeline['next_cursor'])
+
+@app.route('/doctor/patient/<int:patient_id>/export')
+def doctor_export_patient_records(patient_id):
+    """Download a patient's full record history"""
+    if session.get('user_type') != 'doctor':
+        flash('Please login to access doctor dashboard', 'error')
+        return redirect(url_for('doctor_login'))
+    
+    from controllers import record_export
+    fmt = request.args.get('format', 'csv')
+    if fmt not in record_export.FORMATS:
+        flash('Unsupported export format', 'error')
+        return redirect(url_for('doctor_view_patient', patient_id=patient_id))
+    
+    patient = Patient.find_by_id(mysql, patient_id)
+    if not patient:
+        flash('Patient not found', 'error')
+        return redirect(url_for('doctor_patients'))
+    
+    return export_response(
+        record_export.patient_rows(mysql.patient_pool(patient_id), patient_id, archiving), fmt,
+        f"medical-records-{patient_id}", f"Medical records - {patient['full_name']}")
 
 @app.route('/doctor/patient/<int:patient_id>/add-record', methods=['GET', 'POST'])
 def doctor_add_record(patient_id):
@@ -395,7 +802,7 @@ def doctor_add_record(patient_id):
         
         try:
             from datetime import date
-            MedicalRecord.create(
+            record_id = MedicalRecord.create(
                 mysql=mysql,
                 patient_id=patient_id,
                 doctor_id=session.get('user_id'),
@@ -407,6 +814,7 @@ def doctor_add_record(patient_id):
                 notes=notes if notes else None,
                 follow_up_date=follow_up_date if follow_up_date else None
             )
+            record_saved.send(patient_id=patient_id, record_id=record_id)
             
             flash('Medical record added successfully', 'success')
             return redirect(url_for('doctor_view_patient', patient_id=patient_id))
@@ -418,6 +826,33 @@ def doctor_add_record(patient_id):
     
     return render_template('doctor/add_record.html', patient=patient)
 
+@app.route('/doctor/api/records/search')
+def doctor_search_records():
+    """Ranked full-text search over medical records"""
+    if session.get('user_type') != 'doctor':
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    from datetime import date
+    try:
+        date_from = request.args.get('from')
+        date_to = request.args.get('to')
+        date_from = date.fromisoformat(date_from) if date_from else None
+        date_to = date.fromisoformat(date_to) if date_to else None
+    except ValueError:
+        return jsonify({'error': 'from and to must be YYYY-MM-DD dates'}), 400
+    
+    from controllers import record_search
+    page = request.args.get('page', 1, type=int)
+    results, has_more = record_search.search(
+        mysql.everywhere(key=record_search.rank_key, reverse=True),
+        request.args.get('q', ''),
+        doctor_id=request.args.get('doctor_id', type=int),
+        date_from=date_from,
+        date_to=date_to,
+        page=page
+    )
+    return jsonify({'results': results, 'page': page, 'has_more': has_more})
+
 @app.route('/doctor/record/<int:record_id>/edit', methods=['GET', 'POST'])
 def doctor_edit_record(record_id):
     """Edit medical record"""
@@ -425,6 +860,7 @@ def doctor_edit_record(record_id):
         flash('Please login to access doctor dashboard', 'error')
         return redirect(url_for('doctor_login'))
     
+    mysql.use_shard_of('medical_records', 'record_id', record_id)
     record = MedicalRecord.find_by_id(mysql, record_id)
     if not record:
         flash('Record not found', 'error')
@@ -457,6 +893,7 @@ def doctor_edit_record(record_id):
                 notes=notes if notes else None,
                 follow_up_date=follow_up_date if follow_up_date else None
             )
+            record_saved.send(patient_id=record['patient_id'], record_id=record_id)
             
             flash('Medical record updated successfully', 'success')
             return redirect(url_for('doctor_view_patient', patient_id=record['patient_id']))
@@ -493,35 +930,74 @@ def patient_book_appointment():
             flash('Please fill all required fields', 'error')
             return redirect(url_for('patient_book_appointment'))
         
-        if not Appointment.check_availability(mysql, doctor_id, appointment_date, appointment_time):
-            flash('This time slot is already booked. Please choose another time.', 'error')
-            return redirect(url_for('patient_book_appointment'))
-        
         try:
-            Appointment.create(
-                mysql=mysql,
+            result = booking_engine.book(
                 patient_id=session.get('user_id'),
                 doctor_id=doctor_id,
                 appointment_date=appointment_date,
                 appointment_time=appointment_time,
                 reason=reason
             )
-            
-            flash('Appointment booked successfully!', 'success')
-            return redirect(url_for('patient_dashboard'))
-            
         except Exception as e:
-            flash('Failed to book appointment. Please try again', 'error')
-            print(f"Booking error: {e}")
+            result = BookingResult(BOOKING_FAILED, None, e)
+        
+        if result.status == SLOT_TAKEN:
+            flash('This time slot is already booked. Please choose another time.', 'error')
+            return redirect(url_for('patient_book_appointment'))
+        
+        if result.status == BOOKING_INVALID:
+            flash('Please choose a valid doctor, date and time', 'error')
             return redirect(url_for('patient_book_appointment'))
+        
+        if result.status == BOOKED:
+            appointment_created.send(
+                appointment_id=result.appointment_id,
+                patient_id=session.get('user_id'),
+                doctor_id=doctor_id,
+                appointment_date=appointment_date,
+                appointment_time=appointment_time
+            )
+            flash('Appointment booked successfully!', 'success')
+            return redirect(url_for('patient_dashboard'))
+        
+        flash('Failed to book appointment. Please try again', 'error')
+        print(f"Booking error: {result.error}")
+        return redirect(url_for('patient_book_appointment'))
     
     from datetime import date
-    doctors = Doctor.get_all(mysql)
+    doctors = doctor_directory.get('all', load_doctors)
     return render_template('patient/book_appointment.html', 
                          doctors=doctors, 
                          today_date=date.today().strftime('%Y-%m-%d'))
 
+@app.route('/patient/api/available-slots')
+def patient_available_slots():
+    """Free appointment slots across doctors for a date range"""
+    if session.get('user_type') != 'patient':
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    from datetime import date, timedelta
+    try:
+        start = availability.parse_date(request.args.get('start'), date.today())
+        end = availability.parse_date(request.args.get('end'), start + timedelta(days=13))
+        doctors = doctor_directory.get('all', load_doctors)
+        results = availability.search(
+            mysql.everywhere(), doctors, start, end, slot_grid,
+            doctor_id=request.args.get('doctor_id', type=int),
+            specialization=request.args.get('specialization', '').strip() or None
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'slot_minutes': slot_grid.slot_minutes,
+        'doctors': results
+    })
+
 @app.route('/patient/appointments')
+@conditional(lambda: [('appointments', session['user_id'])] if session.get('user_type') == 'patient' else None)
 def patient_appointments():
     """View patient appointments"""
     if session.get('user_type') != 'patient':
@@ -529,6 +1005,8 @@ def patient_appointments():
         return redirect(url_for('patient_login'))
     
     appointments = Appointment.get_by_patient(mysql, session.get('user_id'))
+    if archiving and request.args.get('history'):
+        appointments = list(appointments) + archive.patient_history(mysql.connection, session.get('user_id'))
     return render_template('patient/appointments.html', appointments=appointments)
 
 @app.route('/patient/appointment/<int:appointment_id>/cancel', methods=['POST'])
@@ -549,6 +1027,7 @@ def patient_cancel_appointment(appointment_id):
             return redirect(url_for('patient_appointments'))
         
         Appointment.update_status(mysql, appointment_id, 'Cancelled')
+        appointment_status_changed.send(appointment=appointment, status='Cancelled')
         flash('Appointment cancelled successfully', 'success')
         
     except Exception as e:
@@ -558,14 +1037,145 @@ def patient_cancel_appointment(appointment_id):
     return redirect(url_for('patient_appointments'))
 
 @app.route('/patient/medical-records')
+@conditional(lambda: [('records', session['user_id'])] if session.get('user_type') == 'patient' else None)
 def patient_medical_records():
     """View patient medical records"""
     if session.get('user_type') != 'patient':
         flash('Please login to view medical records', 'error')
         return redirect(url_for('patient_login'))
     
-    records = MedicalRecord.get_by_patient(mysql, session.get('user_id'))
-    return render_template('patient/medical_records.html', records=records)
+    timeline = record_timeline.page(session.get('user_id'), request.args.get('before'))
+    return render_template('patient/medical_records.html',
+                         records=timeline['records'],
+                         next_cursor=timeline['next_cursor'])
+
+@app.route('/patient/medical-records/export')
+def patient_export_medical_records():
+    """Download the logged-in patient's record history"""
+    if session.get('user_type') != 'patient':
+        flash('Please login to view medical records', 'error')
+        return redirect(url_for('patient_login'))
+    
+    from controllers import record_export
+    fmt = request.args.get('format', 'csv')
+    if fmt not in record_export.FORMATS:
+        flash('Unsupported export format', 'error')
+        return redirect(url_for('patient_medical_records'))
+    
+    patient_id = session.get('user_id')
+    return export_response(
+        record_export.patient_rows(mysql.patient_pool(patient_id), patient_id, archiving), fmt,
+        'my-medical-records', f"Medical records - {session.get('user_name')}")
+
+@app.route('/admin/records/export')
+def admin_export_records():
+    """Bulk export of all records visited within a date range"""
+    if session.get('user_type') != 'admin':
+        flash('Please login as admin', 'error')
+        return redirect(url_for('admin_login'))
+    
+    from controllers import record_export
+    fmt = request.args.get('format', 'csv')
+    try:
+        from datetime import date
+        start = date.fromisoformat(request.args.get('start', ''))
+        end = date.fromisoformat(request.args.get('end', ''))
+    except ValueError:
+        return jsonify({'error': 'start and end must be YYYY-MM-DD dates'}), 400
+    if fmt not in record_export.FORMATS or end < start:
+        return jsonify({'error': 'Invalid export format or date range'}), 400
+    
+    return export_response(
+        record_export.date_range_rows(mysql.shards.pools, start, end, archiving), fmt,
+        f"medical-records-{start}-{end}", f"Medical records {start} to {end}")
+
+@app.route('/admin/api/analytics')
+def admin_analytics():
+    """Appointment volumes, cancellation rates and per-doctor load from the rollups"""
+    if session.get('user_type') != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    from datetime import date, timedelta
+    try:
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else date.today()
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else end - timedelta(days=29)
+    except ValueError:
+        return jsonify({'error': 'start and end must be YYYY-MM-DD dates'}), 400
+    if end < start or (end - start).days > 3660:
+        return jsonify({'error': 'Invalid date range'}), 400
+    
+    return jsonify(analytics.dashboard(
+        mysql.connection, start, end, doctor_id=request.args.get('doctor_id', type=int)))
+
+def export_response(rows, fmt, filename, title):
+    """Chunked download of an export; rows are pulled as the client reads"""
+    from controllers import record_export
+    return Response(
+        record_export.export_chunks(rows, fmt, title),
+        mimetype=record_export.FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}.{fmt}"'}
+    )
+
+sync_streams = threading.BoundedSemaphore(app.config['EVENTS_SYNC_MAX_STREAMS'])
+
+def appointment_channels():
+    """Live-update channels of the signed-in doctor or patient, or None"""
+    user_type = session.get('user_type')
+    if user_type not in ('doctor', 'patient'):
+        return None
+    return [f"{user_type}:{session.get('user_id')}"]
+
+@app.route('/events/appointments')
+def appointment_events():
+    """Server-Sent Events stream of the viewer's appointment changes"""
+    channels = appointment_channels()
+    if channels is None:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    # Every stream here holds a server thread for as long as the browser stays
+    if not sync_streams.acquire(blocking=False):
+        return jsonify({'error': 'Too many live connections, please retry'}), 503, {'Retry-After': '30'}
+    try:
+        subscription = event_broker.subscribe(channels, request.headers.get('Last-Event-ID'))
+    except BrokerFull:
+        sync_streams.release()
+        return jsonify({'error': 'Too many live connections, please retry'}), 503, {'Retry-After': '30'}
+    
+    response = Response(live_events.stream(subscription, app.config['EVENTS_HEARTBEAT']),
+                        mimetype='text/event-stream', headers=live_events.STREAM_HEADERS)
+    response.call_on_close(subscription.close)
+    response.call_on_close(sync_streams.release)
+    return response
+
+@app.route('/api/patients/<int:patient_id>/records')
+def patient_records_api(patient_id):
+    """Older medical record timeline pages as JSON"""
+    user_type = session.get('user_type')
+    if user_type != 'doctor' and not (user_type == 'patient' and session.get('user_id') == patient_id):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    return jsonify(record_timeline.page(patient_id, request.args.get('before')))
+
+@app.route('/api/records/<int:record_id>')
+def record_details_api(record_id):
+    """Full text fields of one record, loaded when it is expanded"""
+    user_type = session.get('user_type')
+    if user_type not in ('doctor', 'patient'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    record = record_timeline.details(record_id)
+    if not record or (user_type == 'patient' and record['patient_id'] != session.get('user_id')):
+        return jsonify({'error': 'Record not found'}), 404
+    
+    return jsonify(record)
+
+@app.errorhandler(ShardMoving)
+def shard_moving(error):
+    """A patient's data is being moved between shards; writes resume in seconds"""
+    if request.path.startswith(('/api/', '/doctor/api/', '/patient/api/', '/admin/api/')):
+        return jsonify({'error': 'Temporarily unavailable, please retry'}), 503, {'Retry-After': '5'}
+    flash('This record is briefly read-only for maintenance. Please try again in a moment', 'error')
+    return redirect(request.referrer or url_for('index')), 303, {'Retry-After': '5'}
 
 @app.errorhandler(404)
 def not_found(error):
@@ -586,6 +1196,37 @@ def inject_user():
         user_name=session.get('user_name')
     )
 
+register_admin_routes(app, mysql)
+
+startup.mark('routes')
+
+_create_lock = threading.Lock()
+
+def create_app():
+    """
+    Warm up the module-level app for serving and return it; safe to call repeatedly.
+    
+    The pool and template cache are warmed in parallel and the archive pass
+    is scheduled before the app is handed to the server. It builds nothing:
+    config and routes are already set up at import.
+    """
+    with _create_lock:
+        if 'startup' in app.extensions:
+            return app
+        
+        prewarm(app, mysql, startup)
+        if archiving:
+            try:
+                archiver.prepare()
+                archive.schedule_next(job_queue, app.config['ARCHIVE_INTERVAL'])
+            except Exception as e:
+                print(f"Archive setup error: {e}")
+        app.extensions['startup'] = startup
+        if app.config['STARTUP_REPORT']:
+            print(startup.report())
+    return app
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    isolate_workers()
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
 
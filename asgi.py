@@ -0,0 +1,202 @@
+"""
+ASGI entry point: async serving mode
+
+    pip install aiomysql asgiref uvicorn
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+The endpoints in controllers/async_views.py (patient appointments, records
+and free-slot search, booking, a doctor's patient page and the record
+APIs) run as coroutines on an aiomysql pool, so a worker keeps serving
+while their queries are in flight; the live appointment event stream is
+an async generator, so idle streams hold no thread. Every other request goes to the
+regular Flask app through asgiref's WSGI adapter, which runs it in a
+thread exactly as under app.run or a WSGI server. With MYSQL_SHARDS set
+all routes stay on the sync path, which knows how to route to shards.
+"""
+
+import asyncio
+import io
+import sys
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import request
+from werkzeug.exceptions import HTTPException
+
+from app import create_app, mysql
+from controllers import instrumentation
+from database.async_pool import AsyncPool
+
+
+def build_environ(scope, body):
+    """WSGI environ for an ASGI http scope, so a Flask request context can be pushed"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('ascii'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1')
+        if name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        elif name == 'content-type':
+            key = 'CONTENT_TYPE'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if key in environ:
+            value = f"{environ[key]},{value}"
+        environ[key] = value
+    return environ
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+class AsyncDispatcher:
+    def __init__(self, app, db, views):
+        self.app = app
+        self.db = db
+        self.views = views
+        self.wsgi = WsgiToAsgi(app)
+        self.urls = app.url_map.bind('localhost')
+        self.async_requests = 0
+        self.sync_requests = 0
+
+    def match(self, scope):
+        try:
+            endpoint, _ = self.urls.match(scope['path'], method=scope['method'])
+        except HTTPException:
+            return None
+        return self.views.get((endpoint, scope['method']))
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        view = self.match(scope) if scope['type'] == 'http' else None
+        if view is None:
+            self.sync_requests += 1
+            return await self.wsgi(scope, receive, send)
+
+        self.async_requests += 1
+        environ = build_environ(scope, await read_body(receive))
+        response = await self.dispatch(view, environ)
+        if hasattr(response.response, '__aiter__'):
+            return await self.stream(response, environ, receive, send)
+        try:
+            headers = response.get_wsgi_headers(environ)
+            body = b''.join(response.get_app_iter(environ))
+        finally:
+            response.close()
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [(key.lower().encode('latin-1'), value.encode('latin-1')) for key, value in headers.items()],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def stream(self, response, environ, receive, send):
+        """Send an async-generator body (e.g. an SSE stream) until it ends or the client leaves"""
+        body = response.response
+        disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [(key.lower().encode('latin-1'), value.encode('latin-1'))
+                        for key, value in response.get_wsgi_headers(environ).items()],
+        })
+        try:
+            async for chunk in body:
+                if disconnected.done():
+                    return
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            await body.aclose()
+
+    async def dispatch(self, view, environ):
+        """Flask's full_dispatch_request with an awaited view"""
+        app = self.app
+        ctx = app.request_context(environ)
+        ctx.push()
+        error = None
+        try:
+            try:
+                rv = app.preprocess_request()
+                if rv is None:
+                    rv = await view(**request.view_args)
+            except Exception as e:
+                rv = app.handle_user_exception(e)
+            return app.finalize_request(rv)
+        except Exception as e:
+            error = e
+            return app.handle_exception(e)
+        finally:
+            ctx.pop(error)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.db.open()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.db.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def stats(self):
+        return {'async_requests': self.async_requests, 'sync_requests': self.sync_requests}
+
+
+def create_asgi_app():
+    app = create_app()
+    db = AsyncPool(
+        mysql.pool.connect_args,
+        min_size=app.config['MYSQL_ASYNC_POOL_MIN_SIZE'],
+        max_size=app.config['MYSQL_ASYNC_POOL_MAX_SIZE']
+    )
+    app.extensions['async_mysql'] = db
+
+    views = {}
+    if not mysql.shards.sharded:
+        from controllers.async_views import VIEWS as views
+    dispatcher = AsyncDispatcher(app, db, views)
+
+    if app.config.get('PERF_INSTRUMENTATION'):
+        instrumentation.add_gauges('async_pool', db.stats)
+        instrumentation.add_gauges('asgi', dispatcher.stats)
+    return dispatcher
+
+
+application = create_asgi_app()
@@ -0,0 +1,6 @@
+"""
+Medilink performance benchmarks
+
+Each module is runnable with ``python -m benchmarks.<name>`` against a local
+MySQL configured through the usual MYSQL_* environment variables.
+"""
@@ -0,0 +1,116 @@
+"""
+Archival benchmark: hot-table latency as history grows
+
+Grows the generated history in equal steps (ten by default, so the total
+ends at 10x the first step) and after each step runs an archive pass,
+then times the hot read paths: a patient's newest timeline page, a
+patient's appointment list and a doctor's day. With archival the hot
+tables only hold recent rows, so latency should stay flat while the total
+grows; run again with --no-archive for the baseline where it does not.
+
+    python -m benchmarks.archival --scale small --step 20000
+    python -m benchmarks.archival --scale small --step 20000 --no-archive
+"""
+
+import argparse
+import random
+from datetime import date, timedelta
+
+from benchmarks.common import BenchMySQL, percentile, report, timed
+from benchmarks.datagen import DOCTOR_PREFIX, EMAIL_DOMAIN, SCALES, generate, ids
+from controllers.archive import SPECS, Archiver
+from controllers.record_timeline import FULL_TEXT_COLUMNS, PAGE_SIZE, PREVIEW_CHARS, SUMMARY_QUERY
+from controllers.schedule import DAY_QUERY
+
+TIMELINE_QUERY = SUMMARY_QUERY.format(preview=PREVIEW_CHARS, older='', table='medical_records',
+                                      full=FULL_TEXT_COLUMNS)
+
+APPOINTMENTS_QUERY = """
+    SELECT a.*, d.full_name AS doctor_name, d.specialization
+    FROM appointments a
+    JOIN doctors d ON d.doctor_id = a.doctor_id
+    WHERE a.patient_id = %s
+    ORDER BY a.appointment_date DESC, a.appointment_time DESC
+"""
+
+
+def count(cursor, table):
+    cursor.execute(f"SELECT COUNT(*) AS n FROM {table}")
+    return cursor.fetchone()['n']
+
+
+def totals(conn, archived):
+    """(hot rows, all rows) over appointments and medical records"""
+    cursor = conn.cursor()
+    hot = sum(count(cursor, spec.table) for spec in SPECS)
+    cold = sum(count(cursor, spec.archive) for spec in SPECS) if archived else 0
+    cursor.close()
+    conn.commit()
+    return hot, hot + cold
+
+
+def measure(conn, patient_ids, doctor_ids, queries):
+    rng = random.Random(11)
+    cursor = conn.cursor()
+    samples = {'timeline': [], 'appointments': [], 'doctor_day': []}
+    for _ in range(queries):
+        day = date.today() - timedelta(days=rng.randrange(30))
+        for name, sql, params in (
+            ('timeline', TIMELINE_QUERY, (rng.choice(patient_ids), PAGE_SIZE + 1)),
+            ('appointments', APPOINTMENTS_QUERY, (rng.choice(patient_ids),)),
+            ('doctor_day', DAY_QUERY, (rng.choice(doctor_ids), day)),
+        ):
+            _, elapsed = timed(lambda: (cursor.execute(sql, params), cursor.fetchall()))
+            samples[name].append(elapsed)
+    cursor.close()
+    conn.commit()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small',
+                        help='doctor and patient counts to generate history for')
+    parser.add_argument('--step', type=int, default=20000,
+                        help='appointments and records added per step')
+    parser.add_argument('--steps', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=300, help='timed queries per path per step')
+    parser.add_argument('--no-archive', action='store_true', help='baseline without archive passes')
+    args = parser.parse_args()
+
+    bench = BenchMySQL()
+    conn = bench.connection
+    scale = SCALES[args.scale]
+    archiver = Archiver([bench.pool], batch_size=5000, max_batches=10000)
+    archived = not args.no_archive
+    if archived:
+        archiver.prepare()
+
+    rows = []
+    for step in range(1, args.steps + 1):
+        cursor = conn.cursor()
+        hot_appointments = count(cursor, 'appointments')
+        hot_records = count(cursor, 'medical_records')
+        cursor.close()
+        generate(conn, scale['doctors'], scale['patients'],
+                 hot_appointments + args.step, hot_records + args.step, seed=step)
+        if archived:
+            archiver.run()
+
+        cursor = conn.cursor()
+        doctor_ids = ids(cursor, "SELECT doctor_id FROM doctors WHERE doctor_code LIKE %s", f"{DOCTOR_PREFIX}%")
+        patient_ids = ids(cursor, "SELECT patient_id FROM patients WHERE email LIKE %s", f"%@{EMAIL_DOMAIN}")
+        cursor.close()
+        hot, total = totals(conn, archived)
+        samples = measure(conn, patient_ids, doctor_ids, args.queries)
+        rows.append((f'step {step} rows hot/total', f"{hot} / {total}"))
+        for name, times in samples.items():
+            rows.append((f'step {step} {name} p50/p95 (ms)',
+                         f"{percentile(times, 50) * 1000:.2f} / {percentile(times, 95) * 1000:.2f}"))
+
+    mode = 'without archival' if args.no_archive else 'with archival'
+    report(f"Hot read latency over {args.steps} history steps of {args.step} rows, {mode}", rows)
+
+
+if __name__ == '__main__':
+    main()
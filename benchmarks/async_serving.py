@@ -0,0 +1,203 @@
+"""
+Async vs threaded serving benchmark
+
+Starts the app twice, as Flask's threaded server (app.run, one thread per
+connection) and as uvicorn serving asgi.py, and drives each with the same
+number of concurrent keep-alive clients logged in as generated patients.
+Reports requests/second, latency percentiles and the server's memory
+(RSS) per open connection.
+
+    python -m benchmarks.datagen --scale small
+    ulimit -n 8192
+    python -m benchmarks.async_serving --clients 1000 --seconds 30
+    python -m benchmarks.async_serving --route "/patient/api/available-slots"
+"""
+
+import argparse
+import asyncio
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlencode
+
+from benchmarks.common import percentile, report
+from benchmarks.datagen import PASSWORD
+from benchmarks.load_test import load_accounts
+
+SERVERS = {
+    'threaded-wsgi': lambda host, port: [
+        sys.executable, '-c',
+        f"from app import create_app; create_app().run(host={host!r}, port={port}, "
+        f"threaded=True, debug=False, use_reloader=False)"
+    ],
+    'asgi': lambda host, port: [
+        sys.executable, '-m', 'uvicorn', 'asgi:application', '--host', host, '--port', str(port),
+        '--log-level', 'warning', '--backlog', '4096', '--no-access-log'
+    ],
+}
+
+
+def rss_kb(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def wait_for_port(host, port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f"Server on {host}:{port} did not start")
+
+
+class Client:
+    """One keep-alive HTTP/1.1 connection with its own session cookie"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.cookies = {}
+        self.reader = self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def request(self, method, path, form=None):
+        if self.writer is None:
+            await self.connect()
+        body = urlencode(form).encode() if form else b''
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}"]
+        if self.cookies:
+            lines.append('Cookie: ' + '; '.join(f"{k}={v}" for k, v in self.cookies.items()))
+        if form:
+            lines += ['Content-Type: application/x-www-form-urlencoded', f"Content-Length: {len(body)}"]
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            name, value = name.strip().lower(), value.strip()
+            if name == 'set-cookie':
+                key, _, rest = value.partition('=')
+                self.cookies[key] = rest.split(';', 1)[0]
+            headers[name] = value
+
+        if headers.get('transfer-encoding') == 'chunked':
+            while True:
+                size = int((await self.reader.readline()).strip(), 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        elif 'content-length' in headers:
+            await self.reader.readexactly(int(headers['content-length']))
+        if headers.get('connection', '').lower() == 'close':
+            self.writer.close()
+            self.writer = None
+        return status
+
+
+async def drive(host, port, clients, seconds, route, emails, pid):
+    logins = asyncio.Semaphore(8)
+    ready = [0]
+    all_ready = asyncio.Event()
+    start = asyncio.Event()
+    samples = []
+    errors = [0]
+    stop = [0.0]
+
+    async def user(n):
+        client = Client(host, port)
+        async with logins:
+            for _ in range(40):
+                status = await client.request('POST', '/patient/login',
+                                              {'email': emails[n % len(emails)], 'password': PASSWORD})
+                if status != 503:
+                    break
+                await asyncio.sleep(0.25)
+        ready[0] += 1
+        if ready[0] == clients:
+            all_ready.set()
+        await start.wait()
+        while time.perf_counter() < stop[0]:
+            started = time.perf_counter()
+            try:
+                status = await client.request('GET', route)
+            except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+                errors[0] += 1
+                client.writer = None
+                continue
+            samples.append(time.perf_counter() - started)
+            if status >= 400:
+                errors[0] += 1
+        if client.writer is not None:
+            client.writer.close()
+
+    idle = rss_kb(pid)
+    tasks = [asyncio.create_task(user(n)) for n in range(clients)]
+    await all_ready.wait()
+    connected = rss_kb(pid)
+    stop[0] = time.perf_counter() + seconds
+    started = time.perf_counter()
+    start.set()
+    peak = connected
+    while time.perf_counter() < stop[0]:
+        await asyncio.sleep(0.5)
+        peak = max(peak, rss_kb(pid))
+    await asyncio.gather(*tasks)
+    wall = time.perf_counter() - started
+    return {
+        'requests': len(samples),
+        'errors': errors[0],
+        'rps': len(samples) / wall,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'rss_idle_mb': idle / 1024,
+        'rss_peak_mb': peak / 1024,
+        'kb_per_connection': (peak - idle) / clients,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--route', default='/patient/medical-records')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5090)
+    parser.add_argument('--servers', default=','.join(SERVERS), help='comma-separated subset of ' + ', '.join(SERVERS))
+    args = parser.parse_args()
+
+    emails = load_accounts()['patients']
+    rows = []
+    for name in args.servers.split(','):
+        server = subprocess.Popen(SERVERS[name](args.host, args.port), stdout=subprocess.DEVNULL)
+        try:
+            wait_for_port(args.host, args.port)
+            result = asyncio.run(drive(args.host, args.port, args.clients, args.seconds,
+                                       args.route, emails, server.pid))
+        finally:
+            server.terminate()
+            server.wait()
+        rows += [
+            (f'{name} req/s', f"{result['rps']:.0f} ({result['errors']} errors)"),
+            (f'{name} p50/p99 (ms)', f"{result['p50_ms']:.1f} / {result['p99_ms']:.1f}"),
+            (f'{name} RSS idle/peak (MB)', f"{result['rss_idle_mb']:.0f} / {result['rss_peak_mb']:.0f}"),
+            (f'{name} KB per connection', f"{result['kb_per_connection']:.0f}"),
+        ]
+    report(f"GET {args.route} with {args.clients} concurrent clients", rows)
+
+
+if __name__ == '__main__':
+    main()
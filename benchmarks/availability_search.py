@@ -0,0 +1,121 @@
+"""
+Availability search benchmark
+
+Times the real free-slot search path against the local database: the bulk
+booked-slot query plus the bitset fold, for many doctors over a date range,
+next to the naive baseline of one booked-slot query per doctor and day.
+The bulk path is also split into query and compute time. --synthetic
+skips MySQL and times only the bitset computation over random bookings.
+
+    python -m benchmarks.datagen --scale medium
+    python -m benchmarks.availability_search --doctors 50 --days 14
+    python -m benchmarks.availability_search --synthetic
+"""
+
+import argparse
+import random
+from datetime import date, timedelta
+
+from benchmarks.common import BenchMySQL, percentile, report, timed
+from controllers import availability
+
+PER_DAY_QUERY = """
+    SELECT appointment_time FROM appointments
+    WHERE doctor_id = %s AND appointment_date = %s AND status != 'Cancelled'
+"""
+
+
+def synthetic_booked(doctors, start, days, grid, fill, rng):
+    booked = {}
+    for doctor in doctors:
+        for offset in range(days):
+            key = (doctor['doctor_id'], (start + timedelta(days=offset)).isoformat())
+            bits = 0
+            for index in range(grid.count):
+                if rng.random() < fill:
+                    bits |= 1 << index
+            booked[key] = bits
+    return booked
+
+
+def per_day_search(conn, doctors, start, end, grid):
+    """Baseline: one query per doctor and day"""
+    booked = {}
+    cursor = conn.cursor()
+    for doctor in doctors:
+        day = start
+        while day <= end:
+            cursor.execute(PER_DAY_QUERY, (doctor['doctor_id'], day))
+            rows = [dict(row, doctor_id=doctor['doctor_id'], appointment_date=day) for row in cursor.fetchall()]
+            booked.update(availability.fold_booked(rows, grid))
+            day += timedelta(days=1)
+    cursor.close()
+    return availability.free_slots(doctors, booked, start, end, grid)
+
+
+def free_count(result):
+    return sum(len(times) for doctor in result for times in doctor['slots'].values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--doctors', type=int, default=50)
+    parser.add_argument('--days', type=int, default=14)
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--synthetic', action='store_true', help='time only the bitset work on random bookings')
+    parser.add_argument('--fill', type=float, default=0.6, help='fraction of synthetic slots booked')
+    args = parser.parse_args()
+
+    grid = availability.SlotGrid()
+    start = date.today() + timedelta(days=1)
+    end = start + timedelta(days=args.days - 1)
+    title = f'Availability search ({args.doctors} doctors, {args.days} days)'
+
+    if args.synthetic:
+        doctors = [{'doctor_id': i, 'full_name': f'Doctor {i}'} for i in range(1, args.doctors + 1)]
+        booked = synthetic_booked(doctors, start, args.days, grid, args.fill, random.Random(7))
+        run = lambda: availability.free_slots(doctors, booked, start, end, grid)
+        samples = [timed(run)[1] for _ in range(args.runs)]
+        report(title, [
+            ('source', 'synthetic (bitset work only)'),
+            ('free slots returned', free_count(run())),
+            ('p50 (ms)', percentile(samples, 50) * 1000),
+            ('p99 (ms)', percentile(samples, 99) * 1000),
+        ])
+        return
+
+    conn = BenchMySQL().connection
+    cursor = conn.cursor()
+    cursor.execute("SELECT doctor_id, full_name FROM doctors ORDER BY doctor_id LIMIT %s", (args.doctors,))
+    doctors = cursor.fetchall()
+    cursor.close()
+    doctor_ids = [doctor['doctor_id'] for doctor in doctors]
+
+    query_samples, compute_samples, bulk_samples = [], [], []
+    for _ in range(args.runs):
+        booked, query_time = timed(availability.load_booked, conn, doctor_ids, start, end, grid)
+        _, compute_time = timed(availability.free_slots, doctors, booked, start, end, grid)
+        query_samples.append(query_time)
+        compute_samples.append(compute_time)
+        bulk_samples.append(query_time + compute_time)
+    baseline_samples = [timed(per_day_search, conn, doctors, start, end, grid)[1]
+                        for _ in range(max(1, args.runs // 10))]
+
+    bulk = availability.search(conn, doctors, start, end, grid)
+    baseline = per_day_search(conn, doctors, start, end, grid)
+    speedup = percentile(baseline_samples, 50) / max(percentile(bulk_samples, 50), 1e-9)
+    report(title, [
+        ('source', 'mysql'),
+        ('free slots returned', f"{free_count(bulk)} (baseline {free_count(baseline)})"),
+        ('bulk search p50 / p99 (ms)',
+         f"{percentile(bulk_samples, 50) * 1000:.2f} / {percentile(bulk_samples, 99) * 1000:.2f}"),
+        ('  query p50 (ms)', percentile(query_samples, 50) * 1000),
+        ('  bitset p50 (ms)', percentile(compute_samples, 50) * 1000),
+        ('per-day queries p50 / p99 (ms)',
+         f"{percentile(baseline_samples, 50) * 1000:.2f} / {percentile(baseline_samples, 99) * 1000:.2f}"),
+        ('speedup at p50', f"{speedup:.1f}x"),
+    ])
+
+
+if __name__ == '__main__':
+    main()
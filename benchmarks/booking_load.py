@@ -0,0 +1,112 @@
+"""
+Booking rush benchmark
+
+Fires thousands of concurrent booking attempts at a handful of slots and
+reports throughput, latency percentiles and the number of double bookings
+(which must be zero).
+
+    python -m benchmarks.booking_load --attempts 5000 --slots 5 --threads 200
+"""
+
+import argparse
+import threading
+import time
+from datetime import date, timedelta
+
+from benchmarks.common import BenchMySQL, percentile, report
+from controllers.booking import BookingEngine, BOOKED, SLOT_TAKEN
+
+
+def pick_ids(conn, doctors):
+    cursor = conn.cursor()
+    cursor.execute("SELECT doctor_id FROM doctors ORDER BY doctor_id LIMIT %s", (doctors,))
+    doctor_ids = [row['doctor_id'] for row in cursor.fetchall()]
+    cursor.execute("SELECT patient_id FROM patients ORDER BY patient_id LIMIT 1")
+    patient = cursor.fetchone()
+    cursor.close()
+    if not doctor_ids or not patient:
+        raise SystemExit("Benchmark needs at least one doctor and one patient in the database")
+    return doctor_ids, patient['patient_id']
+
+
+def cleanup(conn, day):
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM appointments WHERE appointment_date = %s AND reason = 'bench'", (day,))
+    conn.commit()
+    cursor.close()
+
+
+def count_double_bookings(conn, day):
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT COUNT(*) AS dupes FROM (
+            SELECT doctor_id, appointment_time
+            FROM appointments
+            WHERE appointment_date = %s AND reason = 'bench' AND status != 'Cancelled'
+            GROUP BY doctor_id, appointment_time
+            HAVING COUNT(*) > 1
+        ) AS d
+    """, (day,))
+    dupes = cursor.fetchone()['dupes']
+    cursor.close()
+    return dupes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--attempts', type=int, default=5000)
+    parser.add_argument('--slots', type=int, default=5)
+    parser.add_argument('--threads', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    mysql = BenchMySQL(max_size=args.workers + 2)
+    day = (date.today() + timedelta(days=3650)).isoformat()
+    doctor_ids, patient_id = pick_ids(mysql.connection, args.slots)
+    slots = [(doctor_ids[i % len(doctor_ids)], f"{9 + i // len(doctor_ids):02d}:00:00")
+             for i in range(args.slots)]
+    cleanup(mysql.connection, day)
+
+    engine = BookingEngine(mysql, workers=args.workers)
+    latencies = []
+    outcomes = {BOOKED: 0, SLOT_TAKEN: 0}
+    lock = threading.Lock()
+    counter = iter(range(args.attempts))
+
+    def client():
+        for i in counter:
+            doctor_id, slot_time = slots[i % len(slots)]
+            started = time.perf_counter()
+            result = engine.book(patient_id, doctor_id, day, slot_time, 'bench')
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                outcomes[result.status] = outcomes.get(result.status, 0) + 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    dupes = count_double_bookings(mysql.connection, day)
+    report('Booking rush', [
+        ('attempts', args.attempts),
+        ('slots', len(slots)),
+        ('booked', outcomes.get(BOOKED, 0)),
+        ('slot taken', outcomes.get(SLOT_TAKEN, 0)),
+        ('failed', args.attempts - outcomes.get(BOOKED, 0) - outcomes.get(SLOT_TAKEN, 0)),
+        ('throughput (req/s)', args.attempts / wall),
+        ('p50 latency (ms)', percentile(latencies, 50) * 1000),
+        ('p99 latency (ms)', percentile(latencies, 99) * 1000),
+        ('double bookings', dupes),
+    ])
+    cleanup(mysql.connection, day)
+    if dupes:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
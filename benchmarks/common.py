@@ -0,0 +1,65 @@
+"""
+Shared helpers for the benchmark scripts
+"""
+
+import os
+import time
+
+import pymysql
+
+from database.pool import ConnectionPool
+
+
+class BenchMySQL:
+    """Minimal stand-in for the app's ``MySQL`` wrapper backed by a pool"""
+
+    def __init__(self, max_size=20):
+        self.pool = ConnectionPool(connect_args(), min_size=1, max_size=max_size)
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None or not self._connection.open:
+            self._connection = pymysql.connect(**connect_args())
+        return self._connection
+
+    primary_connection = connection
+
+
+def connect_args(**overrides):
+    args = dict(
+        host=os.getenv('MYSQL_HOST', 'localhost'),
+        user=os.getenv('MYSQL_USER', 'root'),
+        password=os.getenv('MYSQL_PASSWORD', ''),
+        database=os.getenv('MYSQL_DB', 'medilink_db'),
+        cursorclass=pymysql.cursors.DictCursor
+    )
+    args.update(overrides)
+    return args
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def timed(fn, *args, **kwargs):
+    """Call fn and return (result, elapsed seconds)"""
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def report(title, rows):
+    """Print a simple aligned key/value report"""
+    print(f"\n{title}")
+    print('-' * len(title))
+    width = max(len(key) for key, _ in rows)
+    for key, value in rows:
+        if isinstance(value, float):
+            value = f"{value:.3f}"
+        print(f"{key.ljust(width)}  {value}")
@@ -0,0 +1,210 @@
+"""
+Synthetic hospital data generator
+
+Fills a local MySQL database with doctors, patients, appointments and
+medical records at a configurable scale. Every generated account shares
+one password (hashed once) and is tagged so it can be found by the load
+test and removed with --purge:
+
+    doctors   doctor_code BENCH00001 ...
+    patients  email bench-patient-1@medilink.test ...
+
+    python -m benchmarks.datagen --scale medium
+    python -m benchmarks.datagen --doctors 50 --patients 20000 --appointments 200000
+    python -m benchmarks.datagen --purge
+"""
+
+import argparse
+import random
+from datetime import date, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from benchmarks.common import BenchMySQL
+from controllers.passwords import DEFAULT_METHOD
+
+PASSWORD = 'bench-password'
+DOCTOR_PREFIX = 'BENCH'
+EMAIL_DOMAIN = 'medilink.test'
+
+SCALES = {
+    'small': dict(doctors=10, patients=1000, appointments=5000, records=5000),
+    'medium': dict(doctors=50, patients=20000, appointments=100000, records=100000),
+    'large': dict(doctors=200, patients=200000, appointments=2000000, records=2000000),
+}
+
+SPECIALIZATIONS = ['Cardiology', 'Dermatology', 'General Medicine', 'Neurology', 'Orthopedics',
+                   'Pediatrics', 'Psychiatry', 'ENT', 'Gynecology', 'Ophthalmology']
+FIRST_NAMES = ['Ayesha', 'Bilal', 'Chen', 'Daniel', 'Elif', 'Farah', 'Hassan', 'Imran', 'Julia',
+               'Kamal', 'Leila', 'Mahtab', 'Nadia', 'Omar', 'Priya', 'Rahul', 'Sara', 'Tariq']
+LAST_NAMES = ['Ahmed', 'Khan', 'Rahman', 'Hossain', 'Chowdhury', 'Islam', 'Das', 'Smith', 'Lee']
+REASONS = ['Routine checkup', 'Follow-up visit', 'Persistent cough', 'Chest pain', 'Skin rash',
+           'Headache', 'Back pain', 'Fever', 'Vaccination', 'Lab results review']
+DIAGNOSES = ['Hypertension', 'Type 2 diabetes', 'Asthma', 'Migraine', 'Gastritis', 'Bronchitis',
+             'Anemia', 'Viral fever', 'Sinusitis', 'Allergic rhinitis']
+PRESCRIPTIONS = ['Paracetamol 500mg', 'Amoxicillin 250mg', 'Metformin 500mg', 'Amlodipine 5mg',
+                 'Omeprazole 20mg', 'Salbutamol inhaler', 'Cetirizine 10mg']
+
+SLOTS_PER_DAY = 16
+APPOINTMENT_DAYS = 720
+
+
+def doctor_code(n):
+    return f"{DOCTOR_PREFIX}{n:05d}"
+
+
+def patient_email(n):
+    return f"bench-patient-{n}@{EMAIL_DOMAIN}"
+
+
+def slot_time(index):
+    minutes = 9 * 60 + index * 30
+    return f"{minutes // 60:02d}:{minutes % 60:02d}:00"
+
+
+def ids(cursor, query, *params):
+    cursor.execute(query, params)
+    return [next(iter(row.values())) for row in cursor.fetchall()]
+
+
+def insert_batches(conn, cursor, sql, rows, batch):
+    """executemany in batches from a row generator; returns the row count"""
+    pending = []
+    total = 0
+    for row in rows:
+        pending.append(row)
+        if len(pending) >= batch:
+            cursor.executemany(sql, pending)
+            conn.commit()
+            total += len(pending)
+            pending = []
+    if pending:
+        cursor.executemany(sql, pending)
+        conn.commit()
+        total += len(pending)
+    return total
+
+
+def generate(conn, doctors, patients, appointments, records, seed=7, batch=5000):
+    """Top the bench data up to the requested counts; returns rows inserted per table"""
+    rng = random.Random(seed)
+    pwhash = generate_password_hash(PASSWORD, method=DEFAULT_METHOD)
+    cursor = conn.cursor()
+    inserted = {}
+
+    existing = len(ids(cursor, "SELECT doctor_id FROM doctors WHERE doctor_code LIKE %s", f"{DOCTOR_PREFIX}%"))
+    inserted['doctors'] = insert_batches(conn, cursor, """
+        INSERT INTO doctors (doctor_code, full_name, specialization, email, phone, password)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, (
+        (doctor_code(n), f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+         SPECIALIZATIONS[n % len(SPECIALIZATIONS)], f"bench-doctor-{n}@{EMAIL_DOMAIN}",
+         f"017{n:08d}", pwhash)
+        for n in range(existing + 1, doctors + 1)
+    ), batch)
+
+    existing = len(ids(cursor, "SELECT patient_id FROM patients WHERE email LIKE %s", f"%@{EMAIL_DOMAIN}"))
+    inserted['patients'] = insert_batches(conn, cursor, """
+        INSERT INTO patients (full_name, age, gender, phone, email, password, address, blood_group)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """, (
+        (f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", rng.randint(1, 95),
+         rng.choice(['Male', 'Female']), f"018{n:08d}", patient_email(n), pwhash,
+         f"{rng.randint(1, 200)} Bench Road", rng.choice(['A+', 'B+', 'O+', 'AB+', 'O-']))
+        for n in range(existing + 1, patients + 1)
+    ), batch)
+
+    doctor_ids = ids(cursor, "SELECT doctor_id FROM doctors WHERE doctor_code LIKE %s", f"{DOCTOR_PREFIX}%")
+    patient_ids = ids(cursor, "SELECT patient_id FROM patients WHERE email LIKE %s", f"%@{EMAIL_DOMAIN}")
+    doctor_ids, patient_ids = doctor_ids[:doctors], patient_ids[:patients]
+
+    # Appointments fill distinct doctor/day/slot cells, half in the past, half ahead
+    existing = ids(cursor, """
+        SELECT COUNT(*) FROM appointments a JOIN doctors d ON d.doctor_id = a.doctor_id
+        WHERE d.doctor_code LIKE %s
+    """, f"{DOCTOR_PREFIX}%")[0]
+    capacity = len(doctor_ids) * APPOINTMENT_DAYS * SLOTS_PER_DAY
+    first_day = date.today() - timedelta(days=APPOINTMENT_DAYS // 2)
+
+    def appointment_rows():
+        for n in range(existing, min(appointments, capacity)):
+            cell = (n * 7919) % capacity
+            doctor_index, rest = divmod(cell, APPOINTMENT_DAYS * SLOTS_PER_DAY)
+            day_index, slot = divmod(rest, SLOTS_PER_DAY)
+            day = first_day + timedelta(days=day_index)
+            if day < date.today():
+                status = rng.choices(['Completed', 'Cancelled', 'Scheduled'], [80, 15, 5])[0]
+            else:
+                status = rng.choices(['Scheduled', 'Cancelled'], [90, 10])[0]
+            yield (rng.choice(patient_ids), doctor_ids[doctor_index], day, slot_time(slot),
+                   rng.choice(REASONS), status)
+
+    inserted['appointments'] = insert_batches(conn, cursor, """
+        INSERT IGNORE INTO appointments
+            (patient_id, doctor_id, appointment_date, appointment_time, reason, status)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, appointment_rows(), batch)
+
+    existing = ids(cursor, """
+        SELECT COUNT(*) FROM medical_records r JOIN doctors d ON d.doctor_id = r.doctor_id
+        WHERE d.doctor_code LIKE %s
+    """, f"{DOCTOR_PREFIX}%")[0]
+    inserted['records'] = insert_batches(conn, cursor, """
+        INSERT INTO medical_records
+            (patient_id, doctor_id, visit_date, diagnosis, symptoms, prescription, tests_recommended, notes)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """, (
+        (rng.choice(patient_ids), rng.choice(doctor_ids),
+         date.today() - timedelta(days=rng.randrange(3650)), rng.choice(DIAGNOSES),
+         rng.choice(REASONS), rng.choice(PRESCRIPTIONS), 'CBC', 'Generated for benchmarking')
+        for _ in range(existing, records)
+    ), batch)
+
+    cursor.close()
+    return inserted
+
+
+def purge(conn, batch=10000):
+    """Delete every generated row, children first"""
+    cursor = conn.cursor()
+    doctor_ids = ids(cursor, "SELECT doctor_id FROM doctors WHERE doctor_code LIKE %s", f"{DOCTOR_PREFIX}%")
+    patient_ids = ids(cursor, "SELECT patient_id FROM patients WHERE email LIKE %s", f"%@{EMAIL_DOMAIN}")
+    for table, column, values in (('medical_records', 'patient_id', patient_ids),
+                                  ('medical_records', 'doctor_id', doctor_ids),
+                                  ('appointments', 'patient_id', patient_ids),
+                                  ('appointments', 'doctor_id', doctor_ids),
+                                  ('patients', 'patient_id', patient_ids),
+                                  ('doctors', 'doctor_id', doctor_ids)):
+        for offset in range(0, len(values), batch):
+            chunk = values[offset:offset + batch]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"DELETE FROM {table} WHERE {column} IN ({placeholders})", chunk)
+            conn.commit()
+    cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    for table in ('doctors', 'patients', 'appointments', 'records'):
+        parser.add_argument(f'--{table}', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--purge', action='store_true', help='delete all generated data')
+    args = parser.parse_args()
+
+    conn = BenchMySQL().connection
+    if args.purge:
+        purge(conn)
+        print("Generated data removed")
+        return
+
+    counts = dict(SCALES[args.scale])
+    for table in counts:
+        if getattr(args, table) is not None:
+            counts[table] = getattr(args, table)
+    inserted = generate(conn, seed=args.seed, **counts)
+    print(', '.join(f"{table}: +{n}" for table, n in inserted.items()))
+
+
+if __name__ == '__main__':
+    main()
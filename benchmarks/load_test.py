@@ -0,0 +1,278 @@
+"""
+Route load test with scripted user journeys
+
+Runs concurrent patient and doctor journeys through the real Flask routes
+against the data made by benchmarks.datagen, and reports throughput and
+latency percentiles per route. Results can be saved as a baseline and later
+runs compared with it; the exit status is 1 when any route's p95 regressed
+past --tolerance.
+
+With --url the simulated users are keep-alive HTTP clients of a server you
+started (gunicorn, uvicorn asgi:application, ...), so the numbers include
+the server's own worker processes and threads. Without it the journeys
+call the app in this process through the Flask test client: handy for
+comparing route costs between commits, but every user is a thread sharing
+one GIL with the app, so the throughput is that of a single process and
+says nothing about how the site scales with workers.
+
+    python -m benchmarks.datagen --scale small
+    gunicorn -w 4 --threads 8 -b 127.0.0.1:8000 "app:create_app()"
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --users 64 --seconds 60 \
+        --save-baseline bench-baseline.json
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --users 64 --seconds 60 \
+        --baseline bench-baseline.json
+    python -m benchmarks.load_test --users 16 --seconds 60    # in-process
+
+Patient journey: login, dashboard, appointments, free slots, book,
+medical records, logout. Doctor journey: login, dashboard, appointments,
+patient details, add record, logout.
+"""
+
+import argparse
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import urlencode, urlsplit
+
+from benchmarks.common import BenchMySQL, percentile, report
+from benchmarks.datagen import DOCTOR_PREFIX, EMAIL_DOMAIN, PASSWORD, ids
+
+
+class HttpResponse:
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.data = data
+
+    def get_json(self):
+        try:
+            return json.loads(self.data)
+        except ValueError:
+            return None
+
+
+class HttpClient:
+    """Keep-alive HTTP client for a running server with the test client's get/post; one per user"""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.cookies = {}
+        self.conn = None
+
+    def open(self, method, path, query_string=None, data=None):
+        if query_string:
+            path += '?' + urlencode(query_string)
+        body = urlencode(data).encode() if data else None
+        headers = {}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f"{name}={value}" for name, value in self.cookies.items())
+        if body is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            try:
+                self.conn.request(method, self.prefix + path, body, headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                # The server closed an idle keep-alive connection; reconnect once
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+        for cookie in response.headers.get_all('Set-Cookie') or []:
+            name, _, value = cookie.partition(';')[0].partition('=')
+            if value:
+                self.cookies[name.strip()] = value
+            else:
+                self.cookies.pop(name.strip(), None)
+        return HttpResponse(response.status, data)
+
+    def get(self, path, query_string=None):
+        return self.open('GET', path, query_string=query_string)
+
+    def post(self, path, data=None):
+        return self.open('POST', path, data=data)
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def call(self, route, send, *args, **kwargs):
+        started = time.perf_counter()
+        response = send(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.samples.setdefault(route, []).append(elapsed)
+            if response.status_code >= 400:
+                self.errors[route] = self.errors.get(route, 0) + 1
+        return response
+
+    def summary(self, wall):
+        routes = {}
+        for route, samples in sorted(self.samples.items()):
+            routes[route] = {
+                'requests': len(samples),
+                'errors': self.errors.get(route, 0),
+                'throughput_rps': round(len(samples) / wall, 2),
+                'p50_ms': round(percentile(samples, 50) * 1000, 2),
+                'p95_ms': round(percentile(samples, 95) * 1000, 2),
+                'p99_ms': round(percentile(samples, 99) * 1000, 2),
+            }
+        return routes
+
+
+def patient_journey(client, rec, email, rng):
+    rec.call('POST /patient/login', client.post, '/patient/login',
+             data={'email': email, 'password': PASSWORD})
+    rec.call('GET /patient/dashboard', client.get, '/patient/dashboard')
+    rec.call('GET /patient/appointments', client.get, '/patient/appointments')
+
+    start = date.today() + timedelta(days=rng.randint(1, 30))
+    slots = rec.call('GET /patient/api/available-slots', client.get, '/patient/api/available-slots',
+                     query_string={'start': start.isoformat(), 'end': (start + timedelta(days=6)).isoformat()})
+    free = [(doctor['doctor_id'], day, times)
+            for doctor in (slots.get_json() or {}).get('doctors', [])
+            for day, times in doctor['slots'].items()]
+    if free:
+        doctor_id, day, times = rng.choice(free)
+        rec.call('POST /patient/book-appointment', client.post, '/patient/book-appointment', data={
+            'doctor_id': doctor_id, 'appointment_date': day,
+            'appointment_time': rng.choice(times), 'reason': 'Load test booking'})
+
+    rec.call('GET /patient/medical-records', client.get, '/patient/medical-records')
+    rec.call('GET /logout', client.get, '/logout')
+
+
+def doctor_journey(client, rec, code, patient_id):
+    rec.call('POST /doctor/login', client.post, '/doctor/login',
+             data={'doctor_code': code, 'password': PASSWORD})
+    rec.call('GET /doctor/dashboard', client.get, '/doctor/dashboard')
+    rec.call('GET /doctor/appointments', client.get, '/doctor/appointments')
+    rec.call('GET /doctor/patient/<id>', client.get, f'/doctor/patient/{patient_id}')
+    rec.call('POST /doctor/patient/<id>/add-record', client.post, f'/doctor/patient/{patient_id}/add-record', data={
+        'diagnosis': 'Load test', 'symptoms': 'None', 'prescription': 'Rest',
+        'tests_recommended': '', 'notes': 'Generated by benchmarks.load_test', 'follow_up_date': ''})
+    rec.call('GET /logout', client.get, '/logout')
+
+
+def run(make_client, users, seconds, doctor_share, accounts, seed):
+    """Run journeys for `seconds`; make_client() gives each user its own client"""
+    rec = Recorder()
+    stop = time.perf_counter() + seconds
+    journeys = [0]
+    lock = threading.Lock()
+
+    def user(n):
+        rng = random.Random(seed + n)
+        client = make_client()
+        while time.perf_counter() < stop:
+            if rng.random() < doctor_share:
+                doctor_journey(client, rec, rng.choice(accounts['doctors']), rng.choice(accounts['patient_ids']))
+            else:
+                patient_journey(client, rec, rng.choice(accounts['patients']), rng)
+            with lock:
+                journeys[0] += 1
+
+    threads = [threading.Thread(target=user, args=(n,)) for n in range(users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    return {'users': users, 'seconds': round(wall, 2), 'journeys': journeys[0], 'routes': rec.summary(wall)}
+
+
+def load_accounts(limit=1000):
+    conn = BenchMySQL().connection
+    cursor = conn.cursor()
+    accounts = {
+        'doctors': ids(cursor, "SELECT doctor_code FROM doctors WHERE doctor_code LIKE %s LIMIT %s",
+                       f"{DOCTOR_PREFIX}%", limit),
+        'patients': ids(cursor, "SELECT email FROM patients WHERE email LIKE %s LIMIT %s",
+                        f"%@{EMAIL_DOMAIN}", limit),
+        'patient_ids': ids(cursor, "SELECT patient_id FROM patients WHERE email LIKE %s LIMIT %s",
+                           f"%@{EMAIL_DOMAIN}", limit),
+    }
+    cursor.close()
+    if not accounts['doctors'] or not accounts['patients']:
+        raise SystemExit("No generated accounts found; run python -m benchmarks.datagen first")
+    return accounts
+
+
+def compare(results, baseline, tolerance):
+    """Rows comparing p95 per route with the baseline, and whether any regressed"""
+    rows = []
+    regressed = False
+    for route, current in results['routes'].items():
+        before = baseline['routes'].get(route)
+        if not before or not before['p95_ms']:
+            rows.append((f'{route} p95 (ms)', f"{current['p95_ms']} (new)"))
+            continue
+        change = current['p95_ms'] / before['p95_ms'] - 1
+        flag = ''
+        if change > tolerance:
+            flag = '  REGRESSION'
+            regressed = True
+        rows.append((f'{route} p95 (ms)', f"{before['p95_ms']} -> {current['p95_ms']} ({change:+.0%}){flag}"))
+    return rows, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=16, help='concurrent simulated users')
+    parser.add_argument('--seconds', type=float, default=60)
+    parser.add_argument('--doctor-share', type=float, default=0.3, help='fraction of doctor journeys')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save-baseline', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare with a saved baseline JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p95 slowdown (0.2 = 20%%)')
+    parser.add_argument('--url', help='drive a running server at this URL instead of the app in this process')
+    args = parser.parse_args()
+
+    if args.url:
+        def make_client():
+            return HttpClient(args.url)
+    else:
+        from app import create_app
+        make_client = create_app().test_client
+    accounts = load_accounts()
+    results = run(make_client, args.users, args.seconds, args.doctor_share, accounts, args.seed)
+    results['target'] = args.url or 'in-process'
+
+    rows = [('journeys', results['journeys'])]
+    for route, stats in results['routes'].items():
+        rows.append((f'{route} req/s', stats['throughput_rps']))
+        rows.append((f'{route} p50/p95/p99 (ms)', f"{stats['p50_ms']} / {stats['p95_ms']} / {stats['p99_ms']}"))
+        if stats['errors']:
+            rows.append((f'{route} errors', stats['errors']))
+    report(f"Load test ({args.users} users, {results['seconds']}s)", rows)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows, regressed = compare(results, baseline, args.tolerance)
+        report(f'Compared with {args.baseline}', rows)
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
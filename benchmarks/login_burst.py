@@ -0,0 +1,104 @@
+"""
+Login burst benchmark
+
+Replays a burst of logins (500/minute by default) while other threads
+serve lightweight page requests, once with hashing inline on the request
+threads and once through PasswordService. Reports login throughput and the
+latency of the concurrent non-login requests.
+
+    python -m benchmarks.login_burst --rate 500 --seconds 30
+"""
+
+import argparse
+import json
+import threading
+import time
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from benchmarks.common import percentile, report
+from controllers.passwords import DEFAULT_METHOD, HashingBusy, PasswordService
+
+
+def page_work():
+    """Stand-in for a cheap page render"""
+    rows = [{'appointment_id': i, 'status': 'Scheduled', 'reason': 'Checkup'} for i in range(200)]
+    return len(json.dumps(rows))
+
+
+def run(verify, rate, seconds, page_threads):
+    pwhash = generate_password_hash('correct horse', method=DEFAULT_METHOD)
+    stop = threading.Event()
+    login_latency = []
+    page_latency = []
+    rejected = [0]
+    lock = threading.Lock()
+
+    def login():
+        started = time.perf_counter()
+        try:
+            verify(pwhash, 'correct horse')
+        except HashingBusy:
+            with lock:
+                rejected[0] += 1
+            return
+        with lock:
+            login_latency.append(time.perf_counter() - started)
+
+    def pages():
+        while not stop.is_set():
+            started = time.perf_counter()
+            page_work()
+            with lock:
+                page_latency.append(time.perf_counter() - started)
+            time.sleep(0.005)
+
+    workers = [threading.Thread(target=pages) for _ in range(page_threads)]
+    for worker in workers:
+        worker.start()
+
+    logins = []
+    interval = 60.0 / rate
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        thread = threading.Thread(target=login)
+        thread.start()
+        logins.append(thread)
+        time.sleep(interval)
+    for thread in logins:
+        thread.join()
+    wall = time.perf_counter() - started
+    stop.set()
+    for worker in workers:
+        worker.join()
+
+    return [
+        ('logins completed', len(login_latency)),
+        ('logins rejected (503)', rejected[0]),
+        ('login throughput (/min)', len(login_latency) / wall * 60),
+        ('login p99 (ms)', percentile(login_latency, 99) * 1000),
+        ('page p50 (ms)', percentile(page_latency, 50) * 1000),
+        ('page p99 (ms)', percentile(page_latency, 99) * 1000),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rate', type=int, default=500, help='logins per minute')
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--page-threads', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    report('Inline hashing', run(check_password_hash, args.rate, args.seconds, args.page_threads))
+
+    service = PasswordService(workers=args.workers)
+    service.verify(generate_password_hash('warm-up'), 'warm-up')
+    try:
+        report('PasswordService', run(service.verify, args.rate, args.seconds, args.page_threads))
+    finally:
+        service.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Patient listing benchmark
+
+Seeds synthetic patients and compares the old full-table listing
+(Patient.get_all) with keyset page 1 and page N.
+
+    python -m benchmarks.patient_listing --patients 1000000 --pages 200
+"""
+
+import argparse
+import random
+
+from benchmarks.common import BenchMySQL, percentile, report, timed
+from controllers.patient_directory import PatientPage, decode_cursor, encode_cursor
+
+SEED_EMAIL_DOMAIN = 'bench.medilink.test'
+FIRST_NAMES = ['Aisha', 'Rahim', 'Maya', 'Arif', 'Nadia', 'Karim', 'Lina', 'Omar', 'Sara', 'Tanvir']
+LAST_NAMES = ['Ahmed', 'Hossain', 'Rahman', 'Khan', 'Chowdhury', 'Islam', 'Das', 'Roy', 'Sen', 'Ali']
+
+
+def seeded_count(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) AS n FROM patients WHERE email LIKE %s", (f"%@{SEED_EMAIL_DOMAIN}",))
+    count = cursor.fetchone()['n']
+    cursor.close()
+    return count
+
+
+def seed(conn, total, batch=5000):
+    """Insert synthetic patients with multi-row INSERTs until total exist"""
+    start = seeded_count(conn)
+    rng = random.Random(42)
+    cursor = conn.cursor()
+    for offset in range(start, total, batch):
+        rows = []
+        for i in range(offset, min(offset + batch, total)):
+            name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}"
+            rows.append((name, rng.randint(1, 95), rng.choice(['Male', 'Female']),
+                         f"01{i:09d}", f"patient{i}@{SEED_EMAIL_DOMAIN}", '!bench'))
+        cursor.executemany("""
+            INSERT INTO patients (full_name, age, gender, phone, email, password)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, rows)
+        conn.commit()
+        print(f"seeded {offset + len(rows)}/{total}", end='\r')
+    cursor.close()
+
+
+def full_scan(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM patients ORDER BY full_name")
+    rows = cursor.fetchall()
+    cursor.close()
+    return len(rows)
+
+
+def deep_cursor(conn, depth):
+    """Cursor pointing `depth` rows into the listing, as reached by paging"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT full_name, patient_id FROM patients
+        ORDER BY full_name, patient_id LIMIT 1 OFFSET %s
+    """, (depth,))
+    row = cursor.fetchone()
+    cursor.close()
+    return encode_cursor(row) if row else None
+
+
+def page_latency(conn, after, search, runs):
+    samples = []
+    for _ in range(runs):
+        page = PatientPage(conn, after=decode_cursor(after), search=search)
+        _, elapsed = timed(page.fetch_all)
+        samples.append(elapsed)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--patients', type=int, default=1000000)
+    parser.add_argument('--pages', type=int, default=200, help='runs per page measurement')
+    parser.add_argument('--full-scans', type=int, default=3)
+    parser.add_argument('--cleanup', action='store_true', help='delete seeded patients afterwards')
+    args = parser.parse_args()
+
+    mysql = BenchMySQL()
+    conn = mysql.connection
+    seed(conn, args.patients)
+
+    scans = [timed(full_scan, conn)[1] for _ in range(args.full_scans)]
+    first = page_latency(conn, None, None, args.pages)
+    deep = page_latency(conn, deep_cursor(conn, args.patients - 100), None, args.pages)
+    search = page_latency(conn, None, 'Maya', args.pages)
+
+    report(f'Patient listing ({args.patients} seeded)', [
+        ('full scan p50 (ms)', percentile(scans, 50) * 1000),
+        ('page 1 p50 (ms)', percentile(first, 50) * 1000),
+        ('page 1 p99 (ms)', percentile(first, 99) * 1000),
+        ('page N p50 (ms)', percentile(deep, 50) * 1000),
+        ('page N p99 (ms)', percentile(deep, 99) * 1000),
+        ('search p50 (ms)', percentile(search, 50) * 1000),
+    ])
+
+    if args.cleanup:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM patients WHERE email LIKE %s", (f"%@{SEED_EMAIL_DOMAIN}",))
+        conn.commit()
+        cursor.close()
+
+
+if __name__ == '__main__':
+    main()
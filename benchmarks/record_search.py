@@ -0,0 +1,119 @@
+"""
+Medical record search benchmark
+
+Seeds synthetic medical records (5M by default) for existing patients and
+doctors, then times ranked full-text queries with and without doctor and
+date filters. The 'every record' scenario matches the whole table, the
+worst case for ranking, and is timed on the first and the last page.
+
+    python -m benchmarks.record_search --records 5000000 --runs 50
+"""
+
+import argparse
+import random
+from datetime import date, timedelta
+
+from benchmarks.common import BenchMySQL, percentile, report, timed
+from controllers import record_search
+
+DIAGNOSES = ['hypertension', 'type 2 diabetes', 'asthma', 'migraine', 'gastritis', 'bronchitis',
+             'anemia', 'hypothyroidism', 'pneumonia', 'dengue fever', 'typhoid', 'sinusitis']
+SYMPTOMS = ['fever', 'headache', 'cough', 'fatigue', 'nausea', 'dizziness', 'chest pain',
+            'shortness of breath', 'abdominal pain', 'joint pain', 'rash', 'insomnia']
+DRUGS = ['amoxicillin', 'paracetamol', 'metformin', 'amlodipine', 'omeprazole', 'salbutamol',
+         'levothyroxine', 'azithromycin', 'ibuprofen', 'cetirizine', 'losartan', 'atorvastatin']
+TESTS = ['cbc', 'lipid profile', 'hba1c', 'chest x-ray', 'ecg', 'thyroid panel', 'urinalysis']
+MARKER = 'synthetic-bench'
+
+
+def seeded_count(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) AS n FROM medical_records WHERE notes LIKE %s", (f"{MARKER}%",))
+    count = cursor.fetchone()['n']
+    cursor.close()
+    return count
+
+
+def seed(conn, total, batch=5000):
+    cursor = conn.cursor()
+    cursor.execute("SELECT patient_id FROM patients ORDER BY patient_id LIMIT 10000")
+    patients = [row['patient_id'] for row in cursor.fetchall()]
+    cursor.execute("SELECT doctor_id FROM doctors ORDER BY doctor_id LIMIT 200")
+    doctors = [row['doctor_id'] for row in cursor.fetchall()]
+    if not patients or not doctors:
+        raise SystemExit("Benchmark needs existing patients and doctors")
+
+    rng = random.Random(11)
+    start = seeded_count(conn)
+    first_day = date.today() - timedelta(days=3650)
+    for offset in range(start, total, batch):
+        rows = []
+        for _ in range(min(batch, total - offset)):
+            rows.append((
+                rng.choice(patients), rng.choice(doctors),
+                first_day + timedelta(days=rng.randrange(3650)),
+                rng.choice(DIAGNOSES),
+                ', '.join(rng.sample(SYMPTOMS, 3)),
+                ', '.join(rng.sample(DRUGS, 2)),
+                ', '.join(rng.sample(TESTS, 2)),
+                f"{MARKER} follow standard care plan",
+            ))
+        cursor.executemany("""
+            INSERT INTO medical_records
+                (patient_id, doctor_id, visit_date, diagnosis, symptoms,
+                 prescription, tests_recommended, notes)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, rows)
+        conn.commit()
+        print(f"seeded {offset + len(rows)}/{total}", end='\r')
+    cursor.execute("SELECT doctor_id FROM doctors ORDER BY doctor_id LIMIT 1")
+    doctor_id = cursor.fetchone()['doctor_id']
+    cursor.close()
+    return doctor_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=5000000)
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--cleanup', action='store_true', help='delete seeded records afterwards')
+    args = parser.parse_args()
+
+    conn = BenchMySQL().connection
+    doctor_id = seed(conn, args.records)
+    rng = random.Random(3)
+    year_ago = date.today() - timedelta(days=365)
+
+    scenarios = {
+        'single term': lambda: rng.choice(DRUGS),
+        'two terms': lambda: f"{rng.choice(DRUGS)} {rng.choice(SYMPTOMS)}",
+        'prefix': lambda: rng.choice(DRUGS)[:5],
+        'every record': lambda: 'standard care',
+    }
+    rows = []
+    for name, make_query in scenarios.items():
+        plain = [timed(record_search.search, conn, make_query())[1] for _ in range(args.runs)]
+        filtered = [timed(record_search.search, conn, make_query(), doctor_id=doctor_id,
+                          date_from=year_ago)[1] for _ in range(args.runs)]
+        rows.extend([
+            (f'{name} p50 (ms)', percentile(plain, 50) * 1000),
+            (f'{name} p99 (ms)', percentile(plain, 99) * 1000),
+            (f'{name} + doctor/date p99 (ms)', percentile(filtered, 99) * 1000),
+        ])
+    last_page = [timed(record_search.search, conn, 'standard care', page=record_search.MAX_PAGES)[1]
+                 for _ in range(args.runs)]
+    rows.append(('every record, last page p99 (ms)', percentile(last_page, 99) * 1000))
+    report(f'Record search ({args.records} synthetic records)', rows)
+
+    if args.cleanup:
+        cursor = conn.cursor()
+        while True:
+            cursor.execute("DELETE FROM medical_records WHERE notes LIKE %s LIMIT 10000", (f"{MARKER}%",))
+            conn.commit()
+            if cursor.rowcount < 10000:
+                break
+        cursor.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Shard scaling benchmark
+
+Runs the per-patient record timeline query from many threads and reports
+aggregate throughput as the number of shards grows, each patient routed
+to shard bucket_of(patient_id) % shards. Every shard should hold a copy of
+the generated data, which models equal slices of a larger population:
+
+    MYSQL_HOST=db1 python -m benchmarks.datagen --scale medium
+    MYSQL_HOST=db2 python -m benchmarks.datagen --scale medium
+    python -m benchmarks.sharding --shards db1,db2 --threads 32 --seconds 20
+"""
+
+import argparse
+import random
+import threading
+import time
+
+from benchmarks.common import connect_args, percentile, report
+from benchmarks.datagen import EMAIL_DOMAIN, ids
+from controllers.record_timeline import FULL_TEXT_COLUMNS, PAGE_SIZE, PREVIEW_CHARS, SUMMARY_QUERY
+from database.pool import ConnectionPool
+from database.sharding import bucket_of, parse_shards
+
+QUERY = SUMMARY_QUERY.format(preview=PREVIEW_CHARS, older='', table='medical_records',
+                             full=FULL_TEXT_COLUMNS)
+
+
+def run(pools, patient_ids, threads, seconds):
+    samples = []
+    lock = threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def worker(n):
+        rng = random.Random(n)
+        mine = []
+        while time.perf_counter() < stop:
+            patient_id = rng.choice(patient_ids)
+            pool = pools[bucket_of(patient_id) % len(pools)]
+            started = time.perf_counter()
+            conn = pool.acquire()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(QUERY, (patient_id, PAGE_SIZE + 1))
+                cursor.fetchall()
+                cursor.close()
+            finally:
+                pool.release(conn)
+            mine.append(time.perf_counter() - started)
+        with lock:
+            samples.extend(mine)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--shards', required=True, help='host[:port][/db],... as in MYSQL_SHARDS')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=20)
+    args = parser.parse_args()
+
+    shards = parse_shards(args.shards)
+    pools = []
+    for host, port, database in shards:
+        overrides = dict(host=host, port=port)
+        if database:
+            overrides['database'] = database
+        pools.append(ConnectionPool(connect_args(**overrides), min_size=1, max_size=args.threads))
+
+    conn = pools[0].acquire()
+    patient_ids = ids(conn.cursor(), "SELECT patient_id FROM patients WHERE email LIKE %s", f"%@{EMAIL_DOMAIN}")
+    pools[0].release(conn)
+    if not patient_ids:
+        raise SystemExit("No generated patients found; run python -m benchmarks.datagen first")
+
+    rows = []
+    baseline = None
+    for count in range(1, len(pools) + 1):
+        samples, wall = run(pools[:count], patient_ids, args.threads, args.seconds)
+        throughput = len(samples) / wall
+        baseline = baseline or throughput
+        rows.append((f'{count} shard(s) reads/s', f"{throughput:.0f} ({throughput / baseline:.2f}x)"))
+        rows.append((f'{count} shard(s) p50/p95 (ms)',
+                     f"{percentile(samples, 50) * 1000:.2f} / {percentile(samples, 95) * 1000:.2f}"))
+    report(f"Timeline reads, {args.threads} threads, {len(patient_ids)} patients", rows)
+
+
+if __name__ == '__main__':
+    main()
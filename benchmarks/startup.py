@@ -0,0 +1,68 @@
+"""
+Cold start benchmark
+
+Starts a fresh interpreter per run that imports the app, calls
+create_app() and serves one request through the test client, and reports
+cold start time, time to first request and the app's own startup phases.
+
+    python -m benchmarks.startup --runs 20 --path /
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from benchmarks.common import percentile, report
+
+CHILD = """
+import json, time
+started = time.perf_counter()
+from app import create_app, startup
+app = create_app()
+ready = time.perf_counter()
+response = app.test_client().get({path!r})
+served = time.perf_counter()
+print(json.dumps({{
+    'status': response.status_code,
+    'create_app': (ready - started) * 1000,
+    'first_request': (served - ready) * 1000,
+    'phases': startup.stats(),
+}}))
+"""
+
+
+def run_once(path):
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD.format(path=path)],
+        capture_output=True, text=True, check=True
+    ).stdout
+    wall = (time.perf_counter() - started) * 1000
+    result = json.loads(output.strip().splitlines()[-1])
+    result['wall'] = wall
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--path', default='/')
+    args = parser.parse_args()
+
+    results = [run_once(args.path) for _ in range(args.runs)]
+    rows = [
+        ('process wall p50 (ms)', percentile([r['wall'] for r in results], 50)),
+        ('process wall p99 (ms)', percentile([r['wall'] for r in results], 99)),
+        ('import + create_app p50 (ms)', percentile([r['create_app'] for r in results], 50)),
+        ('first request p50 (ms)', percentile([r['first_request'] for r in results], 50)),
+        ('first request p99 (ms)', percentile([r['first_request'] for r in results], 99)),
+    ]
+    for phase in results[0]['phases']:
+        rows.append((f'phase {phase} p50 (ms)', percentile([r['phases'][phase] for r in results], 50)))
+    report(f'Startup ({args.runs} cold starts, GET {args.path})', rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 import os
 from dotenv import load_dotenv
 
+# Config reads the environment in its class body, so .env has to be loaded at import
 load_dotenv()
 
 class Config:
@@ -13,12 +14,102 @@ class Config:
     MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD', '')
     MYSQL_DB = os.getenv('MYSQL_DB', 'medilink_db')
     MYSQL_CURSORCLASS = 'DictCursor'
+
+    MYSQL_POOL_MIN_SIZE = int(os.getenv('MYSQL_POOL_MIN_SIZE', 2))
+    MYSQL_POOL_MAX_SIZE = int(os.getenv('MYSQL_POOL_MAX_SIZE', 10))
+    MYSQL_POOL_TIMEOUT = float(os.getenv('MYSQL_POOL_TIMEOUT', 5))
+    MYSQL_POOL_RECYCLE = int(os.getenv('MYSQL_POOL_RECYCLE', 1800))
+    MYSQL_POOL_IDLE_TIMEOUT = int(os.getenv('MYSQL_POOL_IDLE_TIMEOUT', 300))
+    MYSQL_POOL_PING_AFTER = float(os.getenv('MYSQL_POOL_PING_AFTER', 5))
+
+    MYSQL_REPLICAS = os.getenv('MYSQL_REPLICAS', '')
+    MYSQL_REPLICA_USER = os.getenv('MYSQL_REPLICA_USER')
+    MYSQL_REPLICA_PASSWORD = os.getenv('MYSQL_REPLICA_PASSWORD')
+    REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', 5))
+    REPLICA_CHECK_INTERVAL = int(os.getenv('REPLICA_CHECK_INTERVAL', 5))
+    READ_STICKY_SECONDS = int(os.getenv('READ_STICKY_SECONDS', 10))
+
+    MYSQL_SHARDS = os.getenv('MYSQL_SHARDS', '')
+    SHARD_MAP_REFRESH = int(os.getenv('SHARD_MAP_REFRESH', 5))
+
+    MYSQL_ASYNC_POOL_MIN_SIZE = int(os.getenv('MYSQL_ASYNC_POOL_MIN_SIZE', 2))
+    MYSQL_ASYNC_POOL_MAX_SIZE = int(os.getenv('MYSQL_ASYNC_POOL_MAX_SIZE', 50))
+
+    EVENTS_PUBSUB_URL = os.getenv('EVENTS_PUBSUB_URL')
+    EVENTS_HEARTBEAT = int(os.getenv('EVENTS_HEARTBEAT', 15))
+    EVENTS_HISTORY = int(os.getenv('EVENTS_HISTORY', 100))
+    EVENTS_MAX_SUBSCRIBERS = int(os.getenv('EVENTS_MAX_SUBSCRIBERS', 10000))
+    # Each stream on the sync server holds a thread; 0 leaves live updates to asgi.py
+    EVENTS_SYNC_MAX_STREAMS = int(os.getenv('EVENTS_SYNC_MAX_STREAMS', 8))
+
+    ARCHIVE_INTERVAL = int(os.getenv('ARCHIVE_INTERVAL', 3600))
+    ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 1000))
+    ARCHIVE_MAX_BATCHES = int(os.getenv('ARCHIVE_MAX_BATCHES', 200))
+    APPOINTMENT_ARCHIVE_AFTER_DAYS = int(os.getenv('APPOINTMENT_ARCHIVE_AFTER_DAYS', 90))
+    RECORD_ARCHIVE_AFTER_DAYS = int(os.getenv('RECORD_ARCHIVE_AFTER_DAYS', 730))
+
+    CACHE_SHARED_URL = os.getenv('CACHE_SHARED_URL')
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 128))
+    DOCTOR_CACHE_TTL = int(os.getenv('DOCTOR_CACHE_TTL', 300))
+    # Only for per-process stamps (no CACHE_SHARED_URL): bounds how stale another worker's 304 can be
+    ETAG_STAMP_TTL = int(os.getenv('ETAG_STAMP_TTL', 30))
+    ETAG_MAX_PAGES = int(os.getenv('ETAG_MAX_PAGES', 512))
+    FRAGMENT_CACHE_TTL = int(os.getenv('FRAGMENT_CACHE_TTL', 300))
+    FRAGMENT_CACHE_MAX_ENTRIES = int(os.getenv('FRAGMENT_CACHE_MAX_ENTRIES', 1024))
+    TEMPLATE_BYTECODE_DIR = os.getenv('TEMPLATE_BYTECODE_DIR')
+
+    SCHEDULE_INDEX_TTL = int(os.getenv('SCHEDULE_INDEX_TTL', 60))
+    SCHEDULE_INDEX_MAX_DAYS = int(os.getenv('SCHEDULE_INDEX_MAX_DAYS', 2048))
+
+    CLINIC_OPEN_TIME = os.getenv('CLINIC_OPEN_TIME', '09:00')
+    CLINIC_CLOSE_TIME = os.getenv('CLINIC_CLOSE_TIME', '17:00')
+    APPOINTMENT_SLOT_MINUTES = int(os.getenv('APPOINTMENT_SLOT_MINUTES', 30))
+
+    RECORD_TIMELINE_TTL = int(os.getenv('RECORD_TIMELINE_TTL', 300))
+    RECORD_TIMELINE_MAX_PATIENTS = int(os.getenv('RECORD_TIMELINE_MAX_PATIENTS', 1024))
+    # Only for record templates that still render the full text inline instead of expanding on demand
+    RECORD_TIMELINE_FULL_TEXT = os.getenv('RECORD_TIMELINE_FULL_TEXT', 'false').lower() in ('1', 'true', 'yes')
+
+    PERF_INSTRUMENTATION = os.getenv('PERF_INSTRUMENTATION', 'false').lower() in ('1', 'true', 'yes')
+    SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', 200))
+    # /metrics is open to this bearer token and these comma-separated client addresses (admins always)
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+    METRICS_ALLOW = os.getenv('METRICS_ALLOW', '')
+    STARTUP_REPORT = os.getenv('STARTUP_REPORT', 'true').lower() in ('1', 'true', 'yes')
+
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 32))
+
+    RATE_LIMIT_SHARED_URL = os.getenv('RATE_LIMIT_SHARED_URL')
+    TRUSTED_PROXIES = int(os.getenv('TRUSTED_PROXIES', 0))
+    RESET_LIMIT_IP_PER_MINUTE = float(os.getenv('RESET_LIMIT_IP_PER_MINUTE', 5))
+    RESET_LIMIT_EMAIL_PER_HOUR = float(os.getenv('RESET_LIMIT_EMAIL_PER_HOUR', 3))
+    RESET_VERIFY_LIMIT_PER_MINUTE = float(os.getenv('RESET_VERIFY_LIMIT_PER_MINUTE', 20))
+    PASSWORD_RESET_TOKEN_TTL = int(os.getenv('PASSWORD_RESET_TOKEN_TTL', 3600))
+    PASSWORD_RESET_TABLE = os.getenv('PASSWORD_RESET_TABLE', 'password_resets')
+    PASSWORD_RESET_EXPIRES_COLUMN = os.getenv('PASSWORD_RESET_EXPIRES_COLUMN', 'expires_at')
+    RESET_SWEEP_INTERVAL = int(os.getenv('RESET_SWEEP_INTERVAL', 300))
+
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+    JOB_POLL_INTERVAL = int(os.getenv('JOB_POLL_INTERVAL', 5))
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 5))
+    JOB_RETRY_BACKOFF = int(os.getenv('JOB_RETRY_BACKOFF', 30))
+    REMINDER_BATCH_SIZE = int(os.getenv('REMINDER_BATCH_SIZE', 100))
     
     SESSION_COOKIE_SECURE = False
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
     PERMANENT_SESSION_LIFETIME = 3600
 
+    SESSION_SHARED_URL = os.getenv('SESSION_SHARED_URL')
+    SESSION_STORE = os.getenv('SESSION_STORE', 'server' if SESSION_SHARED_URL else 'cookie')
+    if SESSION_STORE == 'server' and not SESSION_SHARED_URL:
+        raise ValueError("SESSION_STORE=server needs SESSION_SHARED_URL (memory:// for a single process)")
+    SESSION_MEMORY_MAX = int(os.getenv('SESSION_MEMORY_MAX', 10000))
+    SESSION_MEMORY_TTL = int(os.getenv('SESSION_MEMORY_TTL', 30))
+    SESSION_SWEEP_INTERVAL = int(os.getenv('SESSION_SWEEP_INTERVAL', 60))
+
 class DevelopmentConfig(Config):
     DEBUG = True
     TESTING = False
@@ -0,0 +1,3 @@
+"""
+Medilink business logic (C)
+"""
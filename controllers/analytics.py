@@ -0,0 +1,272 @@
+"""
+Pre-aggregated appointment analytics for the admin dashboard
+
+appointment_daily_rollups keeps one counter per doctor, day and status.
+The appointment hooks move counters incrementally as appointments are
+booked, completed or cancelled, and backfill() rebuilds any date range from
+appointments and appointments_archive on every shard (archiving moves rows
+without touching their counters). Dashboard queries read only the rollup
+table and turn it into dense day-by-status arrays (NumPy when installed,
+plain lists otherwise) for totals, cancellation rates and trend lines.
+
+    python -m controllers.analytics --start 2024-01-01 --end 2024-12-31
+"""
+
+import argparse
+from datetime import date, timedelta
+
+from controllers.events import appointment_created, appointment_status_changed
+from controllers.schedule import STATUSES, day_key
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BUMP_QUERY = """
+    INSERT INTO appointment_daily_rollups (doctor_id, day, status, total)
+    VALUES (%s, %s, %s, GREATEST(%s, 0))
+    ON DUPLICATE KEY UPDATE total = GREATEST(total + %s, 0)
+"""
+
+APPOINTMENT_SOURCE = """(
+        SELECT doctor_id, appointment_date, status FROM appointments
+        {archive}
+    ) a"""
+ARCHIVE_SOURCE = "UNION ALL SELECT doctor_id, appointment_date, status FROM appointments_archive"
+
+BOUNDS_QUERY = """
+    SELECT MIN(appointment_date) AS first, MAX(appointment_date) AS last
+    FROM {source}
+"""
+
+BACKFILL_QUERY = """
+    SELECT doctor_id, appointment_date AS day, status, COUNT(*) AS total
+    FROM {source}
+    WHERE appointment_date BETWEEN %s AND %s
+    GROUP BY doctor_id, appointment_date, status
+"""
+
+INSERT_ROLLUP_QUERY = """
+    INSERT INTO appointment_daily_rollups (doctor_id, day, status, total)
+    VALUES (%s, %s, %s, %s)
+"""
+
+ROLLUP_QUERY = """
+    SELECT doctor_id, day, status, total
+    FROM appointment_daily_rollups
+    WHERE day BETWEEN %s AND %s {doctor_filter}
+"""
+
+TREND_WINDOW = 7
+
+
+class AppointmentRollups:
+    """Keeps appointment_daily_rollups in step with the appointment hooks"""
+
+    def __init__(self, mysql):
+        self.mysql = mysql
+        self.updates = 0
+        self.errors = 0
+
+    def _bump(self, changes):
+        """Apply (doctor_id, day, status, delta) changes in one transaction"""
+        conn = self.mysql.primary_connection
+        cursor = conn.cursor()
+        try:
+            cursor.executemany(BUMP_QUERY, [change + (change[3],) for change in changes])
+            conn.commit()
+            self.updates += len(changes)
+        except Exception as e:
+            conn.rollback()
+            self.errors += 1
+            print(f"Analytics rollup error: {e}")
+        finally:
+            cursor.close()
+
+    def on_created(self, appointment_id, patient_id, doctor_id, appointment_date, appointment_time):
+        self._bump([(doctor_id, day_key(appointment_date), 'Scheduled', 1)])
+
+    def on_status_changed(self, appointment, status):
+        if appointment['status'] == status:
+            return
+        day = day_key(appointment['appointment_date'])
+        self._bump([
+            (appointment['doctor_id'], day, appointment['status'], -1),
+            (appointment['doctor_id'], day, status, 1),
+        ])
+
+    def connect(self):
+        appointment_created.connect(self.on_created)
+        appointment_status_changed.connect(self.on_status_changed)
+        return self
+
+    def stats(self):
+        return {'updates': self.updates, 'errors': self.errors}
+
+
+def _read_everywhere(pools, sql, params=None):
+    """Run one SELECT on every database (each shard, or the single primary)"""
+    for pool in pools:
+        conn = pool.acquire()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+            cursor.close()
+        finally:
+            pool.release(conn)
+        yield from rows
+
+
+def backfill(conn, pools, start=None, end=None, archived=False):
+    """
+    Rebuild the rollups for [start, end] (default: all appointments) from scratch.
+
+    Counts are read from every pool in ``pools`` (the shards, or just the
+    primary) and, with ``archived``, include appointments_archive; the
+    rollup table on ``conn`` is then replaced in one transaction.
+    """
+    source = APPOINTMENT_SOURCE.format(archive=ARCHIVE_SOURCE if archived else '')
+    if start is None or end is None:
+        bounds = list(_read_everywhere(pools, BOUNDS_QUERY.format(source=source)))
+        firsts = [row['first'] for row in bounds if row['first'] is not None]
+        lasts = [row['last'] for row in bounds if row['last'] is not None]
+        start = start or (min(firsts) if firsts else None)
+        end = end or (max(lasts) if lasts else None)
+        if start is None:
+            return 0
+
+    totals = {}
+    for row in _read_everywhere(pools, BACKFILL_QUERY.format(source=source), (start, end)):
+        key = (row['doctor_id'], row['day'], row['status'])
+        totals[key] = totals.get(key, 0) + row['total']
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM appointment_daily_rollups WHERE day BETWEEN %s AND %s", (start, end))
+        cursor.executemany(INSERT_ROLLUP_QUERY, [key + (total,) for key, total in totals.items()])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return len(totals)
+
+
+def _zeros(days):
+    if np is not None:
+        return np.zeros((days, len(STATUSES)), dtype=np.int64)
+    return [[0] * len(STATUSES) for _ in range(days)]
+
+
+class RollupSeries:
+    """Day-by-status counts for a date range, plus per-doctor status totals"""
+
+    def __init__(self, start, end, rows):
+        self.start = start
+        self.end = end
+        self.days = (end - start).days + 1
+        self.counts = _zeros(self.days)
+        self.doctors = {}
+        columns = {status: i for i, status in enumerate(STATUSES)}
+        for row in rows:
+            column = columns.get(row['status'])
+            if column is None:
+                continue
+            offset = (row['day'] - start).days
+            self.counts[offset][column] += row['total']
+            load = self.doctors.setdefault(row['doctor_id'], [0] * len(STATUSES))
+            load[column] += row['total']
+
+    def totals(self):
+        if np is not None:
+            sums = self.counts.sum(axis=0).tolist()
+        else:
+            sums = [sum(day[i] for day in self.counts) for i in range(len(STATUSES))]
+        return dict(zip(STATUSES, sums))
+
+    def daily(self):
+        """Per-day totals across all statuses"""
+        if np is not None:
+            return self.counts.sum(axis=1)
+        return [sum(day) for day in self.counts]
+
+    def moving_average(self, window=TREND_WINDOW):
+        """Trailing moving average of the per-day totals"""
+        daily = self.daily()
+        if np is not None:
+            sums = np.cumsum(np.concatenate(([0], daily)))
+            lows = np.maximum(np.arange(1, self.days + 1) - window, 0)
+            spans = np.arange(1, self.days + 1) - lows
+            return ((sums[1:] - sums[lows]) / spans).round(2).tolist()
+        averages = []
+        running = 0
+        for i, value in enumerate(daily):
+            running += value
+            if i >= window:
+                running -= daily[i - window]
+            averages.append(round(running / min(i + 1, window), 2))
+        return averages
+
+    def trend(self):
+        dates = [(self.start + timedelta(days=i)).isoformat() for i in range(self.days)]
+        counts = self.counts.tolist() if np is not None else self.counts
+        return {
+            'dates': dates,
+            'by_status': {status: [day[i] for day in counts] for i, status in enumerate(STATUSES)},
+            'moving_average': self.moving_average(),
+        }
+
+
+def load_series(conn, start, end, doctor_id=None):
+    params = [start, end]
+    doctor_filter = ''
+    if doctor_id is not None:
+        doctor_filter = 'AND doctor_id = %s'
+        params.append(doctor_id)
+    cursor = conn.cursor()
+    cursor.execute(ROLLUP_QUERY.format(doctor_filter=doctor_filter), params)
+    rows = cursor.fetchall()
+    cursor.close()
+    return RollupSeries(start, end, rows)
+
+
+def cancellation_rate(totals):
+    booked = sum(totals)
+    return round(totals[STATUSES.index('Cancelled')] / booked, 4) if booked else 0.0
+
+
+def dashboard(conn, start, end, doctor_id=None):
+    """Totals, cancellation rate, per-doctor load and daily trend for a range"""
+    series = load_series(conn, start, end, doctor_id)
+    totals = series.totals()
+    doctors = [
+        dict(zip(STATUSES, load), doctor_id=doctor, total=sum(load), cancellation_rate=cancellation_rate(load))
+        for doctor, load in series.doctors.items()
+    ]
+    doctors.sort(key=lambda row: row['total'], reverse=True)
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'totals': totals,
+        'cancellation_rate': cancellation_rate([totals[status] for status in STATUSES]),
+        'doctors': doctors,
+        'trend': series.trend(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild appointment analytics rollups')
+    parser.add_argument('--start', type=date.fromisoformat, default=None)
+    parser.add_argument('--end', type=date.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    from app import mysql, archiving
+    rows = backfill(mysql.primary_connection, mysql.shards.pools, args.start, args.end, archived=archiving)
+    print(f"Rebuilt {rows} rollup row(s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+"""
+Archival of finished appointments and old medical records
+
+Appointments that are Completed or Cancelled and older than
+APPOINTMENT_ARCHIVE_AFTER_DAYS, and records whose visit is older than
+RECORD_ARCHIVE_AFTER_DAYS, are moved in bounded batches to
+appointments_archive and medical_records_archive: compressed InnoDB
+tables partitioned by month, so the hot tables and their indexes stay the
+size of recent activity however long the history grows. Each batch copies
+and deletes its rows in one transaction.
+
+The archive tables are created on first use from the hot tables' own
+definition (CREATE TABLE ... LIKE) minus the keys partitioning does not
+allow, and monthly partitions are added ahead of the batches that need
+them. A pass runs from the job queue every ARCHIVE_INTERVAL seconds, or
+by hand:
+
+    python -m controllers.archive
+    python -m controllers.archive status
+
+Reads only reach the archive when older history is asked for: the record
+timeline continues into it after a patient's last hot record, patient
+appointment lists include it with ?history=1, the doctor day schedule
+reads it for days before the appointment cutoff, and record exports and
+the analytics backfill read both tables. Analytics rollups are counters,
+so archiving does not change the dashboard.
+
+Two views stay on the hot tables: record search, because a partitioned
+table cannot carry the FULLTEXT index, and the doctor's appointment list
+without a date filter. Archived records are found through the patient's
+timeline or an export instead.
+"""
+
+import argparse
+import threading
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+
+ArchiveSpec = namedtuple('ArchiveSpec', ['table', 'archive', 'key', 'date_column', 'condition'])
+
+APPOINTMENTS = ArchiveSpec(
+    'appointments', 'appointments_archive', 'appointment_id', 'appointment_date',
+    "status IN ('Completed', 'Cancelled') AND appointment_date < %s"
+)
+MEDICAL_RECORDS = ArchiveSpec(
+    'medical_records', 'medical_records_archive', 'record_id', 'visit_date',
+    "visit_date < %s"
+)
+SPECS = (APPOINTMENTS, MEDICAL_RECORDS)
+
+PATIENT_HISTORY_QUERY = """
+    SELECT a.*, d.full_name AS doctor_name, d.specialization
+    FROM appointments_archive a
+    JOIN doctors d ON d.doctor_id = a.doctor_id
+    WHERE a.patient_id = %s
+    ORDER BY a.appointment_date DESC, a.appointment_time DESC
+"""
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def patient_history(conn, patient_id):
+    """A patient's archived appointments, newest first"""
+    cursor = conn.cursor()
+    cursor.execute(PATIENT_HISTORY_QUERY, (patient_id,))
+    rows = cursor.fetchall()
+    cursor.close()
+    return list(rows)
+
+
+class Archiver:
+    def __init__(self, pools, appointment_days=90, record_days=730, batch_size=1000, max_batches=200):
+        self.pools = pools
+        self.appointment_days = appointment_days
+        self.record_days = record_days
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.moved = {spec.table: 0 for spec in SPECS}
+        self.passes = 0
+        self.last_pass_seconds = 0.0
+        self._bounds = {}
+        self._lock = threading.Lock()
+
+    def cutoff(self, spec, today=None):
+        today = today or date.today()
+        days = self.appointment_days if spec is APPOINTMENTS else self.record_days
+        return today - timedelta(days=days)
+
+    def appointments_archived_before(self):
+        """Days before this may have appointments in the archive"""
+        return self.cutoff(APPOINTMENTS)
+
+    def _ensure_archive(self, conn, spec):
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT COUNT(*) AS n FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        """, (spec.archive,))
+        if not cursor.fetchone()['n']:
+            cursor.execute(f"CREATE TABLE {spec.archive} LIKE {spec.table}")
+            # Partitioned tables allow no FULLTEXT index and no unique key without the partition column
+            cursor.execute("""
+                SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME != 'PRIMARY'
+                  AND (NON_UNIQUE = 0 OR INDEX_TYPE = 'FULLTEXT')
+            """, (spec.archive,))
+            drops = [f"DROP INDEX {row['INDEX_NAME']}" for row in cursor.fetchall()]
+            cursor.execute(f"""
+                ALTER TABLE {spec.archive} {''.join(drop + ', ' for drop in drops)}
+                DROP PRIMARY KEY, ADD PRIMARY KEY ({spec.key}, {spec.date_column}),
+                ROW_FORMAT=COMPRESSED
+            """)
+            cursor.execute(f"""
+                ALTER TABLE {spec.archive}
+                PARTITION BY RANGE COLUMNS({spec.date_column}) (PARTITION pmax VALUES LESS THAN (MAXVALUE))
+            """)
+        cursor.execute("""
+            SELECT COLUMN_NAME FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND EXTRA NOT LIKE '%%GENERATED%%'
+            ORDER BY ORDINAL_POSITION
+        """, (spec.table,))
+        columns = ', '.join(row['COLUMN_NAME'] for row in cursor.fetchall())
+        cursor.execute("""
+            SELECT PARTITION_DESCRIPTION AS bound FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_DESCRIPTION != 'MAXVALUE'
+        """, (spec.archive,))
+        bounds = [date.fromisoformat(row['bound'].strip("'")) for row in cursor.fetchall()]
+        cursor.close()
+        return columns, max(bounds) if bounds else None
+
+    def _ensure_partitions(self, conn, spec, state, oldest, newest):
+        """Split pmax so every month from oldest to newest past the last bound has a partition"""
+        month = month_start(oldest)
+        if state['bound'] is not None:
+            month = max(month, state['bound'])
+        months = []
+        while month <= newest:
+            months.append(month)
+            month = next_month(month)
+        if not months:
+            return
+        partitions = ', '.join(
+            f"PARTITION p{month:%Y%m} VALUES LESS THAN ('{next_month(month).isoformat()}')" for month in months
+        )
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            ALTER TABLE {spec.archive} REORGANIZE PARTITION pmax INTO
+            ({partitions}, PARTITION pmax VALUES LESS THAN (MAXVALUE))
+        """)
+        cursor.close()
+        state['bound'] = next_month(months[-1])
+
+    def move_batch(self, conn, spec, state, cutoff):
+        """Move up to batch_size eligible rows; returns the number moved"""
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT {spec.key} AS id, {spec.date_column} AS day FROM {spec.table}
+            WHERE {spec.condition}
+            ORDER BY {spec.key}
+            LIMIT %s
+        """, (cutoff, self.batch_size))
+        rows = cursor.fetchall()
+        conn.commit()
+        if not rows:
+            cursor.close()
+            return 0
+
+        # DDL commits implicitly, so partitions are added before the move starts
+        days = [row['day'] for row in rows if row['day'] is not None]
+        if days:
+            self._ensure_partitions(conn, spec, state, min(days), max(days))
+
+        ids = [row['id'] for row in rows]
+        placeholders = ', '.join(['%s'] * len(ids))
+        where = f"{spec.key} IN ({placeholders}) AND {spec.condition}"
+        try:
+            cursor.execute(f"""
+                INSERT INTO {spec.archive} ({state['columns']})
+                SELECT {state['columns']} FROM {spec.table} WHERE {where}
+            """, ids + [cutoff])
+            copied = cursor.rowcount
+            cursor.execute(f"DELETE FROM {spec.table} WHERE {where}", ids + [cutoff])
+            if cursor.rowcount != copied:
+                raise RuntimeError(f"{spec.table}: copied {copied} rows but deleted {cursor.rowcount}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        return copied
+
+    def _state(self, pool, conn, spec):
+        state_key = (id(pool), spec.archive)
+        if state_key not in self._bounds:
+            columns, bound = self._ensure_archive(conn, spec)
+            self._bounds[state_key] = {'columns': columns, 'bound': bound}
+        return self._bounds[state_key]
+
+    def prepare(self):
+        """Create any missing archive table, so archive reads work before the first pass"""
+        for pool in self.pools:
+            conn = pool.acquire()
+            try:
+                for spec in SPECS:
+                    self._state(pool, conn, spec)
+            finally:
+                pool.release(conn)
+
+    def archive_pool(self, pool, today=None):
+        """One bounded pass over one database; returns rows moved per table"""
+        moved = {}
+        conn = pool.acquire()
+        try:
+            for spec in SPECS:
+                state = self._state(pool, conn, spec)
+                cutoff = self.cutoff(spec, today)
+                moved[spec.table] = 0
+                for _ in range(self.max_batches):
+                    count = self.move_batch(conn, spec, state, cutoff)
+                    moved[spec.table] += count
+                    if count < self.batch_size:
+                        break
+        finally:
+            pool.release(conn)
+        return moved
+
+    def run(self, today=None):
+        """Archive every database (each shard, or the single primary)"""
+        started = time.perf_counter()
+        totals = {spec.table: 0 for spec in SPECS}
+        for pool in self.pools:
+            for table, count in self.archive_pool(pool, today).items():
+                totals[table] += count
+        with self._lock:
+            for table, count in totals.items():
+                self.moved[table] += count
+            self.passes += 1
+            self.last_pass_seconds = time.perf_counter() - started
+        return totals
+
+    def status(self):
+        """Hot and archived row counts per table, summed over every database"""
+        counts = {}
+        for pool in self.pools:
+            conn = pool.acquire()
+            try:
+                cursor = conn.cursor()
+                for spec in SPECS:
+                    for name in (spec.table, spec.archive):
+                        cursor.execute("""
+                            SELECT TABLE_ROWS AS n FROM information_schema.TABLES
+                            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+                        """, (name,))
+                        row = cursor.fetchone()
+                        counts[name] = counts.get(name, 0) + ((row or {}).get('n') or 0)
+                cursor.close()
+            finally:
+                pool.release(conn)
+        return counts
+
+    def stats(self):
+        with self._lock:
+            data = {f'moved_{table}': count for table, count in self.moved.items()}
+            data['passes'] = self.passes
+            data['last_pass_seconds'] = round(self.last_pass_seconds, 3)
+        return data
+
+
+def schedule_next(queue, interval):
+    """Queue the next pass for the next interval slot; several processes asking queue it once"""
+    slot = int(time.time() // interval) + 1
+    return queue.enqueue('archive', {'slot': slot}, delay=max(0, slot * interval - time.time()),
+                         dedupe_key=f"archive:{slot}")
+
+
+def register(queue, archiver, interval):
+    """Register the recurring archive pass on a JobQueue"""
+
+    @queue.handler('archive')
+    def archive_pass(payload):
+        try:
+            archiver.run()
+        finally:
+            schedule_next(queue, interval)
+
+    return queue
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Move finished appointments and old records to the archive')
+    parser.add_argument('command', nargs='?', choices=['run', 'status'], default='run')
+    args = parser.parse_args()
+
+    from app import archiver
+    if args.command == 'status':
+        for table, count in archiver.status().items():
+            print(f"{table}: ~{count} row(s)")
+        return
+    moved = archiver.run()
+    print(', '.join(f"{table}: {count} row(s) archived" for table, count in moved.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+"""
+Coroutine versions of the I/O-bound patient and doctor routes
+
+Loaded by asgi.py, which serves these endpoints with the views below and
+every other endpoint with the regular sync Flask views. The views run
+inside a normal Flask request context (session, flash, url_for and the
+before/after request hooks all apply) but await their queries on the
+AsyncPool in app.extensions['async_mysql'], so one process can keep many
+requests waiting on MySQL without a thread each. Hook listeners use the
+sync pool and are run in a worker thread.
+"""
+
+import asyncio
+from datetime import date, timedelta
+
+import pymysql
+from flask import Response, current_app, flash, jsonify, redirect, render_template, request, session, url_for
+
+from app import (appointment_channels, archiving, conditional, doctor_directory, event_broker, load_doctors,
+                 record_timeline, slot_grid)
+from controllers import archive, availability, live_events
+from controllers.booking import INSERT_APPOINTMENT, parse_request
+from controllers.events import appointment_created
+
+PATIENT_QUERY = "SELECT * FROM patients WHERE patient_id = %s"
+
+PATIENT_APPOINTMENTS_QUERY = """
+    SELECT a.*, d.full_name AS doctor_name, d.specialization
+    FROM appointments a
+    JOIN doctors d ON d.doctor_id = a.doctor_id
+    WHERE a.patient_id = %s
+    ORDER BY a.appointment_date DESC, a.appointment_time DESC
+"""
+
+# (endpoint, method) -> coroutine view
+VIEWS = {}
+
+
+def async_view(endpoint, methods=('GET',)):
+    """Serve endpoint with the decorated coroutine for the given methods"""
+    def decorator(view):
+        for method in methods:
+            VIEWS[(endpoint, method)] = view
+        return view
+    return decorator
+
+
+def database():
+    return current_app.extensions['async_mysql']
+
+
+@async_view('patient_appointments')
+@conditional(lambda: [('appointments', session['user_id'])] if session.get('user_type') == 'patient' else None)
+async def patient_appointments():
+    if session.get('user_type') != 'patient':
+        flash('Please login to view appointments', 'error')
+        return redirect(url_for('patient_login'))
+
+    appointments = list(await database().fetchall(PATIENT_APPOINTMENTS_QUERY, (session.get('user_id'),)))
+    if archiving and request.args.get('history'):
+        appointments.extend(await database().fetchall(archive.PATIENT_HISTORY_QUERY, (session.get('user_id'),)))
+    return render_template('patient/appointments.html', appointments=appointments)
+
+
+@async_view('patient_medical_records')
+@conditional(lambda: [('records', session['user_id'])] if session.get('user_type') == 'patient' else None)
+async def patient_medical_records():
+    if session.get('user_type') != 'patient':
+        flash('Please login to view medical records', 'error')
+        return redirect(url_for('patient_login'))
+
+    timeline = await record_timeline.page_async(database(), session.get('user_id'), request.args.get('before'))
+    return render_template('patient/medical_records.html',
+                           records=timeline['records'],
+                           next_cursor=timeline['next_cursor'])
+
+
+@async_view('patient_available_slots')
+async def patient_available_slots():
+    if session.get('user_type') != 'patient':
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        start = availability.parse_date(request.args.get('start'), date.today())
+        end = availability.parse_date(request.args.get('end'), start + timedelta(days=13))
+        doctors = await asyncio.to_thread(doctor_directory.get, 'all', load_doctors)
+        results = await availability.search_async(
+            database(), doctors, start, end, slot_grid,
+            doctor_id=request.args.get('doctor_id', type=int),
+            specialization=request.args.get('specialization', '').strip() or None
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'slot_minutes': slot_grid.slot_minutes,
+        'doctors': results
+    })
+
+
+@async_view('patient_book_appointment', methods=('POST',))
+async def patient_book_appointment():
+    if session.get('user_type') != 'patient':
+        flash('Please login to book an appointment', 'error')
+        return redirect(url_for('patient_login'))
+
+    doctor_id = request.form.get('doctor_id')
+    appointment_date = request.form.get('appointment_date')
+    appointment_time = request.form.get('appointment_time')
+    reason = request.form.get('reason', '').strip()
+
+    if not all([doctor_id, appointment_date, appointment_time]):
+        flash('Please fill all required fields', 'error')
+        return redirect(url_for('patient_book_appointment'))
+
+    try:
+        req = parse_request(session.get('user_id'), doctor_id, appointment_date, appointment_time, reason)
+    except ValueError:
+        flash('Please choose a valid doctor, date and time', 'error')
+        return redirect(url_for('patient_book_appointment'))
+
+    # The uq_appointments_slot key rejects a taken slot, as in reserve_batch
+    try:
+        appointment_id = await database().execute(INSERT_APPOINTMENT, req)
+    except pymysql.err.IntegrityError as e:
+        if e.args and e.args[0] == 1062:
+            flash('This time slot is already booked. Please choose another time.', 'error')
+            return redirect(url_for('patient_book_appointment'))
+        appointment_id = None
+        print(f"Booking error: {e}")
+    except Exception as e:
+        appointment_id = None
+        print(f"Booking error: {e}")
+
+    if appointment_id is None:
+        flash('Failed to book appointment. Please try again', 'error')
+        return redirect(url_for('patient_book_appointment'))
+
+    await asyncio.to_thread(
+        appointment_created.send,
+        appointment_id=appointment_id,
+        patient_id=session.get('user_id'),
+        doctor_id=doctor_id,
+        appointment_date=appointment_date,
+        appointment_time=appointment_time
+    )
+    flash('Appointment booked successfully!', 'success')
+    return redirect(url_for('patient_dashboard'))
+
+
+@async_view('doctor_view_patient')
+@conditional(lambda patient_id: [('records', patient_id)] if session.get('user_type') == 'doctor' else None)
+async def doctor_view_patient(patient_id):
+    if session.get('user_type') != 'doctor':
+        flash('Please login to access doctor dashboard', 'error')
+        return redirect(url_for('doctor_login'))
+
+    db = database()
+    patient, timeline = await asyncio.gather(
+        db.fetchone(PATIENT_QUERY, (patient_id,)),
+        record_timeline.page_async(db, patient_id, request.args.get('before'))
+    )
+    if not patient:
+        flash('Patient not found', 'error')
+        return redirect(url_for('doctor_patients'))
+
+    return render_template('doctor/patient_details.html',
+                           patient=patient,
+                           records=timeline['records'],
+                           next_cursor=timeline['next_cursor'])
+
+
+@async_view('patient_records_api')
+async def patient_records_api(patient_id):
+    user_type = session.get('user_type')
+    if user_type != 'doctor' and not (user_type == 'patient' and session.get('user_id') == patient_id):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    return jsonify(await record_timeline.page_async(database(), patient_id, request.args.get('before')))
+
+
+@async_view('record_details_api')
+async def record_details_api(record_id):
+    user_type = session.get('user_type')
+    if user_type not in ('doctor', 'patient'):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    record = await record_timeline.details_async(database(), record_id)
+    if not record or (user_type == 'patient' and record['patient_id'] != session.get('user_id')):
+        return jsonify({'error': 'Record not found'}), 404
+
+    return jsonify(record)
+
+
+@async_view('appointment_events')
+async def appointment_events():
+    channels = appointment_channels()
+    if channels is None:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        subscription = event_broker.subscribe(channels, request.headers.get('Last-Event-ID'))
+    except live_events.BrokerFull:
+        return jsonify({'error': 'Too many live connections, please retry'}), 503, {'Retry-After': '30'}
+
+    return Response(live_events.stream_async(subscription, current_app.config['EVENTS_HEARTBEAT']),
+                    mimetype='text/event-stream', headers=live_events.STREAM_HEADERS)
@@ -0,0 +1,179 @@
+"""
+Free-slot search across doctors
+
+Booked appointments for the whole search window are loaded in one query
+and folded into an integer bitset per doctor and day (bit i set when slot
+i of the day is taken). Free slots are then the complement of that bitset
+against the clinic's slot grid. A booking that is off the grid (e.g. 09:10
+on a 30-minute grid) takes every slot it overlaps, assuming it lasts one
+slot length.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+MAX_RANGE_DAYS = 31
+
+BOOKED_QUERY = """
+    SELECT doctor_id, appointment_date, appointment_time
+    FROM appointments
+    WHERE appointment_date BETWEEN %s AND %s
+      AND status != 'Cancelled'
+      AND doctor_id IN ({placeholders})
+"""
+
+
+def to_minutes(value):
+    """Minutes since midnight for a 'HH:MM[:SS]' string, time or timedelta"""
+    if isinstance(value, timedelta):
+        return int(value.total_seconds()) // 60
+    if hasattr(value, 'hour'):
+        return value.hour * 60 + value.minute
+    parts = str(value).split(':')
+    return int(parts[0]) * 60 + int(parts[1])
+
+
+class SlotGrid:
+    """Fixed-length slots between opening and closing time"""
+
+    def __init__(self, open_time='09:00', close_time='17:00', slot_minutes=30):
+        self.start = to_minutes(open_time)
+        self.slot_minutes = int(slot_minutes)
+        self.count = max(0, (to_minutes(close_time) - self.start) // self.slot_minutes)
+        self.full_mask = (1 << self.count) - 1
+
+    def index_of(self, value):
+        """Slot index for a time, or None when it falls outside the grid"""
+        offset = to_minutes(value) - self.start
+        if offset < 0 or offset % self.slot_minutes:
+            return None
+        index = offset // self.slot_minutes
+        return index if index < self.count else None
+
+    def overlapping(self, value, minutes=None):
+        """Bitmask of the slots that [value, value + minutes) overlaps; minutes defaults to one slot"""
+        begin = to_minutes(value) - self.start
+        end = begin + (minutes or self.slot_minutes)
+        first = max(0, begin // self.slot_minutes)
+        last = min(self.count, -(-end // self.slot_minutes))
+        if first >= last:
+            return 0
+        return ((1 << (last - first)) - 1) << first
+
+    def label(self, index):
+        minutes = self.start + index * self.slot_minutes
+        return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def booked_query(doctor_ids, start, end):
+    sql = BOOKED_QUERY.format(placeholders=', '.join(['%s'] * len(doctor_ids)))
+    return sql, [start, end] + list(doctor_ids)
+
+
+def fold_booked(rows, grid):
+    """Fold booked rows into {(doctor_id, 'YYYY-MM-DD'): bitset}"""
+    booked = defaultdict(int)
+    for row in rows:
+        mask = grid.overlapping(row['appointment_time'])
+        if mask:
+            key = (row['doctor_id'], row['appointment_date'].isoformat())
+            booked[key] |= mask
+    return booked
+
+
+def load_booked(conn, doctor_ids, start, end, grid):
+    """Return {(doctor_id, 'YYYY-MM-DD'): bitset} for the window in one query"""
+    if not doctor_ids:
+        return defaultdict(int)
+    cursor = conn.cursor()
+    cursor.execute(*booked_query(doctor_ids, start, end))
+    rows = cursor.fetchall()
+    cursor.close()
+    return fold_booked(rows, grid)
+
+
+def free_slots(doctors, booked, start, end, grid, now=None):
+    """
+    Build the search result for each doctor.
+
+    Slots that have already started today are treated as taken.
+    """
+    now = now or datetime.now()
+    today = now.date()
+    elapsed = now.hour * 60 + now.minute - grid.start
+    if elapsed < 0:
+        past_mask = 0
+    else:
+        past_mask = (1 << min(grid.count, elapsed // grid.slot_minutes + 1)) - 1
+
+    days = []
+    day = start
+    while day <= end:
+        days.append(day)
+        day += timedelta(days=1)
+
+    results = []
+    for doctor in doctors:
+        slots = {}
+        for day in days:
+            if day < today:
+                continue
+            taken = booked.get((doctor['doctor_id'], day.isoformat()), 0)
+            if day == today:
+                taken |= past_mask
+            free = grid.full_mask & ~taken
+            if not free:
+                continue
+            labels = []
+            index = 0
+            while free:
+                if free & 1:
+                    labels.append(grid.label(index))
+                free >>= 1
+                index += 1
+            slots[day.isoformat()] = labels
+        results.append({
+            'doctor_id': doctor['doctor_id'],
+            'full_name': doctor.get('full_name'),
+            'specialization': doctor.get('specialization'),
+            'slots': slots,
+        })
+    return results
+
+
+def matching_doctors(doctors, start, end, doctor_id=None, specialization=None):
+    """Validate the window and pick the active doctors matching the filters"""
+    if end < start:
+        raise ValueError("End date is before start date")
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise ValueError(f"Search range is limited to {MAX_RANGE_DAYS} days")
+
+    return [
+        doctor for doctor in doctors
+        if doctor.get('is_active', True)
+        and (doctor_id is None or doctor['doctor_id'] == doctor_id)
+        and (not specialization
+             or (doctor.get('specialization') or '').lower() == specialization.lower())
+    ]
+
+
+def search(conn, doctors, start, end, grid, doctor_id=None, specialization=None, now=None):
+    """Free slots for doctors matching the filters between start and end"""
+    matching = matching_doctors(doctors, start, end, doctor_id, specialization)
+    booked = load_booked(conn, [doctor['doctor_id'] for doctor in matching], start, end, grid)
+    return free_slots(matching, booked, start, end, grid, now)
+
+
+async def search_async(db, doctors, start, end, grid, doctor_id=None, specialization=None, now=None):
+    """search() awaiting the booked-slot query on an AsyncPool"""
+    matching = matching_doctors(doctors, start, end, doctor_id, specialization)
+    rows = []
+    if matching:
+        rows = await db.fetchall(*booked_query([doctor['doctor_id'] for doctor in matching], start, end))
+    return free_slots(matching, fold_booked(rows, grid), start, end, grid, now)
+
+
+def parse_date(value, default):
+    if not value:
+        return default
+    return date.fromisoformat(value)
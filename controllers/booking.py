@@ -0,0 +1,247 @@
+"""
+Booking engine for patient appointments
+
+Slots are reserved with a single INSERT guarded by the
+``uq_appointments_slot`` unique key (see database/schema.py), so a taken
+slot surfaces as a duplicate-key error instead of needing a separate
+availability query. Concurrent bookings are queued and committed in
+batches by background workers.
+
+With patient data sharded the unique key only covers one shard, so slots
+are first claimed in the catalog's slot_claims table and each appointment
+is then written to its patient's shard; claims whose insert fails are
+given back.
+
+Requests are validated before they are queued, and each insert in a batch
+runs behind its own savepoint, so one bad request fails alone instead of
+rolling back the other patients' bookings in its batch.
+"""
+
+import queue
+import threading
+from collections import namedtuple
+from concurrent.futures import Future
+from datetime import date, datetime
+
+import pymysql
+
+BOOKED = 'booked'
+SLOT_TAKEN = 'slot_taken'
+INVALID = 'invalid'
+FAILED = 'failed'
+
+TIME_FORMATS = ('%H:%M', '%H:%M:%S')
+
+BookingRequest = namedtuple('BookingRequest', [
+    'patient_id', 'doctor_id', 'appointment_date', 'appointment_time', 'reason'
+])
+BookingResult = namedtuple('BookingResult', ['status', 'appointment_id', 'error'])
+
+INSERT_APPOINTMENT = """
+    INSERT INTO appointments
+        (patient_id, doctor_id, appointment_date, appointment_time, reason, status)
+    VALUES (%s, %s, %s, %s, %s, 'Scheduled')
+"""
+
+
+def parse_request(patient_id, doctor_id, appointment_date, appointment_time, reason=None):
+    """
+    Normalize raw booking fields into a BookingRequest.
+
+    Raises ValueError for a doctor id that is not a positive integer, a
+    date that is not YYYY-MM-DD or a time that is not HH:MM[:SS]. The time
+    is returned as HH:MM:SS and the date as a ``date``.
+    """
+    try:
+        doctor_id = int(doctor_id)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid doctor id: {doctor_id!r}")
+    if doctor_id < 1:
+        raise ValueError(f"Invalid doctor id: {doctor_id!r}")
+
+    if not isinstance(appointment_date, date):
+        try:
+            appointment_date = date.fromisoformat(str(appointment_date).strip())
+        except ValueError:
+            raise ValueError(f"Invalid appointment date: {appointment_date!r}")
+
+    raw_time = str(appointment_time).strip()
+    for fmt in TIME_FORMATS:
+        try:
+            appointment_time = datetime.strptime(raw_time, fmt).strftime('%H:%M:%S')
+            break
+        except ValueError:
+            continue
+    else:
+        raise ValueError(f"Invalid appointment time: {appointment_time!r}")
+
+    return BookingRequest(patient_id, doctor_id, appointment_date, appointment_time, reason)
+
+
+def slot_key(req):
+    """Normalized (doctor, date, time) key for a booking request"""
+    return (int(req.doctor_id), str(req.appointment_date), str(req.appointment_time))
+
+
+def reserve_batch(conn, requests):
+    """
+    Reserve slots for a batch of requests in one transaction.
+
+    Returns a BookingResult per request, in order. Requests for a slot that
+    an earlier request in the same batch already claimed are rejected
+    without touching the database. Each insert runs behind a savepoint, so
+    a request MySQL rejects (a bad value, a missing doctor) fails on its
+    own and the rest of the batch still commits.
+    """
+    results = [None] * len(requests)
+    claimed = set()
+    cursor = conn.cursor()
+    try:
+        for i, req in enumerate(requests):
+            try:
+                key = slot_key(req)
+            except (TypeError, ValueError) as e:
+                results[i] = BookingResult(INVALID, None, e)
+                continue
+            if key in claimed:
+                results[i] = BookingResult(SLOT_TAKEN, None, None)
+                continue
+            cursor.execute("SAVEPOINT booking")
+            try:
+                cursor.execute(INSERT_APPOINTMENT, (
+                    req.patient_id, req.doctor_id, req.appointment_date,
+                    req.appointment_time, req.reason
+                ))
+            except pymysql.err.IntegrityError as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT booking")
+                if e.args and e.args[0] == 1062:
+                    claimed.add(key)
+                    results[i] = BookingResult(SLOT_TAKEN, None, None)
+                    continue
+                results[i] = BookingResult(FAILED, None, e)
+                continue
+            except (pymysql.err.DataError, pymysql.err.ProgrammingError) as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT booking")
+                results[i] = BookingResult(INVALID, None, e)
+                continue
+            claimed.add(key)
+            results[i] = BookingResult(BOOKED, cursor.lastrowid, None)
+        conn.commit()
+    except Exception as e:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        return [BookingResult(FAILED, None, e) for _ in requests]
+    finally:
+        cursor.close()
+    return results
+
+
+class BookingEngine:
+    def __init__(self, mysql, workers=2, max_batch=50, linger=0.002):
+        self.mysql = mysql
+        self.workers = workers
+        self.max_batch = max_batch
+        self.linger = linger
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'booking-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < self.max_batch:
+                    batch.append(self._queue.get(timeout=self.linger))
+            except queue.Empty:
+                pass
+            self._process(batch)
+
+    def _reserve(self, pool, requests):
+        try:
+            conn = pool.acquire()
+        except Exception as e:
+            return [BookingResult(FAILED, None, e) for _ in requests]
+        try:
+            return reserve_batch(conn, requests)
+        finally:
+            pool.release(conn)
+
+    def _reserve_sharded(self, shards, requests):
+        """Claim every slot in the catalog, then insert on each patient's shard"""
+        try:
+            claimed = shards.claim_slots([(slot_key(req), req.patient_id) for req in requests])
+        except Exception as e:
+            return [BookingResult(FAILED, None, e) for _ in requests]
+
+        results = [BookingResult(SLOT_TAKEN, None, None)] * len(requests)
+        by_shard = {}
+        for i, req in enumerate(requests):
+            if not claimed[i]:
+                continue
+            try:
+                shards.check_writable(req.patient_id)
+            except Exception as e:
+                results[i] = BookingResult(FAILED, None, e)
+                continue
+            by_shard.setdefault(shards.index_for(req.patient_id), []).append(i)
+
+        for index, positions in by_shard.items():
+            shard_results = self._reserve(shards.pools[index], [requests[i] for i in positions])
+            for i, result in zip(positions, shard_results):
+                results[i] = result
+
+        # A slot the shard already holds stays claimed; only failed inserts give theirs back
+        unused = [slot_key(req) for req, ok, result in zip(requests, claimed, results)
+                  if ok and result.status in (FAILED, INVALID)]
+        try:
+            shards.release_claims(unused)
+        except Exception as e:
+            print(f"Slot claim release error: {e}")
+        return results
+
+    def _process(self, batch):
+        requests = [req for req, _ in batch]
+        shards = getattr(self.mysql, 'shards', None)
+        if shards is not None and shards.sharded:
+            results = self._reserve_sharded(shards, requests)
+        else:
+            results = self._reserve(self.mysql.pool, requests)
+
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def submit(self, patient_id, doctor_id, appointment_date, appointment_time, reason=None):
+        """Queue a booking and return a Future resolving to a BookingResult"""
+        future = Future()
+        try:
+            req = parse_request(patient_id, doctor_id, appointment_date, appointment_time, reason)
+        except ValueError as e:
+            # Never let malformed input into a shared batch
+            future.set_result(BookingResult(INVALID, None, e))
+            return future
+        self._ensure_started()
+        self._queue.put((req, future))
+        return future
+
+    def book(self, patient_id, doctor_id, appointment_date, appointment_time, reason=None, timeout=10):
+        """Book a slot and wait for the result"""
+        future = self.submit(patient_id, doctor_id, appointment_date, appointment_time, reason)
+        return future.result(timeout=timeout)
+
+    def book_many(self, requests, timeout=30):
+        """Book a list of BookingRequest tuples, returning results in order"""
+        futures = [self.submit(*req) for req in requests]
+        return [future.result(timeout=timeout) for future in futures]
@@ -0,0 +1,361 @@
+"""
+In-process read-through cache with TTL and LRU eviction
+
+A cache keeps a local per-process tier and can optionally sit in front of
+a shared backend (e.g. Redis) so that several workers reuse one load.
+``DictBackend`` is a local stand-in for the shared tier in tests.
+
+With a shared backend, every invalidation also bumps a generation counter
+there. Each process polls it at most once per check_interval and drops
+its local tier when it moved, and a load that raced an invalidation is
+written to neither tier. Shared values are tagged JSON, which round-trips
+the date, time and Decimal columns of database rows.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from flask.json.tag import JSONTag, TaggedJSONSerializer
+
+
+class TagDateTime(JSONTag):
+    """Naive-preserving datetime tag; Flask's own converts to an HTTP date in UTC"""
+
+    key = ' dt'
+
+    def check(self, value):
+        return isinstance(value, datetime)
+
+    def to_json(self, value):
+        return value.isoformat()
+
+    def to_python(self, value):
+        return datetime.fromisoformat(value)
+
+
+class TagDate(JSONTag):
+    key = ' da'
+
+    def check(self, value):
+        return isinstance(value, date) and not isinstance(value, datetime)
+
+    def to_json(self, value):
+        return value.isoformat()
+
+    def to_python(self, value):
+        return date.fromisoformat(value)
+
+
+class TagTimedelta(JSONTag):
+    """MySQL TIME columns arrive as timedelta"""
+
+    key = ' td'
+
+    def check(self, value):
+        return isinstance(value, timedelta)
+
+    def to_json(self, value):
+        return value.total_seconds()
+
+    def to_python(self, value):
+        return timedelta(seconds=value)
+
+
+class TagDecimal(JSONTag):
+    key = ' dc'
+
+    def check(self, value):
+        return isinstance(value, Decimal)
+
+    def to_json(self, value):
+        return str(value)
+
+    def to_python(self, value):
+        return Decimal(value)
+
+
+serializer = TaggedJSONSerializer()
+for tag in (TagDecimal, TagTimedelta, TagDate, TagDateTime):
+    serializer.register(tag, index=0)
+
+
+class DictBackend:
+    """In-memory stand-in for a shared cache backend"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires and expires < time.time():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            value = self._data.get(key, (0, None))[0] + 1
+            self._data[key] = (value, None)
+        return value
+
+    def token_bucket(self, key, rate, burst, ttl):
+        """Take one token from a bucket; returns (allowed, retry_after seconds)"""
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            tokens, updated = burst, now
+            if item is not None and (not item[1] or item[1] >= now):
+                tokens, updated = item[0]
+            tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._data[key] = ((tokens, now), now + ttl)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    def sweep(self):
+        """Drop expired keys; returns how many were removed"""
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (_, expires) in self._data.items() if expires and expires < now]
+            for key in expired:
+                del self._data[key]
+        return len(expired)
+
+
+TOKEN_BUCKET_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+local retry = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return {allowed, tostring(retry)}
+"""
+
+
+class RedisBackend:
+    """Shared backend on Redis; requires the optional ``redis`` package"""
+
+    def __init__(self, url, prefix='medilink:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=int(ttl) if ttl else None)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+    def token_bucket(self, key, rate, burst, ttl):
+        """Atomic token bucket in a Lua script; returns (allowed, retry_after)"""
+        if not hasattr(self, '_token_bucket'):
+            self._token_bucket = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+        allowed, retry = self._token_bucket(
+            keys=[self.prefix + key], args=[rate, burst, time.time(), int(ttl) + 1])
+        return bool(allowed), float(retry)
+
+
+def backend_from_url(url):
+    """Build a shared backend from a config URL, or None when unset"""
+    if not url:
+        return None
+    if url == 'memory://':
+        return DictBackend()
+    return RedisBackend(url)
+
+
+class ReadThroughCache:
+    def __init__(self, name, ttl=300, max_entries=128, backend=None, check_interval=1.0):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.backend = backend
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self.evictions = 0
+        self.remote_invalidations = 0
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._shared_generation = None
+        self._epoch = 0
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def _shared_key(self, key):
+        return f"{self.name}:{key}"
+
+    def _counter(self, name):
+        """A shared counter (0 when unset), or None when the backend is unreachable"""
+        try:
+            raw = self.backend.get(f"{self.name}:{name}")
+            return int(raw) if raw is not None else 0
+        except Exception as e:
+            print(f"Shared cache error ({self.name}): {e}")
+            return None
+
+    def _sync(self):
+        """Drop the local tier when another process invalidated through the shared backend"""
+        now = time.monotonic()
+        if self.backend is None or (self._checked_at is not None and now - self._checked_at < self.check_interval):
+            return
+        generation, epoch = self._counter('generation'), self._counter('epoch')
+        with self._lock:
+            self._checked_at = now
+            if generation is None or epoch is None:
+                return
+            if self._shared_generation is not None and generation != self._shared_generation:
+                self._entries.clear()
+                self._generation += 1
+                self.remote_invalidations += 1
+            self._shared_generation = generation
+            self._epoch = epoch
+
+    def _store(self, key, value):
+        """Insert into the local tier. Caller must hold the lock."""
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _lookup(self, key):
+        """(tier, value, generation); tier is 'local', 'shared' or None on a miss"""
+        self._sync()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                value, expires = item
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return 'local', value, None
+                del self._entries[key]
+            self.misses += 1
+            generation = self._generation
+            epoch = self._epoch
+
+        if self.backend is None:
+            return None, None, (generation, None)
+        shared_generation = self._counter('generation')
+        try:
+            raw = self.backend.get(self._shared_key(key))
+            if raw is not None:
+                # Values written before an invalidate() of every key carry an older epoch
+                stored_epoch, value = serializer.loads(raw)
+                if stored_epoch == epoch:
+                    with self._lock:
+                        self.shared_hits += 1
+                    return 'shared', value, (generation, shared_generation)
+        except Exception as e:
+            print(f"Shared cache error ({self.name}): {e}")
+        return None, None, (generation, shared_generation)
+
+    def _fill(self, key, value, generation, share):
+        generation, shared_generation = generation
+        if share and self.backend is not None and shared_generation is not None:
+            # An invalidation anywhere while loading means the value may be stale: store it nowhere
+            if self._counter('generation') != shared_generation:
+                return
+            try:
+                self.backend.set(self._shared_key(key), serializer.dumps([self._epoch, value]), self.ttl)
+                if self._counter('generation') != shared_generation:
+                    self.backend.delete(self._shared_key(key))
+                    return
+            except Exception as e:
+                print(f"Shared cache error ({self.name}): {e}")
+
+        with self._lock:
+            # Skip the store if an invalidation raced with the load
+            if generation == self._generation:
+                self._store(key, value)
+
+    def get(self, key, loader):
+        """Return the cached value for key, calling loader() on a miss"""
+        tier, value, generation = self._lookup(key)
+        if tier == 'local':
+            return value
+        if tier is None:
+            value = loader()
+        self._fill(key, value, generation, share=tier is None)
+        return value
+
+    async def get_async(self, key, loader):
+        """get() for a coroutine function loader"""
+        tier, value, generation = self._lookup(key)
+        if tier == 'local':
+            return value
+        if tier is None:
+            value = await loader()
+        self._fill(key, value, generation, share=tier is None)
+        return value
+
+    def invalidate(self, key=None):
+        """Drop one key, or every key when key is None"""
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+        if self.backend is None:
+            return
+        try:
+            if key is None:
+                self._epoch = self.backend.incr(f"{self.name}:epoch")
+            else:
+                self.backend.delete(self._shared_key(key))
+            generation = self.backend.incr(f"{self.name}:generation")
+            with self._lock:
+                # This process is already up to date with its own bump
+                if self._shared_generation is not None and generation == self._shared_generation + 1:
+                    self._shared_generation = generation
+        except Exception as e:
+            print(f"Shared cache error ({self.name}): {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'shared_hits': self.shared_hits,
+                'evictions': self.evictions,
+                'remote_invalidations': self.remote_invalidations,
+            }
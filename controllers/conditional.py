@@ -0,0 +1,201 @@
+"""
+Conditional GET for read-mostly pages
+
+Every cacheable resource (a patient's appointments, a patient's records)
+has a short random version stamp that the write-path hooks replace on
+each change. A page's ETag hashes the stamps it depends on together with
+the viewer, the URL and the template release, so it is known before any
+query runs: a matching If-None-Match gets a 304 straight away, and a
+rendered page already cached under the same ETag is served without
+touching MySQL.
+
+Stamps live in the shared cache backend when CACHE_SHARED_URL is set and
+then never expire, since every worker sees every bump. In the per-process
+fallback a write is only seen by the worker that made it, so only there
+do stamps expire after a short TTL to bound how long another worker can
+answer 304 for a changed page.
+"""
+
+import hashlib
+import inspect
+import os
+import secrets
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, make_response, request, session
+
+from controllers.cache import DictBackend
+from controllers.events import appointment_created, appointment_status_changed, record_saved
+from controllers.sessions import user_key
+
+# Stamp bumped by admin edits, which can change any page
+GLOBAL = ('global', 0)
+
+
+def template_release(template_folder):
+    """Stamp for the deployed templates: newest mtime under the folder"""
+    newest = 0
+    for root, _, files in os.walk(template_folder or ''):
+        for name in files:
+            newest = max(newest, os.path.getmtime(os.path.join(root, name)))
+    return str(int(newest))
+
+
+class VersionStamps:
+    def __init__(self, backend=None, ttl=86400):
+        # A stamp that expires changes the ETag without any data changing
+        self.ttl = ttl if backend is None else None
+        self.backend = backend or DictBackend()
+        self.bumps = 0
+
+    def _key(self, resource):
+        kind, resource_id = resource
+        return f"version:{kind}:{resource_id}"
+
+    def get(self, resources):
+        """Current stamp for each (kind, id); missing stamps are created"""
+        stamps = []
+        for resource in resources:
+            stamp = self.backend.get(self._key(resource))
+            if stamp is None:
+                stamp = secrets.token_hex(8)
+                self.backend.set(self._key(resource), stamp, self.ttl)
+            stamps.append(stamp.decode() if isinstance(stamp, bytes) else stamp)
+        return stamps
+
+    def bump(self, kind, resource_id):
+        self.backend.set(self._key((kind, resource_id)), secrets.token_hex(8), self.ttl)
+        self.bumps += 1
+
+    def on_created(self, appointment_id, patient_id, doctor_id, appointment_date, appointment_time):
+        self.bump('appointments', patient_id)
+
+    def on_status_changed(self, appointment, status):
+        self.bump('appointments', appointment['patient_id'])
+
+    def on_record_saved(self, patient_id, record_id):
+        self.bump('records', patient_id)
+
+    def connect(self):
+        appointment_created.connect(self.on_created)
+        appointment_status_changed.connect(self.on_status_changed)
+        record_saved.connect(self.on_record_saved)
+        return self
+
+
+class ConditionalPages:
+    """Route decorator answering If-None-Match from version stamps"""
+
+    def __init__(self, stamps, release='', max_pages=512):
+        self.stamps = stamps
+        self.release = release
+        self.max_pages = max_pages
+        self.not_modified = 0
+        self.page_hits = 0
+        self.renders = 0
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def etag(self, resources):
+        parts = [self.release, user_key(session) or '', session.get('user_name', ''), request.full_path]
+        parts.extend(self.stamps.get([GLOBAL] + list(resources)))
+        return hashlib.sha1('\0'.join(map(str, parts)).encode('utf-8')).hexdigest()
+
+    def _cached_page(self, etag):
+        with self._lock:
+            page = self._pages.get(etag)
+            if page is not None:
+                self._pages.move_to_end(etag)
+                self.page_hits += 1
+            return page
+
+    def _store_page(self, etag, response):
+        with self._lock:
+            self._pages[etag] = (response.get_data(), response.mimetype)
+            self._pages.move_to_end(etag)
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+
+    @staticmethod
+    def _tag(response, etag):
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def _answer(self, resources, view_args):
+        """
+        (etag, response) before the view runs: response is a 304 or a
+        cached page when one fits, etag is None when the page must not be
+        cached at all.
+        """
+        # Pending flash messages are rendered into the page once only
+        if request.method != 'GET' or '_flashes' in session:
+            return None, None
+        depends_on = resources(**view_args)
+        if depends_on is None:
+            return None, None
+
+        etag = self.etag(depends_on)
+        if etag in request.if_none_match:
+            with self._lock:
+                self.not_modified += 1
+            return etag, self._tag(Response(status=304), etag)
+        page = self._cached_page(etag)
+        if page is not None:
+            return etag, self._tag(Response(page[0], mimetype=page[1]), etag)
+        return etag, None
+
+    def _rendered(self, etag, rv):
+        response = make_response(rv)
+        if response.status_code != 200 or response.is_streamed or '_flashes' in session:
+            return response
+        with self._lock:
+            self.renders += 1
+        self._store_page(etag, response)
+        return self._tag(response, etag)
+
+    def __call__(self, resources):
+        """
+        Decorate a view; resources(**view_args) returns the (kind, id) pairs
+        the page depends on, or None when the request must not be cached
+        (e.g. the viewer is not logged in as the right user type). Coroutine
+        views (controllers/async_views.py) get a coroutine wrapper.
+        """
+        def decorator(view):
+            if inspect.iscoroutinefunction(view):
+                @wraps(view)
+                async def async_wrapper(**view_args):
+                    etag, response = self._answer(resources, view_args)
+                    if response is not None:
+                        return response
+                    if etag is None:
+                        return await view(**view_args)
+                    return self._rendered(etag, await view(**view_args))
+                return async_wrapper
+
+            @wraps(view)
+            def wrapper(**view_args):
+                etag, response = self._answer(resources, view_args)
+                if response is not None:
+                    return response
+                if etag is None:
+                    return view(**view_args)
+                return self._rendered(etag, view(**view_args))
+            return wrapper
+        return decorator
+
+    def invalidate_all(self):
+        """Called after admin edits: every page gets a new ETag"""
+        self.stamps.bump(*GLOBAL)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pages': len(self._pages),
+                'not_modified': self.not_modified,
+                'page_hits': self.page_hits,
+                'renders': self.renders,
+                'stamp_bumps': self.stamps.bumps,
+            }
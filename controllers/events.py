@@ -0,0 +1,35 @@
+"""
+In-process hooks fired by the appointment and medical record write paths
+
+Subsystems that keep derived state (caches, indexes, rollups) connect a
+listener here instead of patching the models. Listener errors are logged
+and never fail the request that triggered them.
+"""
+
+
+class Hook:
+    def __init__(self, name):
+        self.name = name
+        self.listeners = []
+
+    def connect(self, listener):
+        """Register listener(**payload); usable as a decorator"""
+        self.listeners.append(listener)
+        return listener
+
+    def send(self, **payload):
+        for listener in self.listeners:
+            try:
+                listener(**payload)
+            except Exception as e:
+                print(f"Hook {self.name} listener error: {e}")
+
+
+# appointment_id, patient_id, doctor_id, appointment_date, appointment_time
+appointment_created = Hook('appointment_created')
+
+# appointment (row before the change), status
+appointment_status_changed = Hook('appointment_status_changed')
+
+# patient_id, record_id
+record_saved = Hook('record_saved')
@@ -0,0 +1,318 @@
+"""
+Request performance instrumentation
+
+When PERF_INSTRUMENTATION is enabled this records, per endpoint, request
+latency histograms, database time, query and row counts and template
+render time, keeps samples of slow queries, and serves everything on
+/metrics in the Prometheus text format to scrapers presenting
+METRICS_TOKEN as a bearer token, addresses in METRICS_ALLOW or logged-in
+admins. Template render time is also kept
+per template and per {% block %}; /metrics/templates lists the slowest. When disabled nothing is hooked in,
+so the request path carries no extra work.
+"""
+
+import bisect
+import hmac
+import threading
+import time
+from collections import deque
+
+import pymysql
+from flask import Response, g, has_request_context, request, session, before_render_template, template_rendered
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating inside the matching bucket"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+
+class Registry:
+    def __init__(self, slow_query_seconds=0.2, slow_samples=50):
+        self.slow_query_seconds = slow_query_seconds
+        self.latency = {}
+        self.db_time = {}
+        self.template_time = {}
+        self.requests = {}
+        self.queries = {}
+        self.rows = {}
+        self.template_renders = {}
+        self.template_duration = {}
+        self.block_time = {}
+        self.slow_queries = deque(maxlen=slow_samples)
+        self.gauges = []
+        self._lock = threading.Lock()
+
+    def record_request(self, endpoint, status, elapsed, stats):
+        with self._lock:
+            self.latency.setdefault(endpoint, Histogram()).observe(elapsed)
+            self.db_time.setdefault(endpoint, Histogram()).observe(stats['db_time'])
+            self.template_time.setdefault(endpoint, Histogram()).observe(stats['template_time'])
+            key = (endpoint, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.queries[endpoint] = self.queries.get(endpoint, 0) + stats['queries']
+            self.rows[endpoint] = self.rows.get(endpoint, 0) + stats['rows']
+
+    def record_query(self, query, elapsed, rows):
+        if has_request_context():
+            stats = g.get('_perf')
+            if stats is not None:
+                stats['queries'] += 1
+                stats['rows'] += max(rows, 0)
+                stats['db_time'] += elapsed
+        if elapsed >= self.slow_query_seconds:
+            endpoint = request.endpoint if has_request_context() else None
+            with self._lock:
+                self.slow_queries.append({
+                    'endpoint': endpoint,
+                    'seconds': round(elapsed, 4),
+                    'rows': rows,
+                    'query': ' '.join(str(query).split())[:500],
+                    'at': time.time(),
+                })
+
+    def record_block(self, name, elapsed):
+        with self._lock:
+            count, total, slowest = self.block_time.get(name, (0, 0.0, 0.0))
+            self.block_time[name] = (count + 1, total + elapsed, max(slowest, elapsed))
+
+    def slowest_templates(self, limit=20):
+        """Templates by p95 render time and blocks by total render time"""
+        with self._lock:
+            templates = [
+                {'template': name, 'renders': hist.count, 'total_seconds': round(hist.total, 4),
+                 'p95_seconds': round(hist.quantile(0.95), 4)}
+                for name, hist in self.template_duration.items()
+            ]
+            blocks = [
+                {'block': name, 'renders': count, 'total_seconds': round(total, 4),
+                 'max_seconds': round(slowest, 4)}
+                for name, (count, total, slowest) in self.block_time.items()
+            ]
+        templates.sort(key=lambda row: row['p95_seconds'], reverse=True)
+        blocks.sort(key=lambda row: row['total_seconds'], reverse=True)
+        return {'templates': templates[:limit], 'blocks': blocks[:limit]}
+
+    def render(self):
+        """Prometheus text exposition of every metric"""
+        lines = []
+        with self._lock:
+            self._render_histograms(lines, 'medilink_request_duration_seconds',
+                                    'Request latency by endpoint', self.latency)
+            self._render_histograms(lines, 'medilink_request_db_seconds',
+                                    'Database time per request by endpoint', self.db_time)
+            self._render_histograms(lines, 'medilink_request_template_seconds',
+                                    'Template render time per request by endpoint', self.template_time)
+
+            lines.append('# HELP medilink_requests_total Requests by endpoint and status')
+            lines.append('# TYPE medilink_requests_total counter')
+            for (endpoint, status), n in sorted(self.requests.items()):
+                lines.append(f'medilink_requests_total{{endpoint="{endpoint}",status="{status}"}} {n}')
+
+            for name, help_text, values in (
+                ('medilink_db_queries_total', 'Queries executed by endpoint', self.queries),
+                ('medilink_db_rows_total', 'Rows returned or affected by endpoint', self.rows),
+                ('medilink_template_renders_total', 'Renders by template', self.template_renders),
+            ):
+                label = 'template' if 'template' in name else 'endpoint'
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for key, n in sorted(values.items()):
+                    lines.append(f'{name}{{{label}="{key}"}} {n}')
+
+            lines.append('# HELP medilink_slow_queries_sampled Slow query samples currently held')
+            lines.append('# TYPE medilink_slow_queries_sampled gauge')
+            lines.append(f'medilink_slow_queries_sampled {len(self.slow_queries)}')
+            gauges = list(self.gauges)
+
+        for prefix, collect in gauges:
+            try:
+                values = collect()
+            except Exception as e:
+                print(f"Metrics gauge error ({prefix}): {e}")
+                continue
+            for key, value in sorted(values.items()):
+                if isinstance(value, (int, float)):
+                    lines.append(f'# TYPE medilink_{prefix}_{key} gauge')
+                    lines.append(f'medilink_{prefix}_{key} {value}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_histograms(lines, name, help_text, histograms):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for endpoint, hist in sorted(histograms.items()):
+            cumulative = 0
+            for bound, n in zip(hist.buckets, hist.counts):
+                cumulative += n
+                lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="+Inf"}} {hist.count}')
+            lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {hist.total:.6f}')
+            lines.append(f'{name}_count{{endpoint="{endpoint}"}} {hist.count}')
+        lines.append(f'# TYPE {name}_quantile gauge')
+        for endpoint, hist in sorted(histograms.items()):
+            for q in QUANTILES:
+                lines.append(f'{name}_quantile{{endpoint="{endpoint}",quantile="{q}"}} {hist.quantile(q):.6f}')
+
+
+registry = Registry()
+
+
+def add_gauges(prefix, collect):
+    """Export the numeric values of collect() as medilink_<prefix>_<key> gauges"""
+    registry.gauges.append((prefix, collect))
+
+
+def timed_block(template_name, block_name, render_block):
+    name = f"{template_name}:{block_name}"
+
+    def render(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            yield from render_block(*args, **kwargs)
+        finally:
+            registry.record_block(name, time.perf_counter() - started)
+    return render
+
+
+def profile_blocks(template):
+    """
+    Wrap a compiled template's block functions once so each block is timed.
+    
+    Only blocks defined by the rendered template itself are seen; blocks a
+    parent layout leaves un-overridden are counted in the page total only.
+    """
+    if getattr(template, '_perf_blocks', False):
+        return
+    for block_name, render_block in list(template.blocks.items()):
+        template.blocks[block_name] = timed_block(template.name, block_name, render_block)
+    template._perf_blocks = True
+
+
+class InstrumentedCursor(pymysql.cursors.DictCursor):
+    """DictCursor that reports every execute() to the registry"""
+
+    def execute(self, query, args=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, args)
+        finally:
+            registry.record_query(query, time.perf_counter() - started, self.rowcount)
+
+
+def init_app(app, mysql):
+    """Hook instrumentation into the app when PERF_INSTRUMENTATION is set"""
+    if not app.config.get('PERF_INSTRUMENTATION'):
+        return False
+
+    registry.slow_query_seconds = app.config.get('SLOW_QUERY_MS', 200) / 1000.0
+    for pool in getattr(mysql, 'all_pools', lambda: [mysql.pool])():
+        pool.connect_args['cursorclass'] = InstrumentedCursor
+    add_gauges('db_pool', mysql.pool.stats)
+
+    @app.before_request
+    def start_request_timer():
+        g._perf = {'started': time.perf_counter(), 'queries': 0, 'rows': 0,
+                   'db_time': 0.0, 'template_time': 0.0}
+
+    @app.teardown_request
+    def record_request(exception):
+        stats = g.pop('_perf', None)
+        if stats is None or request.endpoint == 'metrics':
+            return
+        elapsed = time.perf_counter() - stats['started']
+        status = 500 if exception is not None else g.pop('_perf_status', 200)
+        registry.record_request(request.endpoint or 'unknown', status, elapsed, stats)
+
+    @app.after_request
+    def remember_status(response):
+        g._perf_status = response.status_code
+        return response
+
+    def template_started(sender, template, context, **extra):
+        profile_blocks(template)
+        if has_request_context() and '_perf' in g:
+            g._perf_template_started = time.perf_counter()
+
+    def template_finished(sender, template, context, **extra):
+        if not has_request_context() or '_perf' not in g:
+            return
+        started = g.pop('_perf_template_started', None)
+        elapsed = time.perf_counter() - started if started is not None else None
+        if elapsed is not None:
+            g._perf['template_time'] += elapsed
+        with registry._lock:
+            name = template.name or 'unknown'
+            registry.template_renders[name] = registry.template_renders.get(name, 0) + 1
+            if elapsed is not None:
+                registry.template_duration.setdefault(name, Histogram()).observe(elapsed)
+
+    before_render_template.connect(template_started, app, weak=False)
+    template_rendered.connect(template_finished, app, weak=False)
+
+    token = app.config.get('METRICS_TOKEN')
+    allowed = {addr.strip() for addr in (app.config.get('METRICS_ALLOW') or '').split(',') if addr.strip()}
+
+    # Behind a local proxy every client is loopback, so the address alone proves nothing
+    def may_scrape():
+        if session.get('user_type') == 'admin' or request.remote_addr in allowed:
+            return True
+        scheme, _, presented = request.headers.get('Authorization', '').partition(' ')
+        return bool(token) and scheme.lower() == 'bearer' and hmac.compare_digest(presented, token)
+
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus metrics, for the configured scraper token or addresses and admins"""
+        if not may_scrape():
+            return Response('Forbidden\n', status=403, mimetype='text/plain')
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+    # SQL samples and template structure are for logged-in admins, not whoever reaches the port
+    def admin_only():
+        if session.get('user_type') != 'admin':
+            return Response('Forbidden\n', status=403, mimetype='text/plain')
+        return None
+
+    @app.route('/metrics/slow-queries')
+    def metrics_slow_queries():
+        """Most recent slow query samples, for admins"""
+        denied = admin_only()
+        if denied:
+            return denied
+        with registry._lock:
+            samples = list(registry.slow_queries)
+        return {'slow_queries': samples}
+
+    @app.route('/metrics/templates')
+    def metrics_templates():
+        """Slowest templates and blocks, for admins"""
+        denied = admin_only()
+        if denied:
+            return denied
+        return registry.slowest_templates(request.args.get('limit', 20, type=int))
+
+    return True
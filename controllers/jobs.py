@@ -0,0 +1,237 @@
+"""
+Persistent background job queue
+
+Routes enqueue side effects (reset-link delivery, reminder fan-out) as rows
+in background_jobs and return straight away; a small pool of worker threads
+claims due jobs with SELECT ... FOR UPDATE SKIP LOCKED, runs the registered
+handler and retries failures with exponential backoff. Jobs survive
+restarts, and jobs left 'running' by a crashed process are picked up again
+once they go stale, or failed if that crash used up their last attempt. Several app processes can share the one table.
+
+Kinds registered with scrub=True carry secrets (reset links): their payload
+is blanked as soon as the job is done or has failed for good, so only the
+job row's bookkeeping is kept. Short-lived scripts set autostart=False and
+call drain(), which runs due jobs in the calling thread and returns when
+none are left, instead of starting worker threads that die with the process
+mid-job.
+"""
+
+import json
+import socket
+import threading
+
+CLAIM_QUERY = """
+    SELECT job_id, kind, payload, attempts
+    FROM background_jobs
+    WHERE status = 'pending' AND run_after <= NOW() {kind_filter}
+    ORDER BY run_after, job_id
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED
+"""
+
+PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+SCRUBBED_PAYLOAD = '{}'
+
+
+class JobQueue:
+    def __init__(self, mysql, workers=2, poll_interval=5, max_attempts=5, backoff=30,
+                 stale_after=600, keep_done=86400, autostart=True):
+        self.mysql = mysql
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.stale_after = stale_after
+        self.keep_done = keep_done
+        self.autostart = autostart
+        self.handlers = {}
+        self.scrubbed = set()
+        self.enqueued = 0
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+        self.owner = f"{socket.gethostname()}:{id(self)}"
+        self._wake = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def handler(self, kind, scrub=False):
+        """Register fn(payload) as the handler for kind; usable as a decorator"""
+        def register(fn):
+            self.handlers[kind] = fn
+            if scrub:
+                self.scrubbed.add(kind)
+            return fn
+        return register
+
+    def enqueue(self, kind, payload, delay=0, dedupe_key=None):
+        """
+        Persist a job and wake a worker; returns the job id.
+
+        A job with the same dedupe_key is only ever queued once, in which
+        case None is returned.
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"No handler registered for job kind {kind!r}")
+        conn = self.mysql.pool.acquire()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT IGNORE INTO background_jobs (kind, payload, dedupe_key, run_after)
+                VALUES (%s, %s, %s, NOW() + INTERVAL %s SECOND)
+            """, (kind, json.dumps(payload, default=str), dedupe_key, int(delay)))
+            job_id = cursor.lastrowid if cursor.rowcount else None
+            conn.commit()
+            cursor.close()
+        finally:
+            self.mysql.pool.release(conn)
+        with self._lock:
+            self.enqueued += 1
+        if self.autostart:
+            self.start()
+        self._wake.set()
+        return job_id
+
+    def start(self):
+        """Start the worker threads once; safe to call on every request"""
+        if self._threads or not self.workers:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work_forever, name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work_forever(self):
+        while True:
+            try:
+                if self.run_pending():
+                    continue
+            except Exception as e:
+                print(f"Job queue error: {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _claim(self, conn, limit, kinds=None):
+        kind_filter = ''
+        params = [limit]
+        if kinds:
+            kind_filter = f"AND kind IN ({', '.join(['%s'] * len(kinds))})"
+            params = list(kinds) + params
+        cursor = conn.cursor()
+        try:
+            cursor.execute(CLAIM_QUERY.format(kind_filter=kind_filter), params)
+            jobs = cursor.fetchall()
+            if jobs:
+                ids = [job['job_id'] for job in jobs]
+                placeholders = ', '.join(['%s'] * len(ids))
+                cursor.execute(f"""
+                    UPDATE background_jobs
+                    SET status = 'running', attempts = attempts + 1, locked_by = %s, locked_at = NOW()
+                    WHERE job_id IN ({placeholders})
+                """, [self.owner] + ids)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        return jobs
+
+    def _finish(self, conn, job, error=None):
+        attempts = job['attempts'] + 1
+        cursor = conn.cursor()
+        if error is None:
+            cursor.execute("UPDATE background_jobs SET status = 'done', last_error = NULL WHERE job_id = %s",
+                           (job['job_id'],))
+            counter = 'completed'
+            self._scrub(cursor, job)
+        elif attempts < self.max_attempts:
+            delay = self.backoff * 2 ** (attempts - 1)
+            cursor.execute("""
+                UPDATE background_jobs
+                SET status = 'pending', last_error = %s, run_after = NOW() + INTERVAL %s SECOND
+                WHERE job_id = %s
+            """, (str(error)[:1000], delay, job['job_id']))
+            counter = 'retried'
+        else:
+            cursor.execute("UPDATE background_jobs SET status = 'failed', last_error = %s WHERE job_id = %s",
+                           (str(error)[:1000], job['job_id']))
+            counter = 'failed'
+            self._scrub(cursor, job)
+        conn.commit()
+        cursor.close()
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _scrub(self, cursor, job):
+        if job['kind'] in self.scrubbed:
+            cursor.execute("UPDATE background_jobs SET payload = %s WHERE job_id = %s",
+                           (SCRUBBED_PAYLOAD, job['job_id']))
+
+    def run_pending(self, limit=10, kinds=None):
+        """Claim and run up to limit due jobs, optionally only of some kinds; returns how many ran"""
+        conn = self.mysql.pool.acquire()
+        try:
+            jobs = self._claim(conn, limit, kinds)
+            for job in jobs:
+                try:
+                    self.handlers[job['kind']](json.loads(job['payload']))
+                except Exception as e:
+                    print(f"Job {job['kind']}#{job['job_id']} error: {e}")
+                    self._finish(conn, job, e)
+                else:
+                    self._finish(conn, job)
+            if not jobs:
+                self._housekeeping(conn)
+        finally:
+            self.mysql.pool.release(conn)
+        return len(jobs)
+
+    def drain(self, kinds=None):
+        """Run due jobs in this thread until none are left; returns how many ran"""
+        ran = 0
+        while True:
+            count = self.run_pending(kinds=kinds)
+            if not count:
+                return ran
+            ran += count
+
+    def _housekeeping(self, conn):
+        """Requeue jobs stuck in 'running' (or fail them when out of attempts) and drop old finished ones"""
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT job_id, kind FROM background_jobs
+            WHERE status = 'running' AND locked_at < NOW() - INTERVAL %s SECOND AND attempts >= %s
+        """, (self.stale_after, self.max_attempts))
+        exhausted = cursor.fetchall()
+        for job in exhausted:
+            cursor.execute("UPDATE background_jobs SET status = 'failed', last_error = %s WHERE job_id = %s",
+                           ('Worker stopped while running the job', job['job_id']))
+            self._scrub(cursor, job)
+        cursor.execute("""
+            UPDATE background_jobs SET status = 'pending'
+            WHERE status = 'running' AND locked_at < NOW() - INTERVAL %s SECOND AND attempts < %s
+        """, (self.stale_after, self.max_attempts))
+        cursor.execute("""
+            DELETE FROM background_jobs
+            WHERE status = 'done' AND updated_at < NOW() - INTERVAL %s SECOND
+            LIMIT 1000
+        """, (self.keep_done,))
+        conn.commit()
+        cursor.close()
+        if exhausted:
+            with self._lock:
+                self.failed += len(exhausted)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': len(self._threads),
+                'enqueued': self.enqueued,
+                'completed': self.completed,
+                'retried': self.retried,
+                'failed': self.failed,
+            }
@@ -0,0 +1,306 @@
+"""
+Live appointment updates over Server-Sent Events
+
+The appointment hooks publish a small delta for every booking and status
+change to the doctor's and the patient's channel (``doctor:<id>``,
+``patient:<id>``). Dashboards open /events/appointments and patch their
+table from the stream instead of reloading the page.
+
+Publishing goes through a pub/sub backend so every worker process sees
+every change: ``RedisPubSub`` when EVENTS_PUBSUB_URL (or CACHE_SHARED_URL)
+points at Redis, else ``LocalPubSub``, the in-process stand-in. Each
+process fans messages out to its own subscribers and keeps a short
+per-channel history, so a browser reconnecting with Last-Event-ID gets
+what it missed; one that reconnects to another process, or fell too far
+behind, gets a ``resync`` event and reloads the page.
+
+A subscription is a small object with a bounded deque, woken through a
+threading.Event on the sync server or through its event loop under
+asgi.py, where an idle stream costs no thread at all. On the sync server
+every open stream holds a thread, so the app caps them at
+EVENTS_SYNC_MAX_STREAMS per process; serve through asgi.py for more.
+"""
+
+import itertools
+import json
+import secrets
+import threading
+from collections import OrderedDict, deque
+
+from controllers.events import appointment_created, appointment_status_changed
+
+CHANNEL = 'medilink:events'
+
+
+def sequence(event):
+    return int(event[0].rpartition('-')[2])
+
+
+class BrokerFull(Exception):
+    """Raised when the process already holds max_subscribers streams"""
+
+
+class LocalPubSub:
+    """In-process stand-in for RedisPubSub; only this process's broker hears a message"""
+
+    def __init__(self):
+        self._listeners = []
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def publish(self, message):
+        for listener in self._listeners:
+            listener(message)
+
+
+class RedisPubSub:
+    """Pub/sub across worker processes on Redis; requires the optional ``redis`` package"""
+
+    def __init__(self, url, channel=CHANNEL):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.channel = channel
+        self._thread = None
+
+    def subscribe(self, listener):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self.channel: lambda message: listener(message['data'].decode('utf-8'))})
+        self._thread = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def publish(self, message):
+        self.client.publish(self.channel, message)
+
+
+def pubsub_from_url(url):
+    if not url or url == 'memory://':
+        return LocalPubSub()
+    return RedisPubSub(url)
+
+
+class Subscription:
+    def __init__(self, broker, channels, max_pending):
+        self.broker = broker
+        self.channels = channels
+        self.pending = deque(maxlen=max_pending)
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._loop = None
+        self._async_ready = None
+
+    def push(self, event):
+        with self._lock:
+            if len(self.pending) == self.pending.maxlen:
+                # Too far behind to patch the page; have it reload instead
+                self.pending.clear()
+                event = self.broker.resync_event()
+            self.pending.append(event)
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._async_ready.set)
+            except RuntimeError:
+                pass
+        else:
+            self._ready.set()
+
+    def drain(self):
+        with self._lock:
+            events = list(self.pending)
+            self.pending.clear()
+        return events
+
+    def wait(self, timeout):
+        """Events published since the last call, or [] after timeout seconds"""
+        if not self.pending:
+            self._ready.wait(timeout)
+        self._ready.clear()
+        return self.drain()
+
+    async def wait_async(self, timeout):
+        """wait() for a coroutine; wakes through the running event loop"""
+        # Only the ASGI server gets here; the sync server never pays for importing asyncio
+        import asyncio
+        if self._loop is None:
+            self._async_ready = asyncio.Event()
+            self._loop = asyncio.get_running_loop()
+        if not self.pending:
+            try:
+                await asyncio.wait_for(self._async_ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self._async_ready.clear()
+        return self.drain()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class EventBroker:
+    def __init__(self, pubsub=None, history=100, max_channels=4096, max_subscribers=10000, max_pending=256):
+        self.pubsub = pubsub or LocalPubSub()
+        self.history = history
+        self.max_channels = max_channels
+        self.max_subscribers = max_subscribers
+        self.max_pending = max_pending
+        self.instance = secrets.token_hex(4)
+        self.published = 0
+        self.delivered = 0
+        self.rejected = 0
+        self._seq = itertools.count(1)
+        self._last_seq = 0
+        self._subscribers = {}
+        self._count = 0
+        self._history = OrderedDict()
+        self._evicted_upto = 0
+        self._started = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Listen on the pub/sub backend once; safe to call on every request"""
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self.pubsub.subscribe(self._deliver)
+
+    def publish(self, channels, kind, data):
+        self.start()
+        self.published += 1
+        self.pubsub.publish(json.dumps({'channels': channels, 'kind': kind, 'data': data}, default=str))
+
+    def resync_event(self):
+        return (f"{self.instance}-{self._last_seq}", 'resync', '{}')
+
+    def _deliver(self, message):
+        message = json.loads(message)
+        data = json.dumps(message['data'])
+        with self._lock:
+            self._last_seq = next(self._seq)
+            event = (f"{self.instance}-{self._last_seq}", message['kind'], data)
+            targets = []
+            for channel in message['channels']:
+                history = self._history.get(channel)
+                if history is None:
+                    history = self._history[channel] = deque(maxlen=self.history)
+                    while len(self._history) > self.max_channels:
+                        _, evicted = self._history.popitem(last=False)
+                        self._evicted_upto = max(self._evicted_upto, sequence(evicted[-1]))
+                else:
+                    self._history.move_to_end(channel)
+                history.append(event)
+                targets.extend(self._subscribers.get(channel, ()))
+        for subscription in set(targets):
+            subscription.push(event)
+        self.delivered += len(targets)
+
+    def _missed(self, channels, last_event_id):
+        """History after last_event_id, or None when it cannot be replayed"""
+        instance, _, seq = last_event_id.partition('-')
+        if instance != self.instance or not seq.isdigit():
+            return None
+        seq = int(seq)
+        missed = []
+        for channel in channels:
+            history = self._history.get(channel)
+            if history is None:
+                if seq < self._evicted_upto:
+                    return None
+                continue
+            if len(history) == history.maxlen and sequence(history[0]) > seq:
+                return None
+            missed.extend(event for event in history if sequence(event) > seq)
+        return sorted(set(missed), key=sequence)
+
+    def subscribe(self, channels, last_event_id=None):
+        self.start()
+        subscription = Subscription(self, channels, self.max_pending)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                self.rejected += 1
+                raise BrokerFull(f"{self._count} event streams already open")
+            for channel in channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+            self._count += 1
+            if last_event_id:
+                missed = self._missed(channels, last_event_id)
+                for event in missed if missed is not None else [self.resync_event()]:
+                    subscription.push(event)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            removed = False
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers and subscription in subscribers:
+                    subscribers.discard(subscription)
+                    removed = True
+                    if not subscribers:
+                        del self._subscribers[channel]
+            if removed:
+                self._count -= 1
+
+    def on_created(self, appointment_id, patient_id, doctor_id, appointment_date, appointment_time):
+        self.publish([f"doctor:{doctor_id}", f"patient:{patient_id}"], 'appointment', {
+            'appointment_id': appointment_id, 'patient_id': patient_id, 'doctor_id': doctor_id,
+            'appointment_date': appointment_date, 'appointment_time': appointment_time,
+            'status': 'Scheduled',
+        })
+
+    def on_status_changed(self, appointment, status):
+        self.publish([f"doctor:{appointment['doctor_id']}", f"patient:{appointment['patient_id']}"], 'appointment', {
+            'appointment_id': appointment['appointment_id'], 'patient_id': appointment['patient_id'],
+            'doctor_id': appointment['doctor_id'], 'appointment_date': appointment['appointment_date'],
+            'appointment_time': appointment['appointment_time'], 'status': status,
+        })
+
+    def connect(self):
+        appointment_created.connect(self.on_created)
+        appointment_status_changed.connect(self.on_status_changed)
+        return self
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': self._count,
+                'channels': len(self._subscribers),
+                'published': self.published,
+                'delivered': self.delivered,
+                'rejected': self.rejected,
+            }
+
+
+STREAM_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+# Browsers reconnect after this many milliseconds when a stream drops
+RETRY = 'retry: 3000\n\n'
+HEARTBEAT = ': keep-alive\n\n'
+
+
+def format_event(event):
+    event_id, kind, data = event
+    return f"id: {event_id}\nevent: {kind}\ndata: {data}\n\n"
+
+
+def stream(subscription, heartbeat):
+    """SSE body for the sync server; a comment line every heartbeat seconds keeps proxies open"""
+    try:
+        yield RETRY
+        while True:
+            events = subscription.wait(heartbeat)
+            yield ''.join(map(format_event, events)) if events else HEARTBEAT
+    finally:
+        subscription.close()
+
+
+async def stream_async(subscription, heartbeat):
+    """stream() as an async generator for the coroutine view in asgi.py"""
+    try:
+        yield RETRY.encode('utf-8')
+        while True:
+            events = await subscription.wait_async(heartbeat)
+            yield (''.join(map(format_event, events)) if events else HEARTBEAT).encode('utf-8')
+    finally:
+        subscription.close()
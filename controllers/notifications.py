@@ -0,0 +1,144 @@
+"""
+Deferred notifications: password reset links and appointment reminders
+
+Handlers run on the job queue workers, never on a request thread. Delivery
+goes through deliver(), which writes to the console like the original
+reset flow did; an email or SMS gateway plugs in there.
+
+Reminders fan out in two steps: one 'appointment_reminders' job per day
+pages through that day's Scheduled appointments and enqueues a
+'reminder_batch' job per batch, so a slow gateway only delays one batch.
+Each sent reminder is recorded in reminder_deliveries, so a batch retried
+after a failure part-way through only sends the ones still missing.
+Schedule the daily fan-out from cron with:
+
+    python -m controllers.notifications reminders
+
+The command queues the fan-out and then sends the reminders itself,
+exiting once no reminder job is left; --queue-only leaves them to the app's
+workers. Reset-link payloads are scrubbed from the job table once sent.
+"""
+
+import argparse
+from datetime import date, timedelta
+
+REMINDER_KINDS = ('appointment_reminders', 'reminder_batch')
+
+REMINDER_QUERY = """
+    SELECT a.appointment_id, a.appointment_date, a.appointment_time,
+           p.full_name AS patient_name, p.email AS patient_email, p.phone AS patient_phone,
+           d.full_name AS doctor_name
+    FROM appointments a
+    JOIN patients p ON p.patient_id = a.patient_id
+    JOIN doctors d ON d.doctor_id = a.doctor_id
+    WHERE a.appointment_date = %s AND a.status = 'Scheduled' AND a.appointment_id > %s
+    ORDER BY a.appointment_id
+    LIMIT %s
+"""
+
+SENT_QUERY = """
+    SELECT appointment_id FROM reminder_deliveries
+    WHERE appointment_date = %s AND appointment_id IN ({ids})
+"""
+
+
+def deliver(to, subject, body):
+    print(f"\n{'='*60}")
+    print(f"{subject} -> {to}")
+    print(body)
+    print(f"{'='*60}\n")
+
+
+def register(queue, mysql, batch_size=100):
+    """Register the notification handlers on a JobQueue"""
+
+    @queue.handler('reset_link', scrub=True)
+    def send_reset_link(payload):
+        deliver(payload['email'], f"PASSWORD RESET LINK FOR {payload['full_name']}", payload['link'])
+
+    @queue.handler('appointment_reminders')
+    def fan_out_reminders(payload):
+        conn = mysql.pool.acquire()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM reminder_deliveries WHERE appointment_date < CURDATE()")
+            conn.commit()
+            cursor.close()
+        finally:
+            mysql.pool.release(conn)
+        # Appointments live on the patient's shard; ids are unique across shards
+        for pool in mysql.shards.pools:
+            last_id = payload.get('after_id', 0)
+            conn = pool.acquire()
+            try:
+                cursor = conn.cursor()
+                while True:
+                    cursor.execute(REMINDER_QUERY, (payload['day'], last_id, batch_size))
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+                    last_id = rows[-1]['appointment_id']
+                    queue.enqueue('reminder_batch', {'appointments': rows},
+                                  dedupe_key=f"reminders:{payload['day']}:{last_id}")
+                cursor.close()
+            finally:
+                pool.release(conn)
+
+    @queue.handler('reminder_batch')
+    def send_reminder_batch(payload):
+        rows = payload['appointments']
+        if not rows:
+            return
+        conn = mysql.pool.acquire()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(SENT_QUERY.format(ids=', '.join(['%s'] * len(rows))),
+                           [rows[0]['appointment_date']] + [row['appointment_id'] for row in rows])
+            sent = {row['appointment_id'] for row in cursor.fetchall()}
+            for row in rows:
+                if row['appointment_id'] in sent:
+                    continue
+                deliver(
+                    row['patient_email'] or row['patient_phone'],
+                    'Appointment reminder',
+                    f"Dear {row['patient_name']}, this is a reminder of your appointment with "
+                    f"Dr. {row['doctor_name']} on {row['appointment_date']} at {row['appointment_time']}."
+                )
+                cursor.execute("""
+                    INSERT IGNORE INTO reminder_deliveries (appointment_id, appointment_date) VALUES (%s, %s)
+                """, (row['appointment_id'], row['appointment_date']))
+                conn.commit()
+            cursor.close()
+        finally:
+            mysql.pool.release(conn)
+
+    return queue
+
+
+def enqueue_reminders(queue, day=None):
+    """Queue the reminder fan-out for day (default: tomorrow) at most once"""
+    day = day or date.today() + timedelta(days=1)
+    return queue.enqueue('appointment_reminders', {'day': day.isoformat()},
+                         dedupe_key=f"reminders:{day.isoformat()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Queue Medilink notifications')
+    parser.add_argument('task', choices=['reminders'])
+    parser.add_argument('--day', type=date.fromisoformat, default=None,
+                        help='appointment date to remind about (default: tomorrow)')
+    parser.add_argument('--queue-only', action='store_true',
+                        help="only queue the fan-out and leave sending to the app's workers")
+    args = parser.parse_args()
+
+    from app import job_queue
+    # No worker threads: they would die with this process and leave claimed jobs 'running'
+    job_queue.autostart = False
+    job_id = enqueue_reminders(job_queue, args.day)
+    print(f"Queued reminder job {job_id}" if job_id else "Reminders for that day are already queued")
+    if not args.queue_only:
+        print(f"Ran {job_queue.drain(REMINDER_KINDS)} reminder job(s)")
+
+
+if __name__ == '__main__':
+    main()
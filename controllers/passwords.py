@@ -0,0 +1,186 @@
+"""
+Bounded password hashing service
+
+Hashing and verification run in a small process pool so CPU-heavy scrypt
+or pbkdf2 work never holds request threads or the GIL. The number of
+outstanding jobs is capped; beyond that callers get HashingBusy straight
+away and the route answers with a retryable 503 instead of queueing
+forever; a job that times out or a crashed pool gets the same answer.
+Successful logins whose stored hash was made with older cost parameters
+are transparently rehashed, and unknown users still pay for one
+verification so response times do not reveal which accounts exist.
+"""
+
+import importlib.util
+import multiprocessing
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+USER_LOOKUPS = {
+    'doctor': ("SELECT * FROM doctors WHERE doctor_code = %s", 'doctors', 'doctor_id'),
+    'patient': ("SELECT * FROM patients WHERE email = %s", 'patients', 'patient_id'),
+}
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full, a job times out or the pool has crashed"""
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _verify(pwhash, password):
+    return check_password_hash(pwhash, password)
+
+
+def isolate_workers():
+    """
+    Make spawned hashing workers start from this module.
+
+    The spawn start method re-runs the parent's main module in every child,
+    so under ``python app.py`` each worker would build the whole app just
+    to hash passwords. Call this from a script's ``__main__`` block before
+    the pool starts.
+    """
+    sys.modules['__main__'].__spec__ = importlib.util.find_spec(__name__)
+
+
+def hash_method(pwhash):
+    """The method and cost prefix of a werkzeug hash, e.g. 'scrypt:32768:8:1'"""
+    return pwhash.split('$', 1)[0] if pwhash else ''
+
+
+class PasswordService:
+    def __init__(self, workers=2, max_pending=32, timeout=10, method=DEFAULT_METHOD):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.method = method
+        self.rejected = 0
+        self.rehashed = 0
+        self.failures = 0
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._dummy_hash = None
+        self._lock = threading.Lock()
+
+    def _reset(self, broken):
+        """Drop a crashed pool so the next job starts a fresh one"""
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        try:
+            broken.shutdown(wait=False, cancel_futures=True)
+        except Exception:
+            pass
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashingBusy("Password hashing queue is full")
+        executor = None
+        try:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context('spawn')
+                    )
+                executor = self._executor
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool as e:
+            self._slots.release()
+            self._failed(executor)
+            raise HashingBusy("Password hashing pool crashed") from e
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout as e:
+            self._failed(None)
+            raise HashingBusy(f"Password hashing took longer than {self.timeout}s") from e
+        except BrokenProcessPool as e:
+            self._failed(executor)
+            raise HashingBusy("Password hashing pool crashed") from e
+
+    def _failed(self, broken):
+        with self._lock:
+            self.failures += 1
+        if broken is not None:
+            self._reset(broken)
+
+    def hash(self, password):
+        """Hash a password with the configured method"""
+        return self._submit(_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._submit(_verify, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        return hash_method(pwhash) != self.method
+
+    def authenticate(self, mysql, user_type, login, password):
+        """
+        Return the user row when login/password match, else None.
+
+        Patients are looked up on every shard and rehashed on their own.
+        Rehash failures are logged and never fail the login.
+        """
+        query, table, id_column = USER_LOOKUPS[user_type]
+        sharded = table == 'patients'
+        cursor = (mysql.everywhere() if sharded else mysql.connection).cursor()
+        cursor.execute(query, (login,))
+        user = cursor.fetchone()
+        cursor.close()
+
+        if not user or not user.get('password'):
+            # Same work as a wrong password, so timing does not reveal the account exists
+            if self._dummy_hash is None:
+                self._dummy_hash = self.hash('no-such-user')
+            self.verify(self._dummy_hash, password)
+            return None
+        if not self.verify(user['password'], password):
+            return None
+
+        if self.needs_rehash(user['password']):
+            try:
+                new_hash = self.hash(password)
+                if sharded:
+                    conn = mysql.patient_connection(user[id_column], primary=True)
+                else:
+                    conn = mysql.connection
+                cursor = conn.cursor()
+                cursor.execute(f"UPDATE {table} SET password = %s WHERE {id_column} = %s",
+                               (new_hash, user[id_column]))
+                conn.commit()
+                cursor.close()
+                with self._lock:
+                    self.rehashed += 1
+            except Exception as e:
+                print(f"Password rehash error: {e}")
+        return user
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'rejected': self.rejected,
+                'failures': self.failures,
+                'rehashed': self.rehashed,
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
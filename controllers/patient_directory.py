@@ -0,0 +1,177 @@
+"""
+Keyset-paginated patient directory
+
+Pages are ordered by (full_name, patient_id) and addressed by an opaque
+cursor holding the last row of the previous page (``after``) or the first
+row of the next one (``before``), so page N costs the same index range scan
+as page 1. Forward pages are streamed from an unbuffered cursor; backward
+pages are read in reverse order and flipped in memory.
+"""
+
+import base64
+import json
+from collections import deque
+
+import pymysql
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+PATIENT_COLUMNS = """
+    patient_id, full_name, age, gender, phone, email,
+    address, blood_group, emergency_contact
+"""
+
+
+def encode_cursor(row):
+    raw = json.dumps([row['full_name'], row['patient_id']]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a page cursor, returning None for missing or malformed input"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        full_name, patient_id = json.loads(base64.urlsafe_b64decode(padded))
+        return str(full_name), int(patient_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def build_query(after=None, search=None, limit=PAGE_SIZE, before=None):
+    """
+    Return (sql, params) for one page, fetching one extra row to detect more.
+    With ``before`` the rows come newest-last-first (descending) and the
+    caller reverses them.
+    """
+    clauses = []
+    params = []
+    if search:
+        # Prefix matches keep the name, email and phone indexes usable
+        like = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        clauses.append("(full_name LIKE %s OR email LIKE %s OR phone LIKE %s)")
+        params.extend([like, like.lower(), like])
+    if after:
+        clauses.append("(full_name > %s OR (full_name = %s AND patient_id > %s))")
+        params.extend([after[0], after[0], after[1]])
+    if before:
+        clauses.append("(full_name < %s OR (full_name = %s AND patient_id < %s))")
+        params.extend([before[0], before[0], before[1]])
+
+    sql = f"SELECT {PATIENT_COLUMNS} FROM patients"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    if before:
+        sql += " ORDER BY full_name DESC, patient_id DESC LIMIT %s"
+    else:
+        sql += " ORDER BY full_name, patient_id LIMIT %s"
+    params.append(limit + 1)
+    return sql, params
+
+
+class PatientPage:
+    """
+    One page of patients, streamed row by row.
+
+    ``next_cursor`` is filled in once iteration has passed the last row, so
+    templates should render pagination links after the row loop;
+    ``prev_cursor`` is known up front. ``len()`` buffers the rest of the
+    page (at most ``limit`` + 1 rows) and fills in ``next_cursor`` too.
+    """
+
+    def __init__(self, conn, after=None, search=None, limit=PAGE_SIZE, before=None):
+        self.conn = conn
+        self.search = search
+        self.limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        self.before = before
+        self.sql, self.params = build_query(None if before else after, search, self.limit, before)
+        self.next_cursor = None
+        self.prev_cursor = None
+        self._after = after
+        self._cursor = None
+        self._first = None
+        self._pending = deque()
+        self._fetched = 0
+        self._started = False
+
+    def _open(self):
+        self._started = True
+        self._cursor = self.conn.cursor(pymysql.cursors.SSDictCursor)
+        self._cursor.execute(self.sql, self.params)
+        if self.before:
+            rows = list(self._cursor.fetchall())
+            self.close()
+            if len(rows) > self.limit:
+                rows = rows[:self.limit]
+                self.prev_cursor = encode_cursor(rows[-1])
+            rows.reverse()
+            if rows:
+                self.next_cursor = encode_cursor(rows[-1])
+            self._pending.extend(rows)
+            self._fetched = len(rows)
+        self._first = self._next_row()
+        if self._after and self._first is not None:
+            self.prev_cursor = encode_cursor(self._first)
+
+    def _next_row(self):
+        if self._pending:
+            return self._pending.popleft()
+        if self._cursor is None:
+            return None
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._fetched += 1
+        return row
+
+    def __bool__(self):
+        if not self._started:
+            self._open()
+        return self._first is not None
+
+    def __len__(self):
+        if not self._started:
+            self._open()
+        if self._cursor is not None:
+            while True:
+                row = self._cursor.fetchone()
+                if row is None:
+                    break
+                self._fetched += 1
+                self._pending.append(row)
+            self.close()
+            rows = ([self._first] if self._first is not None else []) + list(self._pending)
+            if len(rows) > self.limit and not self.before:
+                self.next_cursor = encode_cursor(rows[self.limit - 1])
+        return min(self._fetched, self.limit)
+
+    def __iter__(self):
+        if not self._started:
+            self._open()
+        elif self._first is None and not self._pending:
+            return
+        try:
+            row = self._first
+            self._first = None
+            count = 0
+            while row is not None:
+                if count == self.limit:
+                    self.next_cursor = encode_cursor(last)
+                    break
+                yield row
+                last = row
+                count += 1
+                row = self._next_row()
+        finally:
+            self._pending.clear()
+            self.close()
+
+    def close(self):
+        if self._cursor is not None:
+            self._cursor.close()
+            self._cursor = None
+
+    def fetch_all(self):
+        """Materialize the page as a list (for JSON responses)"""
+        return list(self)
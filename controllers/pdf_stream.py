@@ -0,0 +1,113 @@
+"""
+Minimal streaming PDF writer
+
+Writes plain-text pages in the built-in Helvetica font one page at a time,
+tracking byte offsets for the cross-reference table, so a document of any
+length is produced with constant memory. Only the page object ids are kept
+until the end.
+"""
+
+import textwrap
+
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+MARGIN = 50
+FONT_SIZE = 9
+LEADING = 12
+WRAP_COLUMNS = 110
+LINES_PER_PAGE = (PAGE_HEIGHT - 2 * MARGIN) // LEADING
+
+# Object ids fixed up front: 1 catalog, 2 page tree, 3 font
+CATALOG_ID = 1
+PAGES_ID = 2
+FONT_ID = 3
+
+
+def escape(text):
+    text = text.encode('latin-1', 'replace').decode('latin-1')
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+class PDFStream:
+    def __init__(self, title=''):
+        self.title = title
+        self.offset = 0
+        self.offsets = {}
+        self.next_id = FONT_ID + 1
+        self.page_ids = []
+
+    def _emit(self, data):
+        if isinstance(data, str):
+            data = data.encode('latin-1')
+        self.offset += len(data)
+        return data
+
+    def _object(self, obj_id, body):
+        self.offsets[obj_id] = self.offset
+        return self._emit(f"{obj_id} 0 obj\n") + self._emit(body) + self._emit("\nendobj\n")
+
+    def header(self):
+        return (self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+                + self._object(FONT_ID, "<< /Type /Font /Subtype /Type1 "
+                                        "/BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"))
+
+    def page(self, lines):
+        content_id = self.next_id
+        page_id = self.next_id + 1
+        self.next_id += 2
+        self.page_ids.append(page_id)
+
+        ops = [f"BT /F1 {FONT_SIZE} Tf {LEADING} TL {MARGIN} {PAGE_HEIGHT - MARGIN} Td"]
+        for line in lines:
+            ops.append(f"({escape(line)}) Tj T*")
+        ops.append("ET")
+        stream = '\n'.join(ops).encode('latin-1')
+
+        content = self._content_object(content_id, stream)
+        page = self._object(page_id, (
+            f"<< /Type /Page /Parent {PAGES_ID} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 {FONT_ID} 0 R >> >> /Contents {content_id} 0 R >>"
+        ))
+        return content + page
+
+    def _content_object(self, obj_id, stream):
+        self.offsets[obj_id] = self.offset
+        return (self._emit(f"{obj_id} 0 obj\n<< /Length {len(stream)} >>\nstream\n")
+                + self._emit(stream)
+                + self._emit("\nendstream\nendobj\n"))
+
+    def trailer(self):
+        kids = ' '.join(f"{page_id} 0 R" for page_id in self.page_ids)
+        out = self._object(PAGES_ID, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>")
+        out += self._object(CATALOG_ID, f"<< /Type /Catalog /Pages {PAGES_ID} 0 R >>")
+
+        xref_offset = self.offset
+        count = self.next_id
+        xref = [f"xref\n0 {count}\n", "0000000000 65535 f \n"]
+        for obj_id in range(1, count):
+            xref.append(f"{self.offsets[obj_id]:010d} 00000 n \n")
+        out += self._emit(''.join(xref))
+        out += self._emit(f"trailer\n<< /Size {count} /Root {CATALOG_ID} 0 R >>\n"
+                          f"startxref\n{xref_offset}\n%%EOF\n")
+        return out
+
+
+def render_lines(lines, title=''):
+    """Yield PDF bytes for an iterable of text lines, one page at a time"""
+    pdf = PDFStream(title)
+    yield pdf.header()
+    page_number = 1
+
+    def heading():
+        return [f"{title}    page {page_number}", ''] if title else []
+
+    page = heading()
+    for line in lines:
+        for part in textwrap.wrap(line, WRAP_COLUMNS) or ['']:
+            if len(page) >= LINES_PER_PAGE:
+                yield pdf.page(page)
+                page_number += 1
+                page = heading()
+            page.append(part)
+    yield pdf.page(page)
+    yield pdf.trailer()
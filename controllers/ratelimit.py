@@ -0,0 +1,36 @@
+"""
+Token-bucket rate limiting
+
+Buckets live in a cache backend: the in-process DictBackend by default, or
+a shared backend (Redis) so limits hold across workers.
+"""
+
+from controllers.cache import DictBackend
+
+
+class RateLimiter:
+    def __init__(self, name, per_minute, burst=None, backend=None, sweep_every=1000):
+        self.name = name
+        self.rate = per_minute / 60.0
+        self.burst = burst or per_minute
+        self.backend = backend or DictBackend()
+        self.ttl = self.burst / self.rate
+        self.sweep_every = sweep_every
+        self.allowed = 0
+        self.limited = 0
+        self._calls = 0
+
+    def hit(self, key):
+        """Consume one token for key; returns (allowed, retry_after seconds)"""
+        allowed, retry_after = self.backend.token_bucket(f"rl:{self.name}:{key}", self.rate, self.burst, self.ttl)
+        if allowed:
+            self.allowed += 1
+        else:
+            self.limited += 1
+        self._calls += 1
+        if self._calls % self.sweep_every == 0 and hasattr(self.backend, 'sweep'):
+            self.backend.sweep()
+        return allowed, retry_after
+
+    def stats(self):
+        return {'allowed': self.allowed, 'limited': self.limited}
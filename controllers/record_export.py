@@ -0,0 +1,101 @@
+"""
+Streaming export of medical record history as CSV or PDF
+
+Rows are read through an unbuffered server-side cursor on a dedicated
+pooled connection and encoded in small chunks, so memory stays flat no
+matter how long the history is. With ``archived`` the export also reads
+medical_records_archive, so a full history includes records the archiver
+has moved.
+"""
+
+import csv
+import heapq
+import io
+
+import pymysql
+
+from controllers.pdf_stream import render_lines
+
+EXPORT_COLUMNS = ('record_id', 'visit_date', 'patient_id', 'patient_name', 'doctor_id', 'doctor_name',
+                  'diagnosis', 'symptoms', 'prescription', 'tests_recommended', 'notes', 'follow_up_date')
+
+EXPORT_QUERY = """
+    SELECT r.record_id, r.visit_date, r.patient_id, p.full_name AS patient_name,
+           r.doctor_id, d.full_name AS doctor_name, r.diagnosis, r.symptoms,
+           r.prescription, r.tests_recommended, r.notes, r.follow_up_date
+    FROM {table} r
+    JOIN patients p ON p.patient_id = r.patient_id
+    LEFT JOIN doctors d ON d.doctor_id = r.doctor_id
+    WHERE {where}
+"""
+EXPORT_ORDER = "ORDER BY visit_date, record_id"
+
+CHUNK_BYTES = 64 * 1024
+FORMATS = {
+    'csv': 'text/csv',
+    'pdf': 'application/pdf',
+}
+
+
+def export_query(where, archived=False):
+    tables = ('medical_records', 'medical_records_archive') if archived else ('medical_records',)
+    return ' UNION ALL '.join(EXPORT_QUERY.format(table=table, where=where) for table in tables) + EXPORT_ORDER
+
+
+def stream_rows(pool, where, params, archived=False):
+    """Yield export rows from an unbuffered cursor on a connection of its own"""
+    conn = pool.acquire()
+    cursor = conn.cursor(pymysql.cursors.SSDictCursor)
+    try:
+        cursor.execute(export_query(where, archived), tuple(params) * (2 if archived else 1))
+        for row in cursor:
+            yield row
+    finally:
+        cursor.close()
+        pool.release(conn)
+
+
+def patient_rows(pool, patient_id, archived=False):
+    return stream_rows(pool, "r.patient_id = %s", (patient_id,), archived)
+
+
+def date_range_rows(pools, start, end, archived=False):
+    """Rows from every shard's pool, merged back into visit order"""
+    streams = [stream_rows(pool, "r.visit_date BETWEEN %s AND %s", (start, end), archived) for pool in pools]
+    if len(streams) == 1:
+        return streams[0]
+    return heapq.merge(*streams, key=lambda row: (row['visit_date'], row['record_id']))
+
+
+def csv_chunks(rows):
+    """Encode rows as CSV, yielding roughly CHUNK_BYTES at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow(['' if row[column] is None else row[column] for column in EXPORT_COLUMNS])
+        if buffer.tell() >= CHUNK_BYTES:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def record_lines(rows):
+    """Plain-text lines describing each record, for the PDF export"""
+    for row in rows:
+        yield f"{row['visit_date']}  -  Dr. {row['doctor_name'] or 'Unknown'}  -  {row['patient_name']}"
+        yield f"Diagnosis: {row['diagnosis']}"
+        for label, column in (('Symptoms', 'symptoms'), ('Prescription', 'prescription'),
+                              ('Tests recommended', 'tests_recommended'), ('Notes', 'notes')):
+            if row[column]:
+                yield f"{label}: {row[column]}"
+        if row['follow_up_date']:
+            yield f"Follow-up: {row['follow_up_date']}"
+        yield ''
+
+
+def export_chunks(rows, fmt, title=''):
+    if fmt == 'pdf':
+        return render_lines(record_lines(rows), title)
+    return csv_chunks(rows)
@@ -0,0 +1,106 @@
+"""
+Full-text search over medical records
+
+Backed by the InnoDB FULLTEXT index ft_medical_records (see
+database/schema.py), an inverted index that MySQL keeps up to date on every
+insert and update, so records written by doctor_add_record and
+doctor_edit_record are searchable as soon as they commit. Queries run in
+boolean mode: every term must match, each term also matches as a prefix,
+and results are ranked by relevance and then recency.
+
+Ranking happens in a derived table over medical_records alone, ordered
+only by the MATCH score with a LIMIT of the pages asked for so far, which
+lets InnoDB keep just the top matches for a broad term instead of sorting
+every match. Joins and the recency tie-break then apply to that window
+only, so records tied on score right at its edge may swap pages. With
+shards each shard returns its own window and the rows are merged by rank;
+scores come from each shard's own index statistics, so ranking across
+shards is approximate.
+"""
+
+import re
+
+PAGE_SIZE = 20
+MAX_PAGES = 25
+MIN_TERM_LENGTH = 3  # innodb_ft_min_token_size default
+MAX_TERMS = 8
+
+SEARCH_QUERY = """
+    SELECT r.record_id, r.patient_id, p.full_name AS patient_name, r.doctor_id,
+           d.full_name AS doctor_name, r.visit_date, r.diagnosis,
+           LEFT(r.symptoms, 160) AS symptoms_preview,
+           LEFT(r.prescription, 160) AS prescription_preview,
+           ranked.score
+    FROM (
+        SELECT r.record_id,
+               MATCH (r.diagnosis, r.symptoms, r.prescription, r.tests_recommended, r.notes)
+                   AGAINST (%s IN BOOLEAN MODE) AS score
+        FROM medical_records r
+        WHERE MATCH (r.diagnosis, r.symptoms, r.prescription, r.tests_recommended, r.notes)
+              AGAINST (%s IN BOOLEAN MODE)
+          {filters}
+        ORDER BY score DESC
+        LIMIT %s
+    ) ranked
+    JOIN medical_records r ON r.record_id = ranked.record_id
+    JOIN patients p ON p.patient_id = r.patient_id
+    LEFT JOIN doctors d ON d.doctor_id = r.doctor_id
+    ORDER BY ranked.score DESC, r.visit_date DESC, r.record_id DESC
+"""
+
+TERM_PATTERN = re.compile(r"[^\W_]+(?:['-][^\W_]+)*", re.UNICODE)
+
+
+def rank_key(row):
+    """Sort key of SEARCH_QUERY's ORDER BY, for merging shards with reverse=True"""
+    return (row['score'], row['visit_date'], row['record_id'])
+
+
+def boolean_query(text):
+    """
+    Turn free text into a boolean-mode expression.
+
+    Operators typed by the user are discarded; each remaining term becomes
+    a required prefix match, e.g. 'amoxi fever' -> '+amoxi* +fever*'.
+    """
+    terms = []
+    for term in TERM_PATTERN.findall(text.lower()):
+        term = term.replace("'", '').replace('-', ' ').split()
+        for part in term:
+            if len(part) >= MIN_TERM_LENGTH and part not in terms:
+                terms.append(part)
+    return ' '.join(f'+{term}*' for term in terms[:MAX_TERMS])
+
+
+def search(conn, text, doctor_id=None, date_from=None, date_to=None, page=1):
+    """
+    Return (results, has_more) for one page of ranked matches.
+
+    ``conn`` may be a fan-out connection over every shard, merging rows by
+    rank_key in reverse.
+    """
+    expression = boolean_query(text)
+    if not expression:
+        return [], False
+
+    filters = []
+    params = [expression, expression]
+    if doctor_id:
+        filters.append("AND r.doctor_id = %s")
+        params.append(doctor_id)
+    if date_from:
+        filters.append("AND r.visit_date >= %s")
+        params.append(date_from)
+    if date_to:
+        filters.append("AND r.visit_date <= %s")
+        params.append(date_to)
+
+    page = max(1, min(int(page), MAX_PAGES))
+    offset = (page - 1) * PAGE_SIZE
+    params.append(offset + PAGE_SIZE + 1)
+
+    cursor = conn.cursor()
+    cursor.execute(SEARCH_QUERY.format(filters=' '.join(filters)), params)
+    rows = cursor.fetchall()[offset:offset + PAGE_SIZE + 1]
+    cursor.close()
+    return rows[:PAGE_SIZE], len(rows) > PAGE_SIZE
@@ -0,0 +1,187 @@
+"""
+Paginated, cached medical record timeline
+
+Timeline pages carry summary columns plus short previews of the long text
+fields, and the full notes, prescription, symptoms and tests can be fetched
+per record when it is expanded. Record templates that still render the
+full text inline can have pages carry those columns again with
+RECORD_TIMELINE_FULL_TEXT. The newest page of each patient is cached and
+dropped by the record_saved hook; with a shared cache backend the drop
+reaches every worker.
+
+With archival on, the newest page reads only the hot table; an older page
+that runs past a patient's last hot record continues into
+medical_records_archive with the same cursor.
+"""
+
+import base64
+import json
+from datetime import date
+
+from controllers.cache import ReadThroughCache
+from controllers.events import record_saved
+
+PAGE_SIZE = 20
+PREVIEW_CHARS = 120
+
+SUMMARY_QUERY = """
+    SELECT r.record_id, r.patient_id, r.doctor_id, r.visit_date, r.diagnosis,
+           r.follow_up_date, d.full_name AS doctor_name,
+           LEFT(r.symptoms, {preview}) AS symptoms_preview,
+           LEFT(r.prescription, {preview}) AS prescription_preview,
+           (r.notes IS NOT NULL AND r.notes != '') AS has_notes,
+           (r.tests_recommended IS NOT NULL AND r.tests_recommended != '') AS has_tests{full}
+    FROM {table} r
+    LEFT JOIN doctors d ON d.doctor_id = r.doctor_id
+    WHERE r.patient_id = %s {older}
+    ORDER BY r.visit_date DESC, r.record_id DESC
+    LIMIT %s
+"""
+
+FULL_TEXT_COLUMNS = ", r.symptoms, r.prescription, r.tests_recommended, r.notes"
+
+OLDER_CLAUSE = "AND (r.visit_date < %s OR (r.visit_date = %s AND r.record_id < %s))"
+
+DETAIL_QUERY = """
+    SELECT record_id, patient_id, doctor_id, symptoms, prescription,
+           tests_recommended, notes
+    FROM {table}
+    WHERE record_id = %s
+"""
+
+ARCHIVE_TABLE = 'medical_records_archive'
+
+ARCHIVE_PROBE = "SELECT 1 AS archived FROM medical_records_archive WHERE patient_id = %s LIMIT 1"
+
+
+def encode_cursor(row):
+    raw = json.dumps([row['visit_date'].isoformat(), row['record_id']]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        visit_date, record_id = json.loads(base64.urlsafe_b64decode(padded))
+        return date.fromisoformat(visit_date), int(record_id)
+    except (ValueError, TypeError):
+        return None
+
+
+# Continues a timeline whose hot records ran out into the whole archive
+ARCHIVE_CURSOR = encode_cursor({'visit_date': date.max, 'record_id': 0})
+
+
+class RecordTimeline:
+    def __init__(self, mysql, ttl=300, max_patients=1024, page_size=PAGE_SIZE, archived=False,
+                 full_text=False, backend=None):
+        self.mysql = mysql
+        self.page_size = page_size
+        self.archived = archived
+        self.full_text = full_text
+        self.cache = ReadThroughCache('record-timeline', ttl=ttl, max_entries=max_patients, backend=backend)
+
+    def _query(self, patient_id, before=None, table='medical_records', limit=None):
+        params = [patient_id]
+        older = ''
+        if before:
+            older = OLDER_CLAUSE
+            params.extend([before[0], before[0], before[1]])
+        params.append(limit or self.page_size + 1)
+        full = FULL_TEXT_COLUMNS if self.full_text else ''
+        return SUMMARY_QUERY.format(preview=PREVIEW_CHARS, older=older, table=table, full=full), params
+
+    def _archive_query(self, patient_id, before, rows):
+        """Query for the rest of a page from the archive, or None when the hot rows fill it"""
+        if not self.archived or not before or len(rows) > self.page_size:
+            return None
+        if rows:
+            before = (rows[-1]['visit_date'], rows[-1]['record_id'])
+        return self._query(patient_id, before, ARCHIVE_TABLE, self.page_size + 1 - len(rows))
+
+    def _probes_archive(self, rows, before):
+        """Whether the newest page ran out of hot rows and should check the archive for more"""
+        return self.archived and not before and len(rows) <= self.page_size
+
+    def _fetch(self, patient_id, before=None):
+        # The newest page is cached, so it is always loaded from the primary
+        conn = self.mysql.patient_connection(patient_id, primary=not before)
+        cursor = conn.cursor()
+        cursor.execute(*self._query(patient_id, before))
+        rows = list(cursor.fetchall())
+        archive_query = self._archive_query(patient_id, before, rows)
+        if archive_query:
+            cursor.execute(*archive_query)
+            rows.extend(cursor.fetchall())
+        archive_rows = False
+        if self._probes_archive(rows, before):
+            cursor.execute(ARCHIVE_PROBE, (patient_id,))
+            archive_rows = cursor.fetchone() is not None
+        cursor.close()
+        return self._paginate(rows, before, archive_rows)
+
+    def _paginate(self, rows, before=None, archive_rows=False):
+        next_cursor = None
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            next_cursor = encode_cursor(rows[-1])
+        elif archive_rows:
+            # Hot history ends here; older pages go on into the archive
+            next_cursor = encode_cursor(rows[-1]) if rows else ARCHIVE_CURSOR
+        return {'records': rows, 'next_cursor': next_cursor}
+
+    def page(self, patient_id, before=None):
+        """One timeline page; the newest page is served from cache"""
+        before = decode_cursor(before) if isinstance(before, str) else before
+        if before:
+            return self._fetch(patient_id, before)
+        return self.cache.get(int(patient_id), lambda: self._fetch(patient_id))
+
+    async def page_async(self, db, patient_id, before=None):
+        """page() awaiting its query on an AsyncPool"""
+        before = decode_cursor(before) if isinstance(before, str) else before
+
+        async def fetch():
+            rows = list(await db.fetchall(*self._query(patient_id, before)))
+            archive_query = self._archive_query(patient_id, before, rows)
+            if archive_query:
+                rows.extend(await db.fetchall(*archive_query))
+            archive_rows = False
+            if self._probes_archive(rows, before):
+                archive_rows = await db.fetchone(ARCHIVE_PROBE, (patient_id,)) is not None
+            return self._paginate(rows, before, archive_rows)
+
+        if before:
+            return await fetch()
+        return await self.cache.get_async(int(patient_id), fetch)
+
+    def _tables(self):
+        return ('medical_records', ARCHIVE_TABLE) if self.archived else ('medical_records',)
+
+    async def details_async(self, db, record_id):
+        for table in self._tables():
+            row = await db.fetchone(DETAIL_QUERY.format(table=table), (record_id,))
+            if row:
+                return row
+        return None
+
+    def details(self, record_id):
+        """Full text columns for one record, or None"""
+        cursor = self.mysql.everywhere().cursor()
+        row = None
+        for table in self._tables():
+            cursor.execute(DETAIL_QUERY.format(table=table), (record_id,))
+            row = cursor.fetchone()
+            if row:
+                break
+        cursor.close()
+        return row
+
+    def on_record_saved(self, patient_id, **_):
+        self.cache.invalidate(int(patient_id))
+
+    def connect(self):
+        record_saved.connect(self.on_record_saved)
+        return self
@@ -0,0 +1,114 @@
+"""
+Password reset token coalescing and expiry sweeping
+
+Repeated reset requests for the same account reuse the outstanding token
+instead of writing a new one, and expired tokens are deleted in bounded
+batches by a background thread rather than left in the table. A remembered
+token is only reused after checking it is still in the table, since it may
+have been used or replaced through another worker.
+"""
+
+import json
+import re
+import threading
+import time
+
+from controllers.cache import DictBackend
+
+IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]{0,63}$')
+
+
+class ResetTokenCoalescer:
+    """Remembers the outstanding token per (user_type, email)"""
+
+    def __init__(self, ttl=3600, backend=None):
+        self.ttl = ttl
+        self.backend = backend or DictBackend()
+        self.coalesced = 0
+        self.stale = 0
+
+    def _key(self, user_type, email):
+        return f"reset:{user_type}:{email}"
+
+    def outstanding(self, user_type, email, still_valid=None):
+        """
+        Return {'token', 'full_name'} for a live token, or None.
+
+        ``still_valid(token)`` is asked before a remembered token is reused;
+        a token it rejects is forgotten so the caller issues a new one.
+        """
+        raw = self.backend.get(self._key(user_type, email))
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        if still_valid is not None and not still_valid(data['token']):
+            self.forget(user_type, email)
+            self.stale += 1
+            return None
+        self.coalesced += 1
+        return data
+
+    def remember(self, user_type, email, token, full_name):
+        # Expire slightly before the token itself so a reused link is always valid
+        self.backend.set(self._key(user_type, email),
+                         json.dumps({'token': token, 'full_name': full_name}),
+                         max(1, self.ttl - 60))
+
+    def forget(self, user_type, email):
+        self.backend.delete(self._key(user_type, email))
+
+
+class ExpiredTokenSweeper:
+    def __init__(self, mysql, table='password_resets', expires_column='expires_at',
+                 interval=300, batch_size=1000):
+        # Both names are interpolated into SQL, so only plain identifiers are accepted
+        for name in (table, expires_column):
+            if not IDENTIFIER.match(name or ''):
+                raise ValueError(f"Invalid SQL identifier for the reset token sweeper: {name!r}")
+        self.mysql = mysql
+        self.table = table
+        self.expires_column = expires_column
+        self.interval = interval
+        self.batch_size = batch_size
+        self.deleted = 0
+        self.runs = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the sweeper thread once; safe to call on every request"""
+        if self._thread is not None or not self.interval:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='reset-token-sweeper', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Reset token sweep error: {e}")
+            time.sleep(self.interval)
+
+    def sweep(self):
+        """Delete expired tokens in batches; returns how many were removed"""
+        sql = f"DELETE FROM `{self.table}` WHERE `{self.expires_column}` < NOW() LIMIT %s"
+        removed = 0
+        conn = self.mysql.pool.acquire()
+        try:
+            cursor = conn.cursor()
+            while True:
+                cursor.execute(sql, (self.batch_size,))
+                conn.commit()
+                removed += cursor.rowcount
+                if cursor.rowcount < self.batch_size:
+                    break
+            cursor.close()
+        finally:
+            self.mysql.pool.release(conn)
+        self.deleted += removed
+        self.runs += 1
+        return removed
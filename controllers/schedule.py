@@ -0,0 +1,205 @@
+"""
+Per-doctor day schedule index
+
+Each cached doctor/day keeps its appointments sorted by time together with
+one bitmap per status (bit i set when slot i has that status). A day is
+loaded from MySQL once, then patched in place from the appointment hooks,
+so filtered lookups are O(slots-per-day) and repeat views of a day never
+touch the database. Days older than the appointment archive cutoff also
+read appointments_archive.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+
+from controllers.events import appointment_created, appointment_status_changed
+
+STATUSES = ('Scheduled', 'Completed', 'Cancelled')
+
+DAY_QUERY = """
+    SELECT a.*, p.full_name AS patient_name, p.phone AS patient_phone,
+           p.age AS patient_age, p.gender AS patient_gender
+    FROM appointments a
+    JOIN patients p ON p.patient_id = a.patient_id
+    WHERE a.doctor_id = %s AND a.appointment_date = %s
+    ORDER BY a.appointment_time
+"""
+
+DOCTOR_QUERY = """
+    SELECT a.*, p.full_name AS patient_name, p.phone AS patient_phone,
+           p.age AS patient_age, p.gender AS patient_gender
+    FROM appointments a
+    JOIN patients p ON p.patient_id = a.patient_id
+    WHERE a.doctor_id = %s {filters}
+    ORDER BY a.appointment_date DESC, a.appointment_time DESC
+"""
+
+ARCHIVE_DAY_QUERY = DAY_QUERY.replace('FROM appointments a', 'FROM appointments_archive a')
+
+ONE_QUERY = """
+    SELECT a.*, p.full_name AS patient_name, p.phone AS patient_phone,
+           p.age AS patient_age, p.gender AS patient_gender
+    FROM appointments a
+    JOIN patients p ON p.patient_id = a.patient_id
+    WHERE a.appointment_id = %s
+"""
+
+
+def day_key(value):
+    """Normalize a date, datetime or 'YYYY-MM-DD' string to an ISO string"""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return datetime.strptime(str(value), '%Y-%m-%d').date().isoformat()
+
+
+class DaySchedule:
+    def __init__(self, rows):
+        self.rows = sorted(rows, key=lambda row: row['appointment_time'])
+        self.loaded_at = time.monotonic()
+        self._reindex()
+
+    def _reindex(self):
+        self.bitmaps = dict.fromkeys(STATUSES, 0)
+        for i, row in enumerate(self.rows):
+            self.bitmaps[row['status']] = self.bitmaps.get(row['status'], 0) | (1 << i)
+
+    def add(self, row):
+        if any(r['appointment_id'] == row['appointment_id'] for r in self.rows):
+            return
+        self.rows.append(row)
+        self.rows.sort(key=lambda r: r['appointment_time'])
+        self._reindex()
+
+    def set_status(self, appointment_id, status):
+        for i, row in enumerate(self.rows):
+            if row['appointment_id'] == appointment_id:
+                bit = 1 << i
+                self.bitmaps[row['status']] &= ~bit
+                self.bitmaps[status] = self.bitmaps.get(status, 0) | bit
+                self.rows[i] = dict(row, status=status)
+                return True
+        return False
+
+    def select(self, status=None):
+        if not status:
+            return list(self.rows)
+        mask = self.bitmaps.get(status, 0)
+        selected = []
+        i = 0
+        while mask:
+            if mask & 1:
+                selected.append(self.rows[i])
+            mask >>= 1
+            i += 1
+        return selected
+
+    def counts(self):
+        return {status: bin(mask).count('1') for status, mask in self.bitmaps.items()}
+
+
+class ScheduleIndex:
+    def __init__(self, mysql, ttl=60, max_days=2048, archived_before=None):
+        self.mysql = mysql
+        self.archived_before = archived_before
+        self.ttl = ttl
+        self.max_days = max_days
+        self.hits = 0
+        self.misses = 0
+        self._days = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, key):
+        """Return a fresh DaySchedule for key or None. Caller must hold the lock."""
+        day = self._days.get(key)
+        if day is None:
+            return None
+        if self.ttl and time.monotonic() - day.loaded_at > self.ttl:
+            del self._days[key]
+            return None
+        self._days.move_to_end(key)
+        return day
+
+    def day(self, doctor_id, appointment_date):
+        key = (int(doctor_id), day_key(appointment_date))
+        with self._lock:
+            day = self._cached(key)
+            if day is not None:
+                self.hits += 1
+                return day
+            self.misses += 1
+
+        if self.mysql.shards.sharded:
+            conn = self.mysql.everywhere(key=lambda row: row['appointment_time'])
+        else:
+            conn = self.mysql.primary_connection
+        cursor = conn.cursor()
+        cursor.execute(DAY_QUERY, key)
+        rows = list(cursor.fetchall())
+        if self.archived_before and key[1] < self.archived_before().isoformat():
+            cursor.execute(ARCHIVE_DAY_QUERY, key)
+            rows.extend(cursor.fetchall())
+        day = DaySchedule(rows)
+        cursor.close()
+
+        with self._lock:
+            self._days[key] = day
+            self._days.move_to_end(key)
+            while len(self._days) > self.max_days:
+                self._days.popitem(last=False)
+        return day
+
+    def all_days(self, doctor_id, appointment_date=None, status=None):
+        """A doctor's appointments on every shard, newest first; not cached"""
+        filters, params = '', [doctor_id]
+        if appointment_date:
+            filters += ' AND a.appointment_date = %s'
+            params.append(appointment_date)
+        if status:
+            filters += ' AND a.status = %s'
+            params.append(status)
+        conn = self.mysql.everywhere(key=lambda row: (row['appointment_date'], row['appointment_time']),
+                                     reverse=True)
+        cursor = conn.cursor()
+        cursor.execute(DOCTOR_QUERY.format(filters=filters), params)
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+
+    def lookup(self, doctor_id, appointment_date, status=None):
+        """Appointments for one doctor/day, optionally filtered by status"""
+        return self.day(doctor_id, appointment_date).select(status)
+
+    def on_created(self, appointment_id, doctor_id, appointment_date, **_):
+        key = (int(doctor_id), day_key(appointment_date))
+        with self._lock:
+            if self._cached(key) is None:
+                return
+        cursor = self.mysql.connection.cursor()
+        cursor.execute(ONE_QUERY, (appointment_id,))
+        row = cursor.fetchone()
+        cursor.close()
+        if row:
+            with self._lock:
+                day = self._cached(key)
+                if day is not None:
+                    day.add(row)
+
+    def on_status_changed(self, appointment, status, **_):
+        key = (int(appointment['doctor_id']), day_key(appointment['appointment_date']))
+        with self._lock:
+            day = self._cached(key)
+            if day is not None and not day.set_status(appointment['appointment_id'], status):
+                del self._days[key]
+
+    def connect(self):
+        appointment_created.connect(self.on_created)
+        appointment_status_changed.connect(self.on_status_changed)
+        return self
+
+    def stats(self):
+        with self._lock:
+            return {'days': len(self._days), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,239 @@
+"""
+Server-side session store
+
+The session cookie carries only an opaque random id; session data lives in
+an in-memory LRU tier and, optionally, a shared tier (Redis, or the
+DictBackend stand-in) so several workers see the same sessions. Sessions
+expire after PERMANENT_SESSION_LIFETIME, expired entries are removed by a
+background sweeper, and all sessions of one user can be revoked at once.
+"""
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+serializer = TaggedJSONSerializer()
+
+
+def user_key(data):
+    """'<user_type>:<user_id>' for a logged-in session, else None"""
+    if data.get('user_type') and data.get('user_id') is not None:
+        return f"{data['user_type']}:{data['user_id']}"
+    return None
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.loaded_user = user_key(self)
+
+
+class SessionStore:
+    def __init__(self, lifetime=3600, max_entries=10000, memory_ttl=None, backend=None,
+                 sweep_interval=60):
+        self.lifetime = lifetime
+        self.max_entries = max_entries
+        self.memory_ttl = memory_ttl
+        self.backend = backend
+        self.sweep_interval = sweep_interval
+        self.hits = 0
+        self.misses = 0
+        self.swept = 0
+        self.revoked = 0
+        self._entries = OrderedDict()
+        self._users = {}
+        self._lock = threading.Lock()
+        self._sweeper = None
+
+    def _start_sweeper(self):
+        if self._sweeper is not None or not self.sweep_interval:
+            return
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._sweep_forever, name='session-sweeper', daemon=True)
+            self._sweeper.start()
+
+    def _sweep_forever(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Session sweep error: {e}")
+
+    def _forget(self, sid):
+        """Drop sid from the memory tier. Caller must hold the lock."""
+        item = self._entries.pop(sid, None)
+        if item is not None and item[2]:
+            sids = self._users.get(item[2])
+            if sids is not None:
+                sids.discard(sid)
+                if not sids:
+                    del self._users[item[2]]
+
+    def _remember(self, sid, data, expires, owner):
+        """Insert into the memory tier. Caller must hold the lock."""
+        self._forget(sid)
+        self._entries[sid] = (data, expires, owner)
+        if owner:
+            self._users.setdefault(owner, set()).add(sid)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._forget(oldest)
+
+    def load(self, sid):
+        now = time.time()
+        with self._lock:
+            item = self._entries.get(sid)
+            if item is not None:
+                data, expires, _ = item
+                if expires > now:
+                    self._entries.move_to_end(sid)
+                    self.hits += 1
+                    return dict(data)
+                self._forget(sid)
+            self.misses += 1
+
+        if self.backend is None:
+            return None
+        raw = self.backend.get(f"session:{sid}")
+        if raw is None:
+            return None
+        data = serializer.loads(raw)
+        expires = now + self._memory_lifetime()
+        with self._lock:
+            self._remember(sid, data, expires, user_key(data))
+        return dict(data)
+
+    def save(self, sid, data):
+        owner = user_key(data)
+        with self._lock:
+            self._remember(sid, dict(data), time.time() + self._memory_lifetime(), owner)
+        if self.backend is not None:
+            self.backend.set(f"session:{sid}", serializer.dumps(data), self.lifetime)
+            if owner:
+                self._add_shared_owner(owner, sid)
+        self._start_sweeper()
+
+    def needs_refresh(self, sid):
+        """True once a session is past half its lifetime in the memory tier"""
+        with self._lock:
+            item = self._entries.get(sid)
+        if item is None:
+            return True
+        return item[1] - time.time() < self._memory_lifetime() / 2
+
+    def _memory_lifetime(self):
+        if self.backend is not None and self.memory_ttl:
+            return min(self.memory_ttl, self.lifetime)
+        return self.lifetime
+
+    def _add_shared_owner(self, owner, sid):
+        key = f"session-user:{owner}"
+        raw = self.backend.get(key)
+        sids = set(serializer.loads(raw)) if raw else set()
+        sids.add(sid)
+        self.backend.set(key, serializer.dumps(sorted(sids)), self.lifetime)
+
+    def delete(self, sid):
+        with self._lock:
+            self._forget(sid)
+        if self.backend is not None:
+            self.backend.delete(f"session:{sid}")
+
+    def revoke_user(self, user_type, user_id):
+        """Delete every session belonging to one user; returns the count"""
+        owner = f"{user_type}:{user_id}"
+        with self._lock:
+            sids = set(self._users.get(owner, ()))
+            for sid in sids:
+                self._forget(sid)
+        if self.backend is not None:
+            key = f"session-user:{owner}"
+            raw = self.backend.get(key)
+            if raw:
+                sids.update(serializer.loads(raw))
+            for sid in sids:
+                self.backend.delete(f"session:{sid}")
+            self.backend.delete(key)
+        with self._lock:
+            self.revoked += len(sids)
+        return len(sids)
+
+    def sweep(self):
+        """Remove expired sessions from the memory tier"""
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, (_, expires, _) in self._entries.items() if expires <= now]
+            for sid in expired:
+                self._forget(sid)
+            self.swept += len(expired)
+        return len(expired)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'users': len(self._users),
+                'hits': self.hits,
+                'misses': self.misses,
+                'swept': self.swept,
+                'revoked': self.revoked,
+            }
+
+
+class ServerSessionInterface(SessionInterface):
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            data = self.store.load(sid)
+            if data is not None:
+                return ServerSession(data, sid=sid)
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if not session.modified and not session.new:
+            # Sliding expiry for permanent sessions, renewed at half-life
+            if not (session.permanent and self.store.needs_refresh(session.sid)):
+                return
+
+        # A login or logout switches user: issue a fresh id against fixation
+        if not session.new and user_key(session) != session.loaded_user:
+            self.store.delete(session.sid)
+            session.sid = secrets.token_urlsafe(32)
+
+        self.store.save(session.sid, dict(session))
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
@@ -0,0 +1,86 @@
+"""
+Application startup helpers
+
+Model modules are bound to LazyModel proxies and imported on first use,
+so a worker (or a CLI script that only needs ``mysql``) does not pay for
+modules it never touches. The connection pool and the compiled-template
+cache are warmed in parallel before the first request, and every phase
+is timed so the startup breakdown can be printed and exported as gauges.
+"""
+
+import importlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class LazyModel:
+    """Stand-in for a model class that imports its module on first attribute access"""
+
+    def __init__(self, module, name):
+        self._module = module
+        self._name = name
+        self._target = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._target is None:
+            with self._lock:
+                if self._target is None:
+                    self._target = getattr(importlib.import_module(self._module), self._name)
+        return self._target
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __call__(self, *args, **kwargs):
+        return self._load()(*args, **kwargs)
+
+    def __repr__(self):
+        state = 'loaded' if self._target is not None else 'not loaded'
+        return f"<LazyModel {self._module}.{self._name} ({state})>"
+
+
+class StartupTimer:
+    """Records how long each startup phase took, in milliseconds"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases = {}
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases[phase] = (now - self._last) * 1000
+        self._last = now
+
+    def stats(self):
+        return dict(self.phases, total=(self._last - self.started) * 1000)
+
+    def report(self):
+        return 'Startup: ' + ', '.join(f"{phase} {ms:.0f}ms" for phase, ms in self.stats().items())
+
+
+def warm_templates(app):
+    """Compile every template into the Jinja cache; returns how many"""
+    env = app.jinja_env
+    names = env.list_templates() if env.loader is not None else []
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+
+def prewarm(app, mysql, timer):
+    """Warm the connection pool and template cache in parallel"""
+    def timed(name, fn, *args):
+        started = time.perf_counter()
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"Startup {name} warm-up error: {e}")
+        timer.phases[f"{name}_warm"] = (time.perf_counter() - started) * 1000
+
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix='startup') as executor:
+        executor.submit(timed, 'pool', mysql.pool.warm)
+        executor.submit(timed, 'templates', warm_templates, app)
+    timer.mark('prewarm')
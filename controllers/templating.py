@@ -0,0 +1,104 @@
+"""
+Template bytecode cache and fragment caching
+
+Compiled templates are written to a persistent on-disk bytecode cache, so
+a fresh worker loads them instead of re-parsing every template. Run
+
+    python -m controllers.templating
+
+at deploy time to precompile the whole template folder into it.
+
+Templates can cache the expensive static parts of a page:
+
+    {% cache 'patient-list', fragment_version('records', patient.patient_id) %}
+        ...
+    {% endcache %}
+
+The fragment key is the tag's arguments plus the viewer, so one user's
+fragment is never served to another. The tag needs a name and at least one
+version argument, usually a fragment_version() stamp (the same stamps that
+drive the page ETags), so a fragment is re-rendered after the data behind
+it changes; a tag without one fails when the template is compiled. With
+CACHE_SHARED_URL set, fragments are shared by every worker and a stamp
+bump reaches them all.
+"""
+
+import hashlib
+import os
+
+from flask import has_request_context, session
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+from controllers.cache import ReadThroughCache
+from controllers.sessions import user_key
+from controllers.startup import warm_templates
+
+
+class FragmentCacheExtension(Extension):
+    """{% cache name, version, ... %}body{% endcache %}"""
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        if len(parts) < 2:
+            parser.fail("{% cache %} needs a version after the name, e.g. "
+                        "fragment_version('records', patient_id), so the fragment is re-rendered "
+                        "when its data changes", lineno)
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_render_cached', [nodes.List(parts)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render_cached(self, parts, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        viewer = user_key(session) if has_request_context() else None
+        key = hashlib.sha1('\0'.join(map(str, [viewer] + parts)).encode('utf-8')).hexdigest()
+        return cache.get(key, caller)
+
+
+def bytecode_dir(app):
+    return app.config.get('TEMPLATE_BYTECODE_DIR') or os.path.join(app.instance_path, 'jinja_bytecode')
+
+
+def init_app(app, stamps=None, backend=None):
+    """Install the bytecode cache, the {% cache %} tag and fragment_version(); returns the fragment cache"""
+    directory = bytecode_dir(app)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+    except OSError as e:
+        print(f"Template bytecode cache disabled: {e}")
+
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    fragment_cache = ReadThroughCache(
+        'fragments',
+        ttl=app.config.get('FRAGMENT_CACHE_TTL', 300),
+        max_entries=app.config.get('FRAGMENT_CACHE_MAX_ENTRIES', 1024),
+        backend=backend
+    )
+    app.jinja_env.fragment_cache = fragment_cache
+
+    if stamps is not None:
+        app.jinja_env.globals['fragment_version'] = lambda kind, resource_id: stamps.get([(kind, resource_id)])[0]
+    return fragment_cache
+
+
+def main():
+    from app import app
+    count = warm_templates(app)
+    print(f"Precompiled {count} template(s) into {bytecode_dir(app)}")
+
+
+if __name__ == '__main__':
+    main()
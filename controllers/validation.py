@@ -0,0 +1,47 @@
+"""
+Input validation shared by the registration form and the bulk importer
+"""
+
+PATIENT_REQUIRED = ('full_name', 'age', 'gender', 'phone', 'email', 'password')
+PATIENT_OPTIONAL = ('address', 'blood_group', 'emergency_contact')
+MIN_PASSWORD_LENGTH = 6
+MIN_AGE = 1
+MAX_AGE = 150
+
+
+def validate_patient(data, confirm_password=None):
+    """
+    Clean raw patient fields and check them against the registration rules.
+
+    Returns (patient, error). ``patient`` holds stripped values, a
+    lower-cased email, an int age and None for empty optional fields;
+    ``error`` is the first failing rule's message or None. The password
+    confirmation is only checked when ``confirm_password`` is given.
+    Email uniqueness needs the database and is left to the caller.
+    """
+    patient = {}
+    for field in PATIENT_REQUIRED + PATIENT_OPTIONAL:
+        value = data.get(field)
+        value = '' if value is None else str(value)
+        patient[field] = value if field == 'password' else value.strip()
+    patient['email'] = patient['email'].lower()
+
+    if not all(patient[field] for field in PATIENT_REQUIRED):
+        return patient, 'Please fill all required fields'
+
+    if confirm_password is not None and patient['password'] != confirm_password:
+        return patient, 'Passwords do not match'
+
+    if len(patient['password']) < MIN_PASSWORD_LENGTH:
+        return patient, f'Password must be at least {MIN_PASSWORD_LENGTH} characters long'
+
+    try:
+        patient['age'] = int(patient['age'])
+    except ValueError:
+        return patient, 'Please enter a valid age'
+    if patient['age'] < MIN_AGE or patient['age'] > MAX_AGE:
+        return patient, 'Please enter a valid age'
+
+    for field in PATIENT_OPTIONAL:
+        patient[field] = patient[field] or None
+    return patient, None
@@ -0,0 +1,3 @@
+"""
+Medilink database access helpers
+"""
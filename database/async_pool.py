@@ -0,0 +1,94 @@
+"""
+Async MySQL pool for the ASGI serving mode
+
+Wraps an aiomysql pool built from the same connect args as the sync
+``ConnectionPool``, so coroutine views (controllers/async_views.py) can
+await their queries while the event loop serves other requests. aiomysql
+raises the pymysql exception classes, so error handling (e.g. 1062 for a
+taken slot) is the same as on the sync path.
+"""
+
+import asyncio
+import time
+
+try:
+    import aiomysql
+except ImportError:
+    aiomysql = None
+
+
+class AsyncPool:
+    def __init__(self, connect_args, min_size=1, max_size=50):
+        self.connect_args = dict(connect_args)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.queries = 0
+        self.wait_time = 0.0
+        self._pool = None
+        self._opening = None
+
+    async def open(self):
+        """Create the pool once; called from ASGI lifespan startup and on first use"""
+        if self._pool is not None:
+            return self._pool
+        if aiomysql is None:
+            raise RuntimeError("The async serving mode needs aiomysql (pip install aiomysql)")
+        if self._opening is None:
+            self._opening = asyncio.Lock()
+        async with self._opening:
+            if self._pool is None:
+                args = {key: value for key, value in self.connect_args.items() if key != 'cursorclass'}
+                if 'database' in args:
+                    args['db'] = args.pop('database')
+                self._pool = await aiomysql.create_pool(
+                    minsize=self.min_size, maxsize=self.max_size,
+                    cursorclass=aiomysql.DictCursor, autocommit=False, **args
+                )
+        return self._pool
+
+    async def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+
+    async def _run(self, sql, params, fetch):
+        pool = self._pool or await self.open()
+        started = time.perf_counter()
+        async with pool.acquire() as conn:
+            self.wait_time += time.perf_counter() - started
+            self.queries += 1
+            async with conn.cursor() as cursor:
+                try:
+                    await cursor.execute(sql, params)
+                    if fetch == 'all':
+                        result = await cursor.fetchall()
+                    elif fetch == 'one':
+                        result = await cursor.fetchone()
+                    else:
+                        result = cursor.lastrowid
+                    await conn.commit()
+                except Exception:
+                    await conn.rollback()
+                    raise
+        return result
+
+    async def fetchall(self, sql, params=None):
+        return await self._run(sql, params, 'all')
+
+    async def fetchone(self, sql, params=None):
+        return await self._run(sql, params, 'one')
+
+    async def execute(self, sql, params=None):
+        """Run one write in its own transaction; returns the last insert id"""
+        return await self._run(sql, params, None)
+
+    def stats(self):
+        pool = self._pool
+        return {
+            'size': pool.size if pool else 0,
+            'idle': pool.freesize if pool else 0,
+            'max_size': self.max_size,
+            'queries': self.queries,
+            'wait_seconds': round(self.wait_time, 3),
+        }
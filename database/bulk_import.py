@@ -0,0 +1,451 @@
+"""
+Bulk import of patients, doctors and historical medical records
+
+Streams a CSV, JSON array or JSON Lines file through a generator pipeline
+(read -> validate -> chunk -> check -> hash -> insert). Passwords are
+hashed in worker processes and each chunk goes in as one multi-row INSERT
+inside its own transaction. A checkpoint file is written after every
+committed chunk so an interrupted import can continue with --resume.
+
+Writes go through the shard router: with MYSQL_SHARDS set, patients get
+ids from the catalog and land on their bucket's shard, records follow
+their patient, and doctors are written to the catalog and copied to every
+shard for its joins. Rows that break a unique key are rejected one by one
+rather than failing the import.
+
+    python -m database.bulk_import patients patients.csv --workers 4
+    python -m database.bulk_import records history.jsonl --resume
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import pymysql
+
+from controllers.passwords import DEFAULT_METHOD, _hash
+from controllers.validation import validate_patient
+from database.sharding import SHARDED_TABLES
+
+CHUNK_SIZE = 2000
+
+PATIENT_COLUMNS = ('full_name', 'age', 'gender', 'phone', 'email', 'password',
+                   'address', 'blood_group', 'emergency_contact')
+DOCTOR_COLUMNS = ('doctor_code', 'full_name', 'specialization', 'email', 'phone', 'password')
+RECORD_COLUMNS = ('patient_id', 'doctor_id', 'visit_date', 'diagnosis', 'symptoms',
+                  'prescription', 'tests_recommended', 'notes', 'follow_up_date')
+
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            yield row
+
+
+def read_json_lines(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def read_json_array(path, block_size=1 << 16):
+    """Yield the objects of a top-level JSON array without loading the file"""
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as f:
+        buffer = ''
+        started = False
+        eof = False
+        while True:
+            buffer = buffer.lstrip()
+            if not started:
+                if not buffer and not eof:
+                    chunk = f.read(block_size)
+                    eof = not chunk
+                    buffer += chunk
+                    continue
+                if not buffer.startswith('['):
+                    raise ValueError("JSON import file must contain an array of objects")
+                buffer = buffer[1:]
+                started = True
+                continue
+            if buffer.startswith(','):
+                buffer = buffer[1:]
+                continue
+            if buffer.startswith(']'):
+                return
+            try:
+                obj, end = decoder.raw_decode(buffer)
+            except ValueError:
+                if eof:
+                    raise
+                chunk = f.read(block_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+            yield obj
+            buffer = buffer[end:]
+
+
+def read_rows(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        return read_csv(path)
+    if ext in ('.jsonl', '.ndjson'):
+        return read_json_lines(path)
+    if ext == '.json':
+        return read_json_array(path)
+    raise ValueError(f"Unsupported import file type: {ext}")
+
+
+def validate_doctor(data):
+    doctor = {field: str(data.get(field) or '').strip() for field in DOCTOR_COLUMNS}
+    doctor['password'] = str(data.get('password') or '')
+    doctor['email'] = doctor['email'].lower() or None
+    doctor['phone'] = doctor['phone'] or None
+    if not all(doctor[field] for field in ('doctor_code', 'full_name', 'specialization', 'password')):
+        return doctor, 'Please fill all required fields'
+    if len(doctor['password']) < 6:
+        return doctor, 'Password must be at least 6 characters long'
+    return doctor, None
+
+
+def validate_record(data):
+    record = {field: (str(data.get(field)).strip() if data.get(field) not in (None, '') else None)
+              for field in RECORD_COLUMNS}
+    if not all(record[field] for field in ('patient_id', 'doctor_id', 'visit_date', 'diagnosis')):
+        return record, 'Please fill all required fields'
+    try:
+        record['patient_id'] = int(record['patient_id'])
+        record['doctor_id'] = int(record['doctor_id'])
+        record['visit_date'] = date.fromisoformat(record['visit_date'])
+        if record['follow_up_date']:
+            record['follow_up_date'] = date.fromisoformat(record['follow_up_date'])
+    except ValueError as e:
+        return record, f'Invalid value: {e}'
+    return record, None
+
+
+class Importer:
+    ENTITIES = {
+        'patients': {
+            'table': 'patients',
+            'columns': PATIENT_COLUMNS,
+            'validate': validate_patient,
+            'unique': ('email',),
+            'sharded': True,
+            'hash_password': True,
+        },
+        'doctors': {
+            'table': 'doctors',
+            'columns': DOCTOR_COLUMNS,
+            'validate': validate_doctor,
+            'unique': ('doctor_code', 'email'),
+            'sharded': False,
+            'hash_password': True,
+        },
+        'records': {
+            'table': 'medical_records',
+            'columns': RECORD_COLUMNS,
+            'validate': validate_record,
+            'unique': (),
+            'sharded': True,
+            'references': {'patient_id': ('patients', 'patient_id'), 'doctor_id': ('doctors', 'doctor_id')},
+            'hash_password': False,
+        },
+    }
+
+    def __init__(self, router, entity, path, chunk_size=CHUNK_SIZE, workers=None,
+                 method=DEFAULT_METHOD, resume=False):
+        self.router = router
+        self.entity = entity
+        self.spec = self.ENTITIES[entity]
+        self.path = path
+        self.chunk_size = chunk_size
+        self.workers = workers or os.cpu_count() or 1
+        self.method = method
+        self.checkpoint_path = f"{path}.{entity}.checkpoint"
+        self.rejects_path = f"{path}.{entity}.rejects.jsonl"
+        self.stats = {'read': 0, 'inserted': 0, 'rejected': 0, 'skipped': 0}
+        self.timings = {'validate': 0.0, 'check': 0.0, 'hash': 0.0, 'insert': 0.0}
+        self.resume_from = self._load_checkpoint() if resume else 0
+        self._conns = {}
+
+    def _connection(self, pool):
+        """One connection per pool (catalog or shard), held for the whole import"""
+        if id(pool) not in self._conns:
+            self._conns[id(pool)] = (pool, pool.acquire())
+        return self._conns[id(pool)][1]
+
+    def _release(self):
+        for pool, conn in self._conns.values():
+            pool.release(conn)
+        self._conns = {}
+
+    def _load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return 0
+        with open(self.checkpoint_path) as f:
+            state = json.load(f)
+        self.stats['inserted'] = state.get('inserted', 0)
+        self.stats['rejected'] = state.get('rejected', 0)
+        return state.get('rows_done', 0)
+
+    def _save_checkpoint(self, rows_done):
+        tmp = self.checkpoint_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'rows_done': rows_done, 'inserted': self.stats['inserted'],
+                       'rejected': self.stats['rejected']}, f)
+        os.replace(tmp, self.checkpoint_path)
+
+    def _reject(self, rejects, line, row, reason):
+        self.stats['rejected'] += 1
+        row = {key: value for key, value in row.items() if key != 'password'}
+        rejects.write(json.dumps({'row': line, 'reason': reason, 'data': row}, default=str) + '\n')
+
+    def validated(self, rows, rejects):
+        """Stage: validate rows, yielding (line, clean_row)"""
+        validate = self.spec['validate']
+        for line, row in enumerate(rows, start=1):
+            if line <= self.resume_from:
+                self.stats['skipped'] += 1
+                continue
+            self.stats['read'] += 1
+            started = time.perf_counter()
+            clean, error = validate(row)
+            self.timings['validate'] += time.perf_counter() - started
+            if error:
+                self._reject(rejects, line, row, error)
+                continue
+            yield line, clean
+
+    def chunked(self, items):
+        """Stage: group (line, row) pairs into lists of chunk_size"""
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def checked(self, chunks, rejects):
+        """Stage: drop duplicates of the unique columns and rows with dangling references"""
+        unique = self.spec['unique']
+        references = self.spec.get('references', {})
+        for chunk in chunks:
+            started = time.perf_counter()
+            existing = {column: self._lookup(self.spec['table'], column, chunk) for column in unique}
+            known = {column: self._lookup(table, key, chunk, column)
+                     for column, (table, key) in references.items()}
+            kept = []
+            for line, row in chunk:
+                duplicate = [column for column in unique
+                             if row[column] is not None and row[column] in existing[column]]
+                if duplicate:
+                    self._reject(rejects, line, row, f"Duplicate {', '.join(duplicate)}")
+                    continue
+                missing = [column for column in references if row[column] not in known[column]]
+                if missing:
+                    self._reject(rejects, line, row, f"Unknown {', '.join(missing)}")
+                    continue
+                for column in unique:
+                    existing[column].add(row[column])
+                kept.append((line, row))
+            self.timings['check'] += time.perf_counter() - started
+            yield chunk[-1][0], kept
+
+    def _lookup(self, table, column, chunk, field=None):
+        """Values of chunk[field] that already exist in table.column, on every shard for sharded tables"""
+        values = list({row[field or column] for _, row in chunk} - {None})
+        if not values:
+            return set()
+        placeholders = ', '.join(['%s'] * len(values))
+        sql = f"SELECT {column} FROM {table} WHERE {column} IN ({placeholders})"
+        if table in dict(SHARDED_TABLES):
+            results = self.router.run_everywhere(sql, values)
+        else:
+            cursor = self._connection(self.router.catalog).cursor()
+            cursor.execute(sql, values)
+            results = [cursor.fetchall()]
+            cursor.close()
+        return {row[column] for rows in results for row in rows}
+
+    def hashed(self, chunks, executor):
+        """Stage: hash passwords for a chunk in the worker processes"""
+        for last_line, chunk in chunks:
+            if self.spec['hash_password'] and chunk:
+                started = time.perf_counter()
+                passwords = [row['password'] for _, row in chunk]
+                methods = [self.method] * len(passwords)
+                chunksize = max(1, len(passwords) // (self.workers * 4))
+                for (_, row), pwhash in zip(chunk, executor.map(_hash, passwords, methods, chunksize=chunksize)):
+                    row['password'] = pwhash
+                self.timings['hash'] += time.perf_counter() - started
+            yield last_line, chunk
+
+    def columns(self):
+        columns = self.spec['columns']
+        if self.entity == 'patients' and self.router.sharded:
+            columns = ('patient_id',) + columns
+        return columns
+
+    def routed(self, chunk):
+        """Group a chunk by the pool each row is written to"""
+        groups = {}
+        for line, row in chunk:
+            if self.spec['sharded'] and self.router.sharded:
+                if self.entity == 'patients':
+                    row['patient_id'] = self.router.allocate_patient_id()
+                self.router.check_writable(row['patient_id'])
+                pool = self.router.pool_for(row['patient_id'])
+            else:
+                pool = self.router.catalog
+            groups.setdefault(id(pool), (pool, []))[1].append((line, row))
+        return groups.values()
+
+    def _write(self, pool, table, columns, rows, rejects=None, verb='INSERT'):
+        """Insert rows into one database; returns the rows that went in"""
+        conn = self._connection(pool)
+        sql = f"{verb} INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+        cursor = conn.cursor()
+        try:
+            # pymysql folds executemany on INSERT ... VALUES into multi-row statements
+            cursor.executemany(sql, [tuple(row[column] for column in columns) for _, row in rows])
+            conn.commit()
+            return rows
+        except pymysql.err.IntegrityError:
+            conn.rollback()
+            if rejects is None:
+                raise
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+        # A unique value was taken since the check (or twice on different shards): go row by row
+        inserted = []
+        cursor = conn.cursor()
+        try:
+            for line, row in rows:
+                try:
+                    cursor.execute(sql, tuple(row[column] for column in columns))
+                    conn.commit()
+                    inserted.append((line, row))
+                except pymysql.err.IntegrityError as e:
+                    conn.rollback()
+                    self._reject(rejects, line, row, f"Duplicate: {e.args[-1]}")
+        finally:
+            cursor.close()
+        return inserted
+
+    def _replicate_doctors(self, rows):
+        """Copy newly imported doctors, with their catalog ids, to every shard"""
+        codes = [row['doctor_code'] for _, row in rows]
+        placeholders = ', '.join(['%s'] * len(codes))
+        cursor = self._connection(self.router.catalog).cursor()
+        cursor.execute(f"SELECT doctor_id, doctor_code FROM doctors WHERE doctor_code IN ({placeholders})", codes)
+        ids = {row['doctor_code']: row['doctor_id'] for row in cursor.fetchall()}
+        cursor.close()
+        for _, row in rows:
+            row['doctor_id'] = ids[row['doctor_code']]
+        # IGNORE: a resumed import may find some copies already in place
+        for pool in self.router.pools:
+            self._write(pool, 'doctors', ('doctor_id',) + DOCTOR_COLUMNS, rows, verb='INSERT IGNORE')
+
+    def insert(self, chunks, rejects):
+        """Stage: one multi-row INSERT and commit per chunk and database, then checkpoint"""
+        columns = self.columns()
+        for last_line, chunk in chunks:
+            started = time.perf_counter()
+            inserted = 0
+            for pool, rows in self.routed(chunk):
+                rows = self._write(pool, self.spec['table'], columns, rows, rejects)
+                if rows and self.entity == 'doctors' and self.router.sharded:
+                    self._replicate_doctors(rows)
+                inserted += len(rows)
+            self.stats['inserted'] += inserted
+            self.timings['insert'] += time.perf_counter() - started
+            self._save_checkpoint(last_line)
+            yield inserted
+
+    def run(self, progress=True):
+        started = time.perf_counter()
+        mode = 'a' if self.resume_from else 'w'
+        executor = None
+        if self.spec['hash_password']:
+            executor = ProcessPoolExecutor(max_workers=self.workers,
+                                           mp_context=multiprocessing.get_context('spawn'))
+        try:
+            with open(self.rejects_path, mode, encoding='utf-8') as rejects:
+                rows = read_rows(self.path)
+                pipeline = self.insert(self.hashed(
+                    self.checked(self.chunked(self.validated(rows, rejects)), rejects),
+                    executor
+                ), rejects)
+                for _ in pipeline:
+                    if progress:
+                        elapsed = time.perf_counter() - started
+                        rate = self.stats['read'] / elapsed if elapsed else 0
+                        print(f"read {self.stats['read']}  inserted {self.stats['inserted']}  "
+                              f"rejected {self.stats['rejected']}  {rate:,.0f} rows/s", end='\r', file=sys.stderr)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            self._release()
+        self.elapsed = time.perf_counter() - started
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        return self.stats
+
+    def report(self):
+        lines = [
+            f"Imported {self.entity} from {self.path}",
+            f"  rows read      {self.stats['read']}",
+            f"  rows skipped   {self.stats['skipped']} (already imported)",
+            f"  inserted       {self.stats['inserted']}",
+            f"  rejected       {self.stats['rejected']} (see {self.rejects_path})",
+            f"  elapsed        {self.elapsed:.1f}s",
+            f"  throughput     {self.stats['read'] / self.elapsed if self.elapsed else 0:,.0f} rows/s",
+        ]
+        for stage, seconds in self.timings.items():
+            lines.append(f"  {stage + ' time':<14} {seconds:.1f}s")
+        return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk import Medilink data')
+    parser.add_argument('entity', choices=sorted(Importer.ENTITIES))
+    parser.add_argument('path')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--workers', type=int, default=None, help='password hashing processes')
+    parser.add_argument('--resume', action='store_true', help='continue from the last checkpoint')
+    parser.add_argument('--hash-method', default=None,
+                        help='werkzeug hash method for imported passwords (default: PASSWORD_HASH_METHOD); '
+                             'weaker methods are upgraded by rehash-on-login')
+    args = parser.parse_args()
+
+    from app import app, mysql
+    importer = Importer(
+        mysql.shards, args.entity, args.path,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        method=args.hash_method or app.config['PASSWORD_HASH_METHOD'],
+        resume=args.resume
+    )
+    importer.run()
+    print()
+    print(importer.report())
+
+
+if __name__ == '__main__':
+    main()
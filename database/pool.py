@@ -0,0 +1,186 @@
+"""
+Thread-safe MySQL connection pool
+
+Connections are checked out per Flask app context by the ``MySQL`` wrapper
+in app.py and returned on teardown, so concurrent requests never share a
+socket.
+"""
+
+import threading
+import time
+from collections import deque
+
+import pymysql
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes free within the checkout timeout"""
+
+
+class ConnectionPool:
+    def __init__(self, connect_args, min_size=1, max_size=10, timeout=5.0,
+                 recycle=1800, idle_timeout=300, ping_after=5.0):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("Invalid pool size: min=%s max=%s" % (min_size, max_size))
+        self.connect_args = dict(connect_args)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+
+        self._idle = deque()
+        self._created_at = {}
+        self._size = 0
+        self._cond = threading.Condition(threading.Lock())
+
+        self._stats = {
+            'checkouts': 0,
+            'created': 0,
+            'closed': 0,
+            'recycled': 0,
+            'health_failures': 0,
+            'exhausted': 0,
+            'timeouts': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+    def _connect(self):
+        conn = pymysql.connect(**self.connect_args)
+        with self._cond:
+            self._created_at[id(conn)] = time.monotonic()
+            self._stats['created'] += 1
+        return conn
+
+    def _discard(self, conn):
+        """Close a connection and free its slot. Caller must hold the lock."""
+        self._created_at.pop(id(conn), None)
+        self._size -= 1
+        self._stats['closed'] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._cond.notify()
+
+    def _is_stale(self, conn, idle_since, now):
+        created = self._created_at.get(id(conn), now)
+        if self.recycle and now - created > self.recycle:
+            return True
+        if self.idle_timeout and now - idle_since > self.idle_timeout and self._size > self.min_size:
+            return True
+        return False
+
+    def warm(self):
+        """Open connections until ``min_size`` are available"""
+        with self._cond:
+            missing = max(self.min_size - self._size, 0)
+            self._size += missing
+        for opened in range(missing):
+            try:
+                conn = self._connect()
+            except Exception:
+                # Free this slot and every one reserved for the connections not yet opened
+                with self._cond:
+                    self._size -= missing - opened
+                    self._cond.notify_all()
+                raise
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def acquire(self, timeout=None):
+        """Check out a healthy connection, opening one if below ``max_size``"""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        waited = False
+
+        while True:
+            with self._cond:
+                conn = None
+                while self._idle:
+                    candidate, idle_since = self._idle.pop()
+                    now = time.monotonic()
+                    if self._is_stale(candidate, idle_since, now):
+                        self._stats['recycled'] += 1
+                        self._discard(candidate)
+                        continue
+                    conn = candidate
+                    break
+
+                if conn is None and self._size < self.max_size:
+                    self._size += 1
+                    idle_since = None
+                elif conn is None:
+                    if not waited:
+                        self._stats['exhausted'] += 1
+                        waited = True
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout("No database connection available after %.1fs" % timeout)
+                    self._cond.wait(remaining)
+                    continue
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif time.monotonic() - idle_since > self.ping_after:
+                try:
+                    conn.ping(reconnect=False)
+                except Exception:
+                    with self._cond:
+                        self._stats['health_failures'] += 1
+                        self._discard(conn)
+                    continue
+
+            wait = time.monotonic() - started
+            with self._cond:
+                self._stats['checkouts'] += 1
+                self._stats['wait_time_total'] += wait
+                self._stats['wait_time_max'] = max(self._stats['wait_time_max'], wait)
+            return conn
+
+    def release(self, conn):
+        """Return a connection, rolling back any transaction left open"""
+        healthy = conn.open
+        if healthy:
+            try:
+                conn.rollback()
+            except Exception:
+                healthy = False
+
+        with self._cond:
+            if healthy:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+            else:
+                self._stats['health_failures'] += 1
+                self._discard(conn)
+
+    def close(self):
+        """Close every idle connection"""
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._discard(conn)
+
+    def stats(self):
+        """Snapshot of pool size and wait/exhaustion counters"""
+        with self._cond:
+            data = dict(self._stats)
+            data['size'] = self._size
+            data['idle'] = len(self._idle)
+            data['in_use'] = self._size - len(self._idle)
+            data['max_size'] = self.max_size
+        checkouts = data['checkouts']
+        data['wait_time_avg'] = data['wait_time_total'] / checkouts if checkouts else 0.0
+        return data
@@ -0,0 +1,197 @@
+"""
+Read replicas for the ``MySQL`` wrapper
+
+Each replica gets its own ConnectionPool. A background thread checks every
+replica's health and replication lag (SHOW REPLICA STATUS, falling back to
+SHOW SLAVE STATUS on older servers); a replica that cannot be reached, has
+replication stopped or lags more than max_lag seconds is taken out of
+rotation until a later check passes. A server that reports no replication
+status at all is treated as an up-to-date replica, so routing can be
+exercised with two independent local MySQL instances.
+
+Only GET and HEAD requests read from a replica. After a user's own write
+their reads stay on the primary for sticky_seconds so they see it straight
+away, and use_primary() sends the rest of one request there.
+"""
+
+import itertools
+import threading
+import time
+
+from flask import g, has_request_context, request, session
+
+from database.pool import ConnectionPool
+
+LAG_COLUMNS = ('Seconds_Behind_Source', 'Seconds_Behind_Master')
+
+
+def parse_hosts(value):
+    """'db2:3307,db3' -> [('db2', 3307), ('db3', 3306)]"""
+    hosts = []
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.partition(':')
+        hosts.append((host, int(port) if port else 3306))
+    return hosts
+
+
+class Replica:
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.healthy = True
+        self.lag = None
+        self.failures = 0
+        self.checked_at = None
+
+    def replication_lag(self):
+        """Seconds behind the primary, 0 for a standalone server, None if replication is stopped"""
+        conn = self.pool.acquire()
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+            except Exception:
+                cursor.execute("SHOW SLAVE STATUS")
+            status = cursor.fetchone()
+            cursor.close()
+        finally:
+            self.pool.release(conn)
+        if not status:
+            return 0
+        for column in LAG_COLUMNS:
+            if column in status:
+                return status[column]
+        return None
+
+
+class ReplicaSet:
+    def __init__(self, primary_args, hosts, user=None, password=None, max_lag=5,
+                 check_interval=5, sticky_seconds=10, pool_options=None):
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.sticky_seconds = sticky_seconds
+        self.replicas = []
+        for host, port in hosts:
+            args = dict(primary_args, host=host, port=port)
+            if user:
+                args['user'] = user
+            if password is not None:
+                args['password'] = password
+            self.replicas.append(Replica(f"{host}:{port}", ConnectionPool(args, **(pool_options or {}))))
+        self.fallbacks = 0
+        self._cycle = itertools.cycle(range(len(self.replicas))) if self.replicas else None
+        self._lock = threading.Lock()
+        self._checker = None
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    def pools(self):
+        return [replica.pool for replica in self.replicas]
+
+    def start(self):
+        """Start the health checker once; safe to call on every request"""
+        if self._checker is not None or not self.replicas or not self.check_interval:
+            return
+        with self._lock:
+            if self._checker is not None:
+                return
+            self._checker = threading.Thread(target=self._check_forever, name='replica-checker', daemon=True)
+            self._checker.start()
+
+    def _check_forever(self):
+        while True:
+            self.check()
+            time.sleep(self.check_interval)
+
+    def check(self):
+        for replica in self.replicas:
+            try:
+                lag = replica.replication_lag()
+                healthy = lag is not None and lag <= self.max_lag
+            except Exception as e:
+                print(f"Replica {replica.name} health check error: {e}")
+                lag, healthy = None, False
+            with self._lock:
+                replica.lag = lag
+                replica.healthy = healthy
+                replica.checked_at = time.time()
+                if not healthy:
+                    replica.failures += 1
+
+    def mark_down(self, replica):
+        with self._lock:
+            replica.healthy = False
+            replica.failures += 1
+
+    def acquire(self):
+        """
+        Check out a connection from the next healthy replica.
+
+        Returns (replica, conn), or (None, None) when no replica can serve
+        the read and the caller should fall back to the primary.
+        """
+        if not self.replicas:
+            return None, None
+        self.start()
+        for _ in range(len(self.replicas)):
+            with self._lock:
+                replica = self.replicas[next(self._cycle)]
+            if not replica.healthy:
+                continue
+            try:
+                return replica, replica.pool.acquire()
+            except Exception as e:
+                print(f"Replica {replica.name} unavailable: {e}")
+                self.mark_down(replica)
+        with self._lock:
+            self.fallbacks += 1
+        return None, None
+
+    def remember_write(self, response):
+        """after_request hook: pin this user's reads to the primary for a while after a write"""
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            session['_primary_until'] = time.time() + self.sticky_seconds
+        return response
+
+    def use_primary(self):
+        """Send the rest of this request's reads to the primary"""
+        g._mysql_primary = True
+
+    def serves_request(self):
+        return (bool(self.replicas) and has_request_context()
+                and request.method in ('GET', 'HEAD')
+                and not g.get('_mysql_primary')
+                and session.get('_primary_until', 0) < time.time())
+
+    def request_connection(self):
+        """This request's replica connection, or None when its reads belong on the primary"""
+        if not self.serves_request():
+            return None
+        replica, conn = g.get('_mysql_replica', (None, None))
+        if conn is None:
+            replica, conn = self.acquire()
+            if conn is None:
+                return None
+            g._mysql_replica = (replica, conn)
+        return conn
+
+    def release(self):
+        """Return the app context's replica connection to its pool"""
+        replica, conn = g.pop('_mysql_replica', (None, None))
+        if conn is not None:
+            replica.pool.release(conn)
+
+    def stats(self):
+        with self._lock:
+            data = {
+                'replicas': len(self.replicas),
+                'healthy': sum(1 for replica in self.replicas if replica.healthy),
+                'fallbacks': self.fallbacks,
+            }
+            lags = [replica.lag for replica in self.replicas if replica.lag is not None]
+        data['max_lag'] = max(lags) if lags else 0
+        return data
@@ -0,0 +1,127 @@
+"""
+Idempotent schema migrations layered on top of database/init_db.py
+
+Run with ``python -m database.schema`` after initializing the database.
+"""
+
+import pymysql
+
+# MySQL error codes that mean a migration has already been applied
+ALREADY_APPLIED = (
+    1050,  # table already exists
+    1060,  # duplicate column name
+    1061,  # duplicate key name
+)
+
+MIGRATIONS = [
+    # Atomic slot reservation: one active appointment per doctor/date/time.
+    # Cancelled appointments get a NULL slot marker so the slot frees up.
+    """
+    ALTER TABLE appointments
+        ADD COLUMN slot_active TINYINT
+        AS (IF(status = 'Cancelled', NULL, 1)) STORED
+    """,
+    """
+    ALTER TABLE appointments
+        ADD UNIQUE KEY uq_appointments_slot
+        (doctor_id, appointment_date, appointment_time, slot_active)
+    """,
+    # Keyset pagination and prefix search for the doctor's patient list
+    "CREATE INDEX idx_patients_name ON patients (full_name, patient_id)",
+    "CREATE INDEX idx_patients_email ON patients (email)",
+    "CREATE INDEX idx_patients_phone ON patients (phone)",
+    # Full-text search over the clinical text of medical records
+    """
+    ALTER TABLE medical_records
+        ADD FULLTEXT INDEX ft_medical_records
+        (diagnosis, symptoms, prescription, tests_recommended, notes)
+    """,
+    "CREATE INDEX idx_medical_records_doctor_date ON medical_records (doctor_id, visit_date)",
+    # Daily appointment counters per doctor and status for the admin analytics
+    """
+    CREATE TABLE appointment_daily_rollups (
+        doctor_id INT NOT NULL,
+        day DATE NOT NULL,
+        status VARCHAR(20) NOT NULL,
+        total INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, doctor_id, status),
+        KEY idx_rollups_doctor_day (doctor_id, day)
+    )
+    """,
+    # Persistent background job queue (controllers/jobs.py)
+    """
+    CREATE TABLE background_jobs (
+        job_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        kind VARCHAR(64) NOT NULL,
+        payload MEDIUMTEXT NOT NULL,
+        dedupe_key VARCHAR(191) NULL,
+        status ENUM('pending', 'running', 'done', 'failed') NOT NULL DEFAULT 'pending',
+        attempts INT NOT NULL DEFAULT 0,
+        run_after DATETIME NOT NULL,
+        locked_by VARCHAR(128) NULL,
+        locked_at DATETIME NULL,
+        last_error TEXT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        UNIQUE KEY uq_background_jobs_dedupe (dedupe_key),
+        KEY idx_background_jobs_due (status, run_after)
+    )
+    """,
+    # Reminders already sent, so a retried reminder_batch job skips them
+    """
+    CREATE TABLE reminder_deliveries (
+        appointment_id BIGINT NOT NULL,
+        appointment_date DATE NOT NULL,
+        sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (appointment_date, appointment_id)
+    )
+    """,
+    # Shard catalog (kept on the primary): bucket -> shard map, patient id
+    # allocation and global slot claims, see database/sharding.py
+    """
+    CREATE TABLE shard_buckets (
+        bucket SMALLINT UNSIGNED PRIMARY KEY,
+        shard SMALLINT UNSIGNED NOT NULL,
+        state ENUM('active', 'copying', 'locked') NOT NULL DEFAULT 'active',
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE TABLE patient_ids (patient_id INT AUTO_INCREMENT PRIMARY KEY)",
+    """
+    CREATE TABLE slot_claims (
+        doctor_id INT NOT NULL,
+        appointment_date DATE NOT NULL,
+        appointment_time TIME NOT NULL,
+        patient_id INT NOT NULL,
+        claimed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (doctor_id, appointment_date, appointment_time)
+    )
+    """,
+]
+
+
+def apply_migrations(conn):
+    """Apply every migration, skipping ones already present"""
+    applied = 0
+    cursor = conn.cursor()
+    for statement in MIGRATIONS:
+        try:
+            cursor.execute(statement)
+            applied += 1
+        except pymysql.err.MySQLError as e:
+            if e.args and e.args[0] in ALREADY_APPLIED:
+                continue
+            raise
+    conn.commit()
+    cursor.close()
+    return applied
+
+
+if __name__ == '__main__':
+    from app import mysql
+    count = apply_migrations(mysql.connection)
+    print(f"Applied {count} migration(s)")
+    if mysql.shards.sharded:
+        for index in range(len(mysql.shards.pools)):
+            count = apply_migrations(mysql.shards.connection(index))
+            print(f"Shard {index}: applied {count} migration(s)")
@@ -0,0 +1,537 @@
+"""
+Sharding of patient data by patient_id
+
+Patients, their appointments and their medical records live together on
+one shard, chosen through a bucket map: bucket = patient_id % BUCKETS and
+the catalog (the primary database) maps each bucket to a shard in
+shard_buckets. Global tables (doctors, admins, reset tokens, jobs,
+rollups) stay on the primary, and every shard needs a copy of doctors for
+its joins.
+
+The ``MySQL`` wrapper routes a request to a shard by its patient: one
+pinned with ``use_patient()`` (``use_shard_of()`` finds the owner of an
+appointment or record id), else the patient_id in the URL, else the
+logged-in patient. Queries that span
+patients go through ``everywhere()``, a read-only connection that runs a
+SELECT on every shard in parallel and merges the rows in sort order.
+
+Shards must hand out globally unique appointment and record ids
+(auto_increment_increment >= number of shards, a distinct
+auto_increment_offset per shard) and new patient ids come from the
+catalog via allocate_patient_id(), so rows can move between shards
+without renumbering. After applying the migrations to the primary and
+every shard, the map is set up and spread over the shards with
+
+    python -m database.sharding init
+    python -m database.sharding rebalance
+
+and single buckets are inspected and moved online with
+
+    python -m database.sharding status
+    python -m database.sharding move 17 2
+"""
+
+import argparse
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pymysql
+from flask import g, has_app_context, has_request_context, request, session
+
+from database.pool import ConnectionPool
+
+BUCKETS = 1024
+
+# Tables moved with a bucket, parents first, and their primary keys; the
+# archive tables are skipped on shards where archiving never ran
+SHARDED_TABLES = (('patients', 'patient_id'), ('appointments', 'appointment_id'),
+                  ('appointments_archive', 'appointment_id'), ('medical_records', 'record_id'),
+                  ('medical_records_archive', 'record_id'))
+
+
+class ShardMoving(Exception):
+    """Raised for a write to a bucket that is being moved; retry shortly"""
+
+
+def parse_shards(value):
+    """'db1:3306/medilink,db2' -> [('db1', 3306, 'medilink'), ('db2', 3306, None)]"""
+    shards = []
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        address, _, database = item.partition('/')
+        host, _, port = address.partition(':')
+        shards.append((host, int(port) if port else 3306, database or None))
+    return shards
+
+
+def bucket_of(patient_id):
+    return int(patient_id) % BUCKETS
+
+
+class ShardRouter:
+    def __init__(self, catalog, shards=(), pool_options=None, refresh=5):
+        self.catalog = catalog
+        self.refresh = refresh
+        self.pools = []
+        for host, port, database in shards:
+            args = dict(catalog.connect_args, host=host, port=port)
+            if database:
+                args['database'] = database
+            self.pools.append(ConnectionPool(args, **(pool_options or {})))
+        if not self.pools:
+            self.pools = [catalog]
+        self.fan_outs = 0
+        self._layout = None
+        self._locked = set()
+        self._loaded_at = 0
+        self._private = {}
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def sharded(self):
+        return len(self.pools) > 1
+
+    def _load_layout(self):
+        layout = [bucket % len(self.pools) for bucket in range(BUCKETS)]
+        locked = set()
+        conn = self.catalog.acquire()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT bucket, shard, state FROM shard_buckets")
+            for row in cursor.fetchall():
+                layout[row['bucket']] = row['shard']
+                if row['state'] == 'locked':
+                    locked.add(row['bucket'])
+            cursor.close()
+        finally:
+            self.catalog.release(conn)
+        return layout, locked
+
+    def layout(self):
+        """bucket -> shard index, reloaded from the catalog every `refresh` seconds"""
+        if not self.sharded:
+            return None
+        now = time.monotonic()
+        if self._layout is None or now - self._loaded_at > self.refresh:
+            with self._lock:
+                if self._layout is None or now - self._loaded_at > self.refresh:
+                    self._layout, self._locked = self._load_layout()
+                    self._loaded_at = now
+        return self._layout
+
+    def index_for(self, patient_id):
+        if not self.sharded:
+            return 0
+        return self.layout()[bucket_of(patient_id)]
+
+    def pool_for(self, patient_id):
+        return self.pools[self.index_for(patient_id)]
+
+    def check_writable(self, patient_id):
+        if self.sharded and self.layout() and bucket_of(patient_id) in self._locked:
+            raise ShardMoving(f"Patient data for bucket {bucket_of(patient_id)} is being moved")
+
+    def request_patient(self):
+        """
+        The patient a request is about: one pinned with mysql.use_patient(),
+        else the URL patient_id, else the logged-in patient
+        """
+        if has_app_context() and g.get('_mysql_patient') is not None:
+            return g._mysql_patient
+        if not has_request_context():
+            return None
+        patient_id = (request.view_args or {}).get('patient_id')
+        if patient_id is None and session.get('user_type') == 'patient':
+            patient_id = session.get('user_id')
+        return patient_id
+
+    def connection(self, index):
+        """Connection to one shard, held for the app context like mysql.connection"""
+        if has_app_context():
+            conns = g.setdefault('_mysql_shards', {})
+            if index not in conns:
+                conns[index] = self.pools[index].acquire()
+            return conns[index]
+        conn = self._private.get(index)
+        if conn is None or not conn.open:
+            conn = self._private[index] = pymysql.connect(**self.pools[index].connect_args)
+        return conn
+
+    def connection_for(self, patient_id):
+        return self.connection(self.index_for(patient_id))
+
+    def release(self):
+        for index, conn in g.pop('_mysql_shards', {}).items():
+            self.pools[index].release(conn)
+
+    def everywhere(self, key=None, reverse=False):
+        """Read-only connection over every shard; rows are merged by key when given"""
+        return FanOutConnection(self, key, reverse)
+
+    def run_everywhere(self, sql, params=None):
+        """Run a SELECT on every shard in parallel; returns one row list per shard"""
+        def run(pool):
+            conn = pool.acquire()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+                cursor.close()
+                return rows
+            finally:
+                pool.release(conn)
+
+        if len(self.pools) == 1:
+            return [run(self.pools[0])]
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=len(self.pools) * 4,
+                                                        thread_name_prefix='shard-fan-out')
+        with self._lock:
+            self.fan_outs += 1
+        return list(self._executor.map(run, self.pools))
+
+    def locate(self, table, key, value):
+        """patient_id owning the `table` row whose `key` is `value`, searched on every shard"""
+        for rows in self.run_everywhere(f"SELECT patient_id FROM {table} WHERE {key} = %s LIMIT 1",
+                                        (value,)):
+            if rows:
+                return rows[0]['patient_id']
+        return None
+
+    def allocate_patient_id(self):
+        """Globally unique id for a new patient, from the catalog"""
+        conn = self.catalog.acquire()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO patient_ids () VALUES ()")
+            patient_id = cursor.lastrowid
+            conn.commit()
+            cursor.close()
+        finally:
+            self.catalog.release(conn)
+        return patient_id
+
+    def claim_slots(self, keys):
+        """
+        Claim (doctor_id, date, time) slots in the catalog in one transaction.
+
+        Appointments of one doctor can sit on every shard, so the per-shard
+        uq_appointments_slot key alone cannot stop a double booking. Returns
+        True per key that was claimed, False where the slot was taken.
+        """
+        claimed = [False] * len(keys)
+        seen = set()
+        conn = self.catalog.acquire()
+        try:
+            cursor = conn.cursor()
+            for i, (key, patient_id) in enumerate(keys):
+                if key in seen:
+                    continue
+                seen.add(key)
+                try:
+                    cursor.execute("""
+                        INSERT INTO slot_claims (doctor_id, appointment_date, appointment_time, patient_id)
+                        VALUES (%s, %s, %s, %s)
+                    """, key + (patient_id,))
+                except pymysql.err.IntegrityError as e:
+                    if e.args and e.args[0] == 1062:
+                        continue
+                    raise
+                claimed[i] = True
+            conn.commit()
+            cursor.close()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.catalog.release(conn)
+        return claimed
+
+    def release_claims(self, keys):
+        if not keys:
+            return
+        conn = self.catalog.acquire()
+        try:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                DELETE FROM slot_claims
+                WHERE doctor_id = %s AND appointment_date = %s AND appointment_time = %s
+            """, keys)
+            conn.commit()
+            cursor.close()
+        finally:
+            self.catalog.release(conn)
+
+    def release_slot(self, appointment, status):
+        """appointment_status_changed listener: free the global slot claim of a cancellation"""
+        if status == 'Cancelled' and self.sharded:
+            self.release_claims([(appointment['doctor_id'], appointment['appointment_date'],
+                                  appointment['appointment_time'])])
+
+    def stats(self):
+        layout = self.layout() or [0] * BUCKETS
+        data = {'shards': len(self.pools), 'fan_outs': self.fan_outs, 'locked_buckets': len(self._locked)}
+        for index in range(len(self.pools)):
+            data[f'buckets_shard_{index}'] = layout.count(index)
+        return data
+
+
+class FanOutCursor:
+    def __init__(self, router, key, reverse=False):
+        self.router = router
+        self.key = key
+        self.reverse = reverse
+        self.rowcount = 0
+        self._rows = iter(())
+
+    def execute(self, sql, params=None):
+        if sql.lstrip().split(None, 1)[0].upper() not in ('SELECT', 'WITH'):
+            raise ValueError("Fan-out connections only run SELECT queries")
+        results = self.router.run_everywhere(sql, params)
+        self.rowcount = sum(len(rows) for rows in results)
+        if self.key is not None:
+            self._rows = heapq.merge(*results, key=self.key, reverse=self.reverse)
+        else:
+            self._rows = itertools.chain.from_iterable(results)
+        return self.rowcount
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def __iter__(self):
+        return self._rows
+
+    def close(self):
+        self._rows = iter(())
+
+
+class FanOutConnection:
+    """Connection-like object whose cursors fan SELECTs out to every shard"""
+
+    open = True
+
+    def __init__(self, router, key=None, reverse=False):
+        self.router = router
+        self.key = key
+        self.reverse = reverse
+
+    def cursor(self, cursorclass=None):
+        return FanOutCursor(self.router, self.key, self.reverse)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def initialize(router):
+    """
+    Prepare the catalog for a sharded deployment: pin every bucket to the
+    first shard (where an existing single database's data is) unless a map
+    already exists, start patient id allocation above every existing
+    patient and claim every scheduled slot already booked on a shard.
+    Safe to run again; follow it with ``rebalance``.
+    """
+    highest = max([row['top'] or 0 for rows in router.run_everywhere(
+        "SELECT MAX(patient_id) AS top FROM patients") for row in rows] + [0])
+    booked = [
+        (row['doctor_id'], row['appointment_date'], row['appointment_time'], row['patient_id'])
+        for rows in router.run_everywhere("""
+            SELECT doctor_id, appointment_date, appointment_time, patient_id
+            FROM appointments WHERE status = 'Scheduled'
+        """)
+        for row in rows
+    ]
+    conn = router.catalog.acquire()
+    try:
+        cursor = conn.cursor()
+        cursor.executemany("INSERT IGNORE INTO shard_buckets (bucket, shard) VALUES (%s, 0)",
+                           [(bucket,) for bucket in range(BUCKETS)])
+        cursor.execute(f"ALTER TABLE patient_ids AUTO_INCREMENT = {int(highest) + 1}")
+        cursor.executemany("""
+            INSERT IGNORE INTO slot_claims (doctor_id, appointment_date, appointment_time, patient_id)
+            VALUES (%s, %s, %s, %s)
+        """, booked)
+        conn.commit()
+        cursor.close()
+    finally:
+        router.catalog.release(conn)
+    return highest, len(booked)
+
+
+class Resharder:
+    """
+    Moves buckets between shards while the app keeps running.
+
+    A bucket is copied while still live on its source, then locked (writes
+    to it get ShardMoving), copied again to pick up late changes, switched
+    to the target and finally deleted from the source. Between steps the
+    tool waits `settle` seconds so every worker has reloaded the map.
+    """
+
+    def __init__(self, router, batch_size=1000, settle=None):
+        self.router = router
+        self.batch_size = batch_size
+        self.settle = settle if settle is not None else router.refresh * 2 + 1
+
+    def _set(self, bucket, shard, state):
+        conn = self.router.catalog.acquire()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO shard_buckets (bucket, shard, state) VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE shard = VALUES(shard), state = VALUES(state)
+            """, (bucket, shard, state))
+            conn.commit()
+            cursor.close()
+        finally:
+            self.router.catalog.release(conn)
+
+    @staticmethod
+    def _columns(conn, table):
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT COLUMN_NAME FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND EXTRA NOT LIKE '%%GENERATED%%'
+            ORDER BY ORDINAL_POSITION
+        """, (table,))
+        columns = [row['COLUMN_NAME'] for row in cursor.fetchall()]
+        cursor.close()
+        return columns
+
+    def _copy(self, bucket, source, target):
+        src = self.router.pools[source].acquire()
+        dst = self.router.pools[target].acquire()
+        copied = 0
+        try:
+            for table, key in SHARDED_TABLES:
+                columns = self._columns(src, table)
+                if not columns:
+                    continue
+                column_list = ', '.join(columns)
+                insert = (f"INSERT INTO {table} ({column_list}) VALUES ({', '.join(['%s'] * len(columns))}) "
+                          f"ON DUPLICATE KEY UPDATE " + ', '.join(f"{c} = VALUES({c})" for c in columns))
+                last = 0
+                read = src.cursor()
+                write = dst.cursor()
+                while True:
+                    read.execute(f"""
+                        SELECT {column_list} FROM {table}
+                        WHERE {key} > %s AND MOD(patient_id, %s) = %s
+                        ORDER BY {key} LIMIT %s
+                    """, (last, BUCKETS, bucket, self.batch_size))
+                    rows = read.fetchall()
+                    if not rows:
+                        break
+                    write.executemany(insert, [tuple(row[c] for c in columns) for row in rows])
+                    dst.commit()
+                    copied += len(rows)
+                    last = rows[-1][key]
+                read.close()
+                write.close()
+        finally:
+            self.router.pools[source].release(src)
+            self.router.pools[target].release(dst)
+        return copied
+
+    def _delete(self, bucket, shard):
+        conn = self.router.pools[shard].acquire()
+        try:
+            cursor = conn.cursor()
+            for table, _ in reversed(SHARDED_TABLES):
+                if not self._columns(conn, table):
+                    continue
+                while True:
+                    cursor.execute(f"DELETE FROM {table} WHERE MOD(patient_id, %s) = %s LIMIT %s",
+                                   (BUCKETS, bucket, self.batch_size))
+                    conn.commit()
+                    if cursor.rowcount < self.batch_size:
+                        break
+            cursor.close()
+        finally:
+            self.router.pools[shard].release(conn)
+
+    def move(self, bucket, target):
+        """Move one bucket to shard `target`; returns rows copied"""
+        source = self.router.layout()[bucket]
+        if source == target:
+            return 0
+        self._set(bucket, source, 'copying')
+        copied = self._copy(bucket, source, target)
+        self._set(bucket, source, 'locked')
+        time.sleep(self.settle)
+        copied += self._copy(bucket, source, target)
+        self._set(bucket, target, 'active')
+        time.sleep(self.settle)
+        self._delete(bucket, source)
+        return copied
+
+    def plan(self):
+        """(bucket, target) moves that even out bucket counts with the fewest moves"""
+        layout = list(self.router.layout())
+        shards = len(self.router.pools)
+        quota = [BUCKETS // shards + (1 if i < BUCKETS % shards else 0) for i in range(shards)]
+        surplus = []
+        for index in range(shards):
+            owned = [bucket for bucket, shard in enumerate(layout) if shard == index]
+            surplus.extend(owned[quota[index]:])
+        moves = []
+        for index in range(shards):
+            missing = quota[index] - layout.count(index)
+            for _ in range(max(missing, 0)):
+                moves.append((surplus.pop(), index))
+        return moves
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect and move patient data shards')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('status')
+    commands.add_parser('init')
+    move = commands.add_parser('move')
+    move.add_argument('bucket', type=int)
+    move.add_argument('shard', type=int)
+    rebalance = commands.add_parser('rebalance')
+    rebalance.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    from app import mysql
+    router = mysql.shards
+    if not router.sharded:
+        raise SystemExit("MYSQL_SHARDS is not configured")
+    resharder = Resharder(router)
+
+    if args.command == 'status':
+        for key, value in router.stats().items():
+            print(f"{key}: {value}")
+    elif args.command == 'init':
+        highest, claims = initialize(router)
+        print(f"New patient ids start after {highest}; {claims} booked slot(s) claimed")
+    elif args.command == 'move':
+        print(f"Moved bucket {args.bucket}: {resharder.move(args.bucket, args.shard)} row(s) copied")
+    else:
+        moves = resharder.plan()
+        print(f"{len(moves)} bucket move(s) planned")
+        for bucket, target in moves:
+            if args.dry_run:
+                print(f"bucket {bucket} -> shard {target}")
+                continue
+            copied = resharder.move(bucket, target)
+            print(f"bucket {bucket} -> shard {target}: {copied} row(s)")
+            router._loaded_at = 0
+
+
+if __name__ == '__main__':
+    main()
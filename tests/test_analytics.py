@@ -0,0 +1,104 @@
+from datetime import date
+
+from controllers import analytics
+from controllers.analytics import RollupSeries, backfill, cancellation_rate
+
+D1, D2, D3 = date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 3)
+
+
+class Cursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.result = []
+
+    def execute(self, sql, params=None):
+        self.conn.executed.append(sql)
+        self.result = self.conn.answer(sql)
+
+    def executemany(self, sql, rows):
+        self.conn.inserted.extend(rows)
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class Conn:
+    def __init__(self, answer=lambda sql: []):
+        self.answer = answer
+        self.executed = []
+        self.inserted = []
+        self.committed = False
+
+    def cursor(self):
+        return Cursor(self)
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+
+class Pool:
+    def __init__(self, bounds, counts):
+        self.conn = Conn(lambda sql: bounds if 'MIN(' in sql else counts)
+
+    def acquire(self):
+        return self.conn
+
+    def release(self, conn):
+        pass
+
+
+def test_backfill_sums_every_shard_and_the_archive():
+    one = Pool([{'first': D2, 'last': D3}], [
+        {'doctor_id': 1, 'day': D2, 'status': 'Completed', 'total': 2},
+        {'doctor_id': 1, 'day': D3, 'status': 'Scheduled', 'total': 1},
+    ])
+    two = Pool([{'first': D1, 'last': D2}], [
+        {'doctor_id': 1, 'day': D2, 'status': 'Completed', 'total': 3},
+    ])
+    catalog = Conn()
+    assert backfill(catalog, [one, two], archived=True) == 2
+    for pool in (one, two):
+        assert all('appointments_archive' in sql for sql in pool.conn.executed)
+    delete = catalog.executed[0]
+    assert delete.startswith('DELETE FROM appointment_daily_rollups')
+    assert sorted(catalog.inserted) == [(1, D2, 'Completed', 5), (1, D3, 'Scheduled', 1)]
+    assert catalog.committed
+
+
+def test_backfill_without_archive_and_empty_tables():
+    pool = Pool([{'first': None, 'last': None}], [])
+    assert backfill(Conn(), [pool]) == 0
+    assert 'appointments_archive' not in pool.conn.executed[0]
+
+
+def test_rollup_series_totals_and_trend():
+    rows = [
+        {'doctor_id': 1, 'day': D1, 'status': 'Scheduled', 'total': 2},
+        {'doctor_id': 1, 'day': D2, 'status': 'Cancelled', 'total': 1},
+        {'doctor_id': 2, 'day': D3, 'status': 'Completed', 'total': 3},
+        {'doctor_id': 2, 'day': D3, 'status': 'No-show', 'total': 9},
+    ]
+    series = RollupSeries(D1, D3, rows)
+    assert series.totals() == {'Scheduled': 2, 'Completed': 3, 'Cancelled': 1}
+    assert list(series.daily()) == [2, 1, 3]
+    assert series.moving_average(window=2) == [2.0, 1.5, 2.0]
+    assert series.trend()['by_status']['Completed'] == [0, 0, 3]
+    assert series.doctors == {1: [2, 0, 1], 2: [0, 3, 0]}
+
+
+def test_plain_list_fallback_matches(monkeypatch):
+    monkeypatch.setattr(analytics, 'np', None)
+    series = RollupSeries(D1, D2, [{'doctor_id': 1, 'day': D2, 'status': 'Scheduled', 'total': 4}])
+    assert series.daily() == [0, 4]
+    assert series.moving_average() == [0.0, 2.0]
+
+
+def test_cancellation_rate():
+    assert cancellation_rate([1, 2, 1]) == 0.25
+    assert cancellation_rate([0, 0, 0]) == 0.0
@@ -0,0 +1,97 @@
+import re
+from datetime import date
+
+import pytest
+
+from controllers.archive import MEDICAL_RECORDS, Archiver, next_month
+
+
+class FakeConnection:
+    """A hot table and its archive; rows are eligible when their day is before the cutoff"""
+
+    def __init__(self, days, vanish=()):
+        self.hot = {record_id: day for record_id, day in enumerate(days, 1)}
+        self.archive = {}
+        self.vanish = set(vanish)
+        self.partitions = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.rowcount = 0
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=()):
+        sql = ' '.join(sql.split())
+        if sql.startswith('SELECT'):
+            ids = sorted(i for i, day in self.hot.items() if day < params[0])[:params[1]]
+            self.rows = [{'id': i, 'day': self.hot[i]} for i in ids]
+        elif sql.startswith('ALTER TABLE'):
+            self.partitions.extend(re.findall(r'PARTITION (p\d+) VALUES', sql))
+        elif sql.startswith('INSERT'):
+            ids = [i for i in params[:-1] if i in self.hot and self.hot[i] < params[-1]]
+            self.archive.update((i, self.hot[i]) for i in ids)
+            self.rowcount = len(ids)
+        elif sql.startswith('DELETE'):
+            ids = [i for i in params[:-1] if i in self.hot and i not in self.vanish]
+            for i in ids:
+                del self.hot[i]
+            self.rowcount = len(ids)
+
+    def fetchall(self):
+        return self.rows
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.archive.clear()
+
+    def close(self):
+        pass
+
+
+def state(bound=None):
+    return {'columns': 'record_id, patient_id, visit_date', 'bound': bound}
+
+
+def test_move_batch_moves_eligible_rows_in_batches():
+    conn = FakeConnection([date(2020, 1, 5), date(2020, 1, 9), date(2030, 1, 1), date(2020, 1, 20)])
+    archiver = Archiver([], batch_size=2)
+    cutoff = date(2025, 1, 1)
+
+    assert archiver.move_batch(conn, MEDICAL_RECORDS, state(date(2020, 2, 1)), cutoff) == 2
+    assert archiver.move_batch(conn, MEDICAL_RECORDS, state(date(2020, 2, 1)), cutoff) == 1
+    assert archiver.move_batch(conn, MEDICAL_RECORDS, state(date(2020, 2, 1)), cutoff) == 0
+    assert sorted(conn.archive) == [1, 2, 4]
+    assert list(conn.hot) == [3]
+
+
+def test_move_batch_rolls_back_when_delete_does_not_match_copy():
+    conn = FakeConnection([date(2020, 1, 5), date(2020, 1, 9)], vanish={2})
+    with pytest.raises(RuntimeError):
+        Archiver([]).move_batch(conn, MEDICAL_RECORDS, state(date(2020, 2, 1)), date(2025, 1, 1))
+    assert conn.rollbacks == 1
+    assert not conn.archive
+
+
+def test_partitions_added_for_each_new_month():
+    conn = FakeConnection([date(2023, 11, 15), date(2024, 1, 3)])
+    archiver = Archiver([])
+    archive_state = state()
+
+    archiver.move_batch(conn, MEDICAL_RECORDS, archive_state, date(2025, 1, 1))
+    assert conn.partitions == ['p202311', 'p202312', 'p202401']
+    assert archive_state['bound'] == date(2024, 2, 1)
+
+    # Months already below the bound are not split again, later ones roll over
+    conn.hot = {10: date(2024, 1, 20), 11: date(2024, 2, 2)}
+    archiver.move_batch(conn, MEDICAL_RECORDS, archive_state, date(2025, 1, 1))
+    assert conn.partitions == ['p202311', 'p202312', 'p202401', 'p202402']
+    assert archive_state['bound'] == date(2024, 3, 1)
+
+
+def test_next_month_rolls_over_the_year():
+    assert next_month(date(2024, 12, 31)) == date(2025, 1, 1)
+    assert next_month(date(2024, 1, 31)) == date(2024, 2, 1)
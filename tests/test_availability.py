@@ -0,0 +1,63 @@
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+from controllers.availability import SlotGrid, fold_booked, free_slots, matching_doctors, to_minutes
+
+
+def test_to_minutes_accepts_strings_times_and_timedeltas():
+    assert to_minutes('09:30') == 570
+    assert to_minutes('09:30:00') == 570
+    assert to_minutes(time(9, 30)) == 570
+    assert to_minutes(timedelta(hours=9, minutes=30)) == 570
+
+
+def test_grid_slots_and_labels():
+    grid = SlotGrid('09:00', '12:00', 30)
+    assert grid.count == 6
+    assert grid.index_of('10:00') == 2
+    assert grid.index_of('10:10') is None
+    assert grid.index_of('12:00') is None
+    assert grid.label(3) == '10:30'
+
+
+@pytest.mark.parametrize('value, slots', [
+    ('09:00', [0]),
+    ('09:10', [0, 1]),
+    ('08:50', [0]),
+    ('08:00', []),
+    ('11:45', [5]),
+    ('12:00', []),
+])
+def test_overlapping_rounds_off_grid_times_into_slots(value, slots):
+    grid = SlotGrid('09:00', '12:00', 30)
+    assert grid.overlapping(value) == sum(1 << i for i in slots)
+
+
+def test_off_grid_booking_blocks_overlapped_slots():
+    grid = SlotGrid('09:00', '11:00', 30)
+    day = date(2030, 1, 2)
+    booked = fold_booked([{'doctor_id': 1, 'appointment_date': day, 'appointment_time': timedelta(hours=9, minutes=40)}], grid)
+    result = free_slots([{'doctor_id': 1}], booked, day, day, grid, now=datetime(2030, 1, 1))
+    assert result[0]['slots'] == {'2030-01-02': ['09:00', '10:30']}
+
+
+def test_started_slots_today_are_taken():
+    grid = SlotGrid('09:00', '11:00', 30)
+    now = datetime(2030, 1, 2, 9, 45)
+    result = free_slots([{'doctor_id': 1}], {}, now.date(), now.date(), grid, now=now)
+    assert result[0]['slots'] == {'2030-01-02': ['10:00', '10:30']}
+
+
+def test_matching_doctors_filters_and_validates():
+    doctors = [
+        {'doctor_id': 1, 'specialization': 'Cardiology'},
+        {'doctor_id': 2, 'specialization': 'Neurology', 'is_active': False},
+        {'doctor_id': 3, 'specialization': 'neurology'},
+    ]
+    start = date(2030, 1, 1)
+    assert [d['doctor_id'] for d in matching_doctors(doctors, start, start, specialization='Neurology')] == [3]
+    with pytest.raises(ValueError):
+        matching_doctors(doctors, start, start - timedelta(days=1))
+    with pytest.raises(ValueError):
+        matching_doctors(doctors, start, start + timedelta(days=40))
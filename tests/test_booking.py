@@ -0,0 +1,92 @@
+from datetime import date
+
+import pymysql
+import pytest
+
+from controllers.booking import (BOOKED, FAILED, INVALID, SLOT_TAKEN, BookingEngine, BookingRequest,
+                                 parse_request, reserve_batch)
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.lastrowid = None
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append(sql.split()[0])
+        if not sql.lstrip().startswith('INSERT'):
+            return
+        error = self.conn.errors.get(params[3])
+        if error:
+            raise error
+        self.conn.next_id += 1
+        self.lastrowid = self.conn.next_id
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.statements = []
+        self.next_id = 0
+        self.committed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+
+def request(patient_id, time, doctor_id=1):
+    return BookingRequest(patient_id, doctor_id, date(2030, 1, 2), time, None)
+
+
+def test_parse_request_normalizes_fields():
+    req = parse_request(7, '3', '2030-01-02', '09:30', 'checkup')
+    assert req == BookingRequest(7, 3, date(2030, 1, 2), '09:30:00', 'checkup')
+
+
+@pytest.mark.parametrize('doctor_id, day, time', [
+    ('abc', '2030-01-02', '09:00'),
+    ('0', '2030-01-02', '09:00'),
+    ('1', '2030-02-30', '09:00'),
+    ('1', '2030-01-02', '25:00'),
+    ('1', 'tomorrow', '09:00'),
+])
+def test_parse_request_rejects_bad_input(doctor_id, day, time):
+    with pytest.raises(ValueError):
+        parse_request(7, doctor_id, day, time)
+
+
+def test_duplicate_slot_in_batch_is_taken():
+    conn = FakeConnection()
+    results = reserve_batch(conn, [request(1, '09:00:00'), request(2, '09:00:00')])
+    assert [r.status for r in results] == [BOOKED, SLOT_TAKEN]
+    assert conn.committed
+
+
+def test_bad_row_fails_alone():
+    conn = FakeConnection({
+        '10:00:00': pymysql.err.DataError(1292, 'Incorrect date value'),
+        '11:00:00': pymysql.err.IntegrityError(1452, 'foreign key'),
+        '12:00:00': pymysql.err.IntegrityError(1062, 'Duplicate entry'),
+    })
+    results = reserve_batch(conn, [request(1, '09:00:00'), request(2, '10:00:00'),
+                                   request(3, '11:00:00'), request(4, '12:00:00'),
+                                   request(5, '13:00:00')])
+    assert [r.status for r in results] == [BOOKED, INVALID, FAILED, SLOT_TAKEN, BOOKED]
+    assert conn.committed
+    assert conn.statements.count('ROLLBACK') == 3
+
+
+def test_submit_rejects_invalid_input_without_queueing():
+    engine = BookingEngine(mysql=None)
+    result = engine.submit(1, 'not-a-doctor', '2030-01-02', '09:00').result(timeout=1)
+    assert result.status == INVALID
+    assert not engine._threads
@@ -0,0 +1,244 @@
+import json
+import re
+
+import pymysql
+import pytest
+
+from controllers.validation import validate_patient
+from database import bulk_import
+from database.bulk_import import Importer, validate_doctor, validate_record
+
+UNIQUE = {'patients': ('email',), 'doctors': ('doctor_code', 'email')}
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.tables = {'patients': [], 'doctors': [], 'medical_records': []}
+        self.next_id = {'patients': 1, 'doctors': 1}
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        params = list(params)
+        select = re.match(r"SELECT (.+) FROM (\w+) WHERE (\w+) IN", sql)
+        if select:
+            columns = [column.strip() for column in select.group(1).split(',')]
+            table, where = select.group(2), select.group(3)
+            self.rows = [{column: row.get(column) for column in columns}
+                         for row in self.db.tables[table] if row.get(where) in params]
+            return
+        insert = re.match(r"INSERT (IGNORE )?INTO (\w+) \(([^)]*)\)", sql)
+        table = insert.group(2)
+        row = dict(zip([column.strip() for column in insert.group(3).split(',')], params))
+        for column in UNIQUE.get(table, ()):
+            if row.get(column) is not None and any(r.get(column) == row[column] for r in self.db.tables[table]):
+                if insert.group(1):
+                    return
+                raise pymysql.err.IntegrityError(1062, f"Duplicate entry for {column}")
+        key = {'patients': 'patient_id', 'doctors': 'doctor_id'}.get(table)
+        if key and row.get(key) is None:
+            row[key] = self.db.next_id[table]
+            self.db.next_id[table] += 1
+        self.db.tables[table].append(row)
+
+    def executemany(self, sql, seq):
+        for params in seq:
+            self.execute(sql, params)
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """Transactions are simulated by snapshotting the tables at the last commit"""
+
+    def __init__(self, db):
+        self.db = db
+        self.snapshot = json.dumps(db.tables)
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        self.snapshot = json.dumps(self.db.tables, default=str)
+
+    def rollback(self):
+        self.db.tables = json.loads(self.snapshot)
+
+
+class FakePool:
+    def __init__(self):
+        self.db = FakeDatabase()
+
+    def acquire(self):
+        return FakeConnection(self.db)
+
+    def release(self, conn):
+        pass
+
+
+class FakeRouter:
+    def __init__(self, shards=1):
+        self.catalog = FakePool()
+        self.pools = [FakePool() for _ in range(shards)] if shards > 1 else [self.catalog]
+        self.allocated = 100
+
+    @property
+    def sharded(self):
+        return len(self.pools) > 1
+
+    def allocate_patient_id(self):
+        self.allocated += 1
+        return self.allocated
+
+    def check_writable(self, patient_id):
+        pass
+
+    def pool_for(self, patient_id):
+        return self.pools[int(patient_id) % len(self.pools)]
+
+    def run_everywhere(self, sql, params=None):
+        results = []
+        for pool in self.pools:
+            cursor = FakeCursor(pool.db)
+            cursor.execute(sql, params)
+            results.append(cursor.fetchall())
+        return results
+
+
+@pytest.fixture(autouse=True)
+def plain_hash(monkeypatch):
+    monkeypatch.setattr(bulk_import, '_hash', lambda password, method: 'hashed:' + password)
+    monkeypatch.setattr(bulk_import, 'ProcessPoolExecutor', lambda **kwargs: ThreadlessExecutor())
+
+
+class ThreadlessExecutor:
+    def map(self, fn, *iterables, chunksize=1):
+        return map(fn, *iterables)
+
+    def shutdown(self):
+        pass
+
+
+def write_jsonl(tmp_path, rows):
+    path = tmp_path / 'import.jsonl'
+    path.write_text(''.join(json.dumps(row) + '\n' for row in rows), encoding='utf-8')
+    return str(path)
+
+
+def patient(email, **fields):
+    return dict({'full_name': 'Ann', 'age': '30', 'gender': 'F', 'phone': '555',
+                 'email': email, 'password': 'secret1'}, **fields)
+
+
+def doctor(code, email=None):
+    return {'doctor_code': code, 'full_name': 'Dr X', 'specialization': 'GP',
+            'email': email, 'password': 'secret1'}
+
+
+def rejects(importer):
+    with open(importer.rejects_path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_validate_patient_cleans_fields():
+    clean, error = validate_patient(patient(' Ann@Example.com ', age=' 42 ', address=''))
+    assert error is None
+    assert clean['email'] == 'ann@example.com' and clean['age'] == 42 and clean['address'] is None
+
+
+@pytest.mark.parametrize('fields, message', [
+    ({'full_name': ''}, 'required'),
+    ({'age': 'abc'}, 'valid age'),
+    ({'age': '0'}, 'valid age'),
+    ({'password': '123'}, 'at least'),
+])
+def test_validate_patient_rejects(fields, message):
+    assert message in validate_patient(patient('a@example.com', **fields))[1]
+
+
+def test_validate_patient_checks_confirmation():
+    assert validate_patient(patient('a@example.com'), confirm_password='other')[1] == 'Passwords do not match'
+
+
+def test_validate_doctor_and_record():
+    assert validate_doctor(doctor('D1', 'X@Example.com'))[0]['email'] == 'x@example.com'
+    assert validate_doctor(doctor(''))[1]
+    record, error = validate_record({'patient_id': '3', 'doctor_id': '1', 'visit_date': '2024-02-30',
+                                     'diagnosis': 'Flu'})
+    assert error.startswith('Invalid value')
+
+
+def test_duplicate_doctor_email_is_rejected_per_row(tmp_path):
+    router = FakeRouter()
+    router.catalog.db.tables['doctors'].append({'doctor_id': 1, 'doctor_code': 'D0', 'email': 'taken@example.com'})
+    path = write_jsonl(tmp_path, [doctor('D1', 'taken@example.com'), doctor('D2', 'new@example.com'),
+                                  doctor('D3', 'new@example.com'), doctor('D4')])
+    importer = Importer(router, 'doctors', path, workers=1)
+    stats = importer.run(progress=False)
+    assert stats['inserted'] == 2 and stats['rejected'] == 2
+    assert {r['reason'] for r in rejects(importer)} == {'Duplicate email'}
+    assert [row['doctor_code'] for row in router.catalog.db.tables['doctors']] == ['D0', 'D2', 'D4']
+
+
+def test_unique_race_rejects_only_the_offending_row(tmp_path, monkeypatch):
+    router = FakeRouter()
+    path = write_jsonl(tmp_path, [patient('a@example.com'), patient('b@example.com')])
+    importer = Importer(router, 'patients', path, workers=1)
+    # b@example.com registers between the check and the insert
+    checked = importer.checked
+
+    def racing(chunks, rejects):
+        for item in checked(chunks, rejects):
+            router.catalog.db.tables['patients'].append({'patient_id': 50, 'email': 'b@example.com'})
+            yield item
+
+    monkeypatch.setattr(importer, 'checked', racing)
+    stats = importer.run(progress=False)
+    assert stats['inserted'] == 1 and stats['rejected'] == 1
+    assert rejects(importer)[0]['data']['email'] == 'b@example.com'
+    assert 'password' not in rejects(importer)[0]['data']
+
+
+def test_patients_go_to_their_shard_with_catalog_ids(tmp_path):
+    router = FakeRouter(shards=2)
+    router.pools[1].db.tables['patients'].append({'patient_id': 7, 'email': 'dup@example.com'})
+    path = write_jsonl(tmp_path, [patient('a@example.com'), patient('b@example.com'), patient('dup@example.com')])
+    importer = Importer(router, 'patients', path, workers=1)
+    stats = importer.run(progress=False)
+    assert stats == {'read': 3, 'inserted': 2, 'rejected': 1, 'skipped': 0}
+    assert [row['patient_id'] for row in router.pools[1].db.tables['patients']] == [7, 101]
+    assert [row['patient_id'] for row in router.pools[0].db.tables['patients']] == [102]
+    assert router.catalog.db.tables['patients'] == []
+
+
+def test_doctors_are_copied_to_every_shard(tmp_path):
+    router = FakeRouter(shards=2)
+    importer = Importer(router, 'doctors', write_jsonl(tmp_path, [doctor('D1'), doctor('D2')]), workers=1)
+    importer.run(progress=False)
+    catalog = [(row['doctor_id'], row['doctor_code']) for row in router.catalog.db.tables['doctors']]
+    assert catalog == [(1, 'D1'), (2, 'D2')]
+    for pool in router.pools:
+        assert [(row['doctor_id'], row['doctor_code']) for row in pool.db.tables['doctors']] == catalog
+
+
+def test_records_follow_their_patient(tmp_path):
+    router = FakeRouter(shards=2)
+    router.catalog.db.tables['doctors'].append({'doctor_id': 1, 'doctor_code': 'D1'})
+    router.pools[0].db.tables['patients'].append({'patient_id': 4})
+    router.pools[1].db.tables['patients'].append({'patient_id': 5})
+    rows = [{'patient_id': pid, 'doctor_id': did, 'visit_date': '2024-01-02', 'diagnosis': 'Flu'}
+            for pid, did in ((4, 1), (5, 1), (6, 1), (5, 9))]
+    importer = Importer(router, 'records', write_jsonl(tmp_path, rows), workers=1)
+    stats = importer.run(progress=False)
+    assert stats['inserted'] == 2
+    assert [r['reason'] for r in rejects(importer)] == ['Unknown patient_id', 'Unknown doctor_id']
+    assert [row['patient_id'] for row in router.pools[0].db.tables['medical_records']] == [4]
+    assert [row['patient_id'] for row in router.pools[1].db.tables['medical_records']] == [5]
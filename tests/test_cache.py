@@ -0,0 +1,104 @@
+import asyncio
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from controllers.cache import DictBackend, ReadThroughCache, serializer
+
+
+def counting_loader(value):
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return value
+    loader.calls = calls
+    return loader
+
+
+def test_local_hit_skips_loader():
+    cache = ReadThroughCache('t', ttl=60)
+    loader = counting_loader(['a'])
+    assert cache.get('k', loader) == ['a']
+    assert cache.get('k', loader) == ['a']
+    assert len(loader.calls) == 1
+    assert cache.stats()['hits'] == 1
+
+
+def test_lru_eviction():
+    cache = ReadThroughCache('t', ttl=60, max_entries=2)
+    for key in ('a', 'b', 'c'):
+        cache.get(key, lambda: key)
+    assert cache.stats()['entries'] == 2
+    assert cache.stats()['evictions'] == 1
+
+
+def test_expired_entry_reloads():
+    cache = ReadThroughCache('t', ttl=-1)
+    loader = counting_loader(1)
+    cache.get('k', loader)
+    cache.get('k', loader)
+    assert len(loader.calls) == 2
+
+
+def test_get_async():
+    cache = ReadThroughCache('t', ttl=60)
+
+    async def loader():
+        return 5
+    assert asyncio.run(cache.get_async('k', loader)) == 5
+    assert asyncio.run(cache.get_async('k', loader)) == 5
+    assert cache.stats()['hits'] == 1
+
+
+def test_shared_tier_reused_by_second_process():
+    backend = DictBackend()
+    first = ReadThroughCache('doctors', backend=backend, check_interval=0)
+    second = ReadThroughCache('doctors', backend=backend, check_interval=0)
+    first.get('all', lambda: [{'doctor_id': 1}])
+    loader = counting_loader(None)
+    assert second.get('all', loader) == [{'doctor_id': 1}]
+    assert not loader.calls
+    assert second.stats()['shared_hits'] == 1
+
+
+def test_invalidation_reaches_other_processes_local_tier():
+    backend = DictBackend()
+    first = ReadThroughCache('doctors', backend=backend, check_interval=0)
+    second = ReadThroughCache('doctors', backend=backend, check_interval=0)
+    second.get('all', lambda: 'old')
+    first.invalidate('all')
+    assert second.get('all', lambda: 'new') == 'new'
+    assert second.stats()['remote_invalidations'] == 1
+
+
+def test_invalidate_everything_retires_shared_values():
+    backend = DictBackend()
+    first = ReadThroughCache('t', backend=backend, check_interval=0)
+    second = ReadThroughCache('t', backend=backend, check_interval=0)
+    first.get('a', lambda: 'old')
+    second.invalidate()
+    assert first.get('a', lambda: 'new') == 'new'
+
+
+def test_load_racing_an_invalidation_is_not_stored():
+    backend = DictBackend()
+    cache = ReadThroughCache('t', backend=backend, check_interval=0)
+    other = ReadThroughCache('t', backend=backend, check_interval=0)
+
+    def loader():
+        other.invalidate('k')
+        return 'stale'
+    assert cache.get('k', loader) == 'stale'
+    assert backend.get('t:k') is None
+    assert cache.get('k', lambda: 'fresh') == 'fresh'
+
+
+def test_serializer_round_trips_row_types():
+    row = {
+        'visit_date': date(2024, 5, 1),
+        'created_at': datetime(2024, 5, 1, 9, 30, 15, 123),
+        'appointment_time': timedelta(hours=9, minutes=30),
+        'fee': Decimal('12.50'),
+        'name': 'Dr. A',
+    }
+    assert serializer.loads(serializer.dumps([0, [row]])) == [0, [row]]
@@ -0,0 +1,82 @@
+import pytest
+from flask import Flask, session
+
+from controllers.cache import DictBackend
+from controllers.conditional import ConditionalPages, VersionStamps
+from controllers.events import record_saved
+
+
+@pytest.fixture
+def pages(monkeypatch):
+    monkeypatch.setattr(record_saved, 'listeners', [])
+    return ConditionalPages(VersionStamps(ttl=30).connect(), release='r1')
+
+
+@pytest.fixture
+def client(pages):
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    renders = []
+
+    @app.route('/records')
+    @pages(lambda: [('records', session['user_id'])] if session.get('user_type') == 'patient' else None)
+    def records():
+        renders.append(session['user_id'])
+        return f"records of {session['user_id']}"
+
+    @app.route('/login/<int:user_id>')
+    def login(user_id):
+        session['user_type'] = 'patient'
+        session['user_id'] = user_id
+        return 'ok'
+
+    client = app.test_client()
+    client.renders = renders
+    client.get('/login/1')
+    return client
+
+
+def test_matching_etag_gets_304_without_rendering(client):
+    first = client.get('/records')
+    assert first.status_code == 200 and first.headers['ETag']
+    again = client.get('/records', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert client.renders == [1]
+
+
+def test_unchanged_page_is_served_from_the_page_cache(client):
+    client.get('/records')
+    assert client.get('/records').get_data(as_text=True) == 'records of 1'
+    assert client.renders == [1]
+
+
+def test_write_hook_changes_the_etag(client):
+    etag = client.get('/records').headers['ETag']
+    record_saved.send(patient_id=1, record_id=7)
+    fresh = client.get('/records', headers={'If-None-Match': etag})
+    assert fresh.status_code == 200
+    assert fresh.headers['ETag'] != etag
+    assert client.renders == [1, 1]
+
+
+def test_other_patients_write_keeps_the_etag(client):
+    etag = client.get('/records').headers['ETag']
+    record_saved.send(patient_id=2, record_id=7)
+    assert client.get('/records', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_admin_edit_invalidates_every_page(client, pages):
+    etag = client.get('/records').headers['ETag']
+    pages.invalidate_all()
+    assert client.get('/records', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_stamps_expire_only_without_a_shared_backend():
+    local = VersionStamps(ttl=30)
+    local.get([('records', 1)])
+    assert local.backend._data['version:records:1'][1] is not None
+
+    shared = VersionStamps(backend=DictBackend(), ttl=30)
+    stamp = shared.get([('records', 1)])
+    assert shared.backend._data['version:records:1'][1] is None
+    assert shared.get([('records', 1)]) == stamp
@@ -0,0 +1,182 @@
+import json
+
+import pytest
+
+from controllers import notifications
+from controllers.jobs import JobQueue
+
+
+class FakeJobTable:
+    """Just enough of background_jobs for the queue's statements"""
+
+    def __init__(self):
+        self.jobs = []
+        self.deliveries = set()
+        self.lastrowid = None
+        self.rowcount = 0
+        self.result = []
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=()):
+        sql = ' '.join(sql.split())
+        if sql.startswith('INSERT IGNORE INTO background_jobs'):
+            kind, payload, dedupe_key, _ = params
+            if dedupe_key and any(job['dedupe_key'] == dedupe_key for job in self.jobs):
+                self.rowcount = 0
+                return
+            self.lastrowid = len(self.jobs) + 1
+            self.rowcount = 1
+            self.jobs.append({'job_id': self.lastrowid, 'kind': kind, 'payload': payload,
+                              'dedupe_key': dedupe_key, 'status': 'pending', 'attempts': 0})
+        elif sql.startswith('SELECT job_id, kind FROM background_jobs'):
+            self.result = [dict(job) for job in self.jobs
+                           if job['status'] == 'running' and job['attempts'] >= params[1]]
+        elif sql.startswith("UPDATE background_jobs SET status = 'pending' WHERE status = 'running'"):
+            for job in self.jobs:
+                if job['status'] == 'running' and job['attempts'] < params[1]:
+                    job['status'] = 'pending'
+        elif sql.startswith('SELECT appointment_id FROM reminder_deliveries'):
+            self.result = [{'appointment_id': i} for i in params[1:] if (params[0], i) in self.deliveries]
+        elif sql.startswith('INSERT IGNORE INTO reminder_deliveries'):
+            self.deliveries.add((params[1], params[0]))
+        elif sql.startswith('SELECT job_id, kind, payload, attempts'):
+            kinds, limit = params[:-1], params[-1]
+            self.result = [dict(job) for job in self.jobs
+                           if job['status'] == 'pending' and (not kinds or job['kind'] in kinds)][:limit]
+        elif "SET status = 'running'" in sql:
+            for job in self.jobs:
+                if job['job_id'] in params[1:]:
+                    job['status'] = 'running'
+                    job['attempts'] += 1
+        elif sql.startswith('UPDATE background_jobs SET payload'):
+            self.job(params[1])['payload'] = params[0]
+        elif "SET status = 'done'" in sql:
+            self.job(params[0])['status'] = 'done'
+        elif "SET status = 'failed'" in sql:
+            self.job(params[1])['status'] = 'failed'
+        elif "SET status = 'pending', last_error" in sql:
+            self.job(params[2])['status'] = 'pending'
+
+    def job(self, job_id):
+        return next(job for job in self.jobs if job['job_id'] == job_id)
+
+    def fetchall(self):
+        return self.result
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeMySQL:
+    def __init__(self):
+        self.table = FakeJobTable()
+        self.pool = self
+
+    def acquire(self):
+        return self.table
+
+    def release(self, conn):
+        pass
+
+
+@pytest.fixture
+def queue():
+    return JobQueue(FakeMySQL(), workers=2, max_attempts=2, autostart=False)
+
+
+def test_enqueue_without_autostart_starts_no_threads(queue):
+    queue.handler('noop')(lambda payload: None)
+    assert queue.enqueue('noop', {}) == 1
+    assert queue.stats()['workers'] == 0
+
+
+def test_unknown_kind_is_refused(queue):
+    with pytest.raises(ValueError):
+        queue.enqueue('nope', {})
+
+
+def test_dedupe_key_queues_once(queue):
+    queue.handler('noop')(lambda payload: None)
+    assert queue.enqueue('noop', {}, dedupe_key='k') == 1
+    assert queue.enqueue('noop', {}, dedupe_key='k') is None
+
+
+def test_drain_runs_follow_up_jobs_of_the_given_kinds(queue):
+    seen = []
+    queue.handler('parent')(lambda payload: queue.enqueue('child', {'n': payload['n'] + 1}))
+    queue.handler('child')(lambda payload: seen.append(payload['n']))
+    queue.handler('other')(lambda payload: seen.append('other'))
+    queue.enqueue('other', {})
+    queue.enqueue('parent', {'n': 1})
+    assert queue.drain(('parent', 'child')) == 2
+    assert seen == [2]
+    assert [job['status'] for job in queue.mysql.table.jobs] == ['pending', 'done', 'done']
+
+
+def test_failures_retry_then_fail(queue):
+    def boom(payload):
+        raise RuntimeError('gateway down')
+    queue.handler('boom')(boom)
+    queue.enqueue('boom', {'x': 1})
+    queue.run_pending()
+    assert queue.mysql.table.jobs[0]['status'] == 'pending'
+    queue.run_pending()
+    assert queue.mysql.table.jobs[0]['status'] == 'failed'
+    assert queue.stats()['retried'] == 1 and queue.stats()['failed'] == 1
+    assert json.loads(queue.mysql.table.jobs[0]['payload']) == {'x': 1}
+
+
+def test_reset_link_payload_is_scrubbed_once_sent(queue, monkeypatch):
+    sent = []
+    monkeypatch.setattr(notifications, 'deliver', lambda to, subject, body: sent.append(body))
+    notifications.register(queue, queue.mysql)
+    queue.enqueue('reset_link', {'email': 'a@example.com', 'full_name': 'Ann',
+                                 'link': 'https://example.com/reset-password/secret'})
+    assert 'secret' in queue.mysql.table.jobs[0]['payload']
+    queue.drain()
+    assert sent == ['https://example.com/reset-password/secret']
+    assert queue.mysql.table.jobs[0]['payload'] == '{}'
+
+
+def test_stale_running_jobs_are_requeued_until_out_of_attempts(queue):
+    queue.handler('reset_link', scrub=True)(lambda payload: None)
+    queue.enqueue('reset_link', {'link': 'secret'})
+    queue.enqueue('reset_link', {'link': 'other'})
+    # Both claimed by a worker that then died; the first on its last attempt
+    first, second = queue.mysql.table.jobs
+    first.update(status='running', attempts=2)
+    second.update(status='running', attempts=1)
+    queue._housekeeping(queue.mysql.table)
+    assert first['status'] == 'failed' and first['payload'] == '{}'
+    assert second['status'] == 'pending'
+    assert queue.stats()['failed'] == 1
+
+
+def test_retried_reminder_batch_only_sends_missing_reminders(queue, monkeypatch):
+    sent = []
+
+    def deliver(to, subject, body):
+        if to == 'b@example.com' and 'b@example.com' not in sent:
+            sent.append(to)
+            raise RuntimeError('gateway down')
+        sent.append(to)
+
+    monkeypatch.setattr(notifications, 'deliver', deliver)
+    notifications.register(queue, queue.mysql)
+    rows = [{'appointment_id': i, 'appointment_date': '2030-01-02', 'appointment_time': '09:00:00',
+             'patient_name': 'P', 'patient_email': f'{name}@example.com', 'patient_phone': None,
+             'doctor_name': 'D'} for i, name in enumerate('abc', 1)]
+    queue.enqueue('reminder_batch', {'appointments': rows})
+    queue.run_pending()
+    assert queue.mysql.table.jobs[0]['status'] == 'pending'
+    queue.run_pending()
+    assert queue.mysql.table.jobs[0]['status'] == 'done'
+    assert sent == ['a@example.com', 'b@example.com', 'b@example.com', 'c@example.com']
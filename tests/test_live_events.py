@@ -0,0 +1,80 @@
+import pytest
+
+from controllers.live_events import BrokerFull, EventBroker, format_event
+
+
+def kinds(subscription):
+    return [kind for _, kind, _ in subscription.drain()]
+
+
+def publish(broker, channel, n):
+    broker.publish([channel], 'appointment', {'n': n})
+
+
+def test_subscribers_get_events_of_their_channels_only():
+    broker = EventBroker()
+    doctor = broker.subscribe(['doctor:1'])
+    patient = broker.subscribe(['patient:2'])
+    publish(broker, 'doctor:1', 1)
+    assert [data for _, _, data in doctor.drain()] == ['{"n": 1}']
+    assert patient.drain() == []
+
+
+def test_reconnect_replays_missed_history():
+    broker = EventBroker(history=10)
+    first = broker.subscribe(['doctor:1'])
+    for n in range(3):
+        publish(broker, 'doctor:1', n)
+    seen = first.drain()
+    first.close()
+
+    again = broker.subscribe(['doctor:1'], last_event_id=seen[0][0])
+    assert again.drain() == seen[1:]
+
+
+def test_reconnect_from_another_instance_gets_resync():
+    broker = EventBroker()
+    publish(broker, 'doctor:1', 1)
+    assert kinds(broker.subscribe(['doctor:1'], last_event_id='0000-1')) == ['resync']
+
+
+def test_reconnect_past_history_gets_resync():
+    broker = EventBroker(history=2)
+    sub = broker.subscribe(['doctor:1'])
+    for n in range(5):
+        publish(broker, 'doctor:1', n)
+    oldest = sub.drain()[0][0]
+    assert kinds(broker.subscribe(['doctor:1'], last_event_id=oldest)) == ['resync']
+
+
+def test_evicted_channel_history_gets_resync():
+    broker = EventBroker(max_channels=1)
+    sub = broker.subscribe(['doctor:1'])
+    publish(broker, 'doctor:1', 1)
+    last_seen = sub.drain()[0][0]
+    publish(broker, 'doctor:1', 2)
+    publish(broker, 'doctor:2', 3)
+    assert kinds(broker.subscribe(['doctor:1'], last_event_id=last_seen)) == ['resync']
+
+
+def test_slow_subscriber_is_told_to_resync():
+    broker = EventBroker(max_pending=2)
+    sub = broker.subscribe(['doctor:1'])
+    for n in range(3):
+        publish(broker, 'doctor:1', n)
+    assert kinds(sub) == ['resync']
+
+
+def test_subscriber_cap():
+    broker = EventBroker(max_subscribers=1)
+    sub = broker.subscribe(['doctor:1'])
+    with pytest.raises(BrokerFull):
+        broker.subscribe(['doctor:2'])
+    sub.close()
+    sub.close()
+    broker.subscribe(['doctor:2'])
+    assert broker.stats()['subscribers'] == 1 and broker.stats()['rejected'] == 1
+
+
+def test_format_event():
+    assert format_event(('ab-1', 'resync', '{}')) == 'id: ab-1\nevent: resync\ndata: {}\n\n'
@@ -0,0 +1,112 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from controllers.passwords import HashingBusy, PasswordService, hash_method
+
+METHOD = 'pbkdf2:sha256:1000'
+
+
+class NeverDone:
+    def submit(self, fn, *args):
+        return Future()
+
+    def shutdown(self, **kwargs):
+        pass
+
+
+class Broken:
+    def __init__(self):
+        self.shut_down = False
+
+    def submit(self, fn, *args):
+        raise BrokenProcessPool("worker died")
+
+    def shutdown(self, **kwargs):
+        self.shut_down = True
+
+
+class FakeMySQL:
+    def __init__(self, user):
+        self.user = user
+
+    @property
+    def connection(self):
+        return self
+
+    def everywhere(self):
+        return self
+
+    def patient_connection(self, patient_id, primary=False):
+        return self
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params):
+        pass
+
+    def fetchone(self):
+        return self.user
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def service():
+    service = PasswordService(workers=1, max_pending=2, timeout=0.05, method=METHOD)
+    service._executor = ThreadPoolExecutor(max_workers=2)
+    yield service
+    service.shutdown()
+
+
+def test_hash_and_verify(service):
+    pwhash = service.hash('secret')
+    assert hash_method(pwhash) == METHOD
+    assert service.verify(pwhash, 'secret')
+    assert not service.verify(pwhash, 'wrong')
+
+
+def test_timeout_is_busy(service):
+    service._executor = NeverDone()
+    with pytest.raises(HashingBusy):
+        service.verify('hash', 'password')
+    assert service.stats()['failures'] == 1
+
+
+def test_full_queue_is_busy(service):
+    service._executor = NeverDone()
+    for _ in range(2):
+        with pytest.raises(HashingBusy):
+            service.verify('hash', 'password')
+    with pytest.raises(HashingBusy, match='full'):
+        service.verify('hash', 'password')
+    assert service.stats()['rejected'] == 1
+
+
+def test_broken_pool_is_busy_and_replaced(service):
+    broken = service._executor = Broken()
+    with pytest.raises(HashingBusy):
+        service.verify('hash', 'password')
+    assert broken.shut_down
+    assert service._executor is None
+
+
+def test_unknown_user_still_verifies(service):
+    calls = []
+    verify = service.verify
+    service.verify = lambda pwhash, password: calls.append(pwhash) or verify(pwhash, password)
+    assert service.authenticate(FakeMySQL(None), 'patient', 'nobody@example.com', 'guess') is None
+    assert len(calls) == 1
+
+
+def test_authenticate_rehashes_old_method(service):
+    user = {'patient_id': 1, 'password': generate_password_hash('secret', method='pbkdf2:sha256:500')}
+    assert service.authenticate(FakeMySQL(user), 'patient', 'a@example.com', 'secret') is user
+    assert service.stats()['rehashed'] == 1
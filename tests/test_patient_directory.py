@@ -0,0 +1,90 @@
+from controllers.patient_directory import PatientPage, build_query, decode_cursor, encode_cursor
+
+PATIENTS = [{'patient_id': i, 'full_name': name} for i, name in
+            enumerate(['Ann', 'Bob', 'Cat', 'Dan', 'Eve', 'Fay', 'Gus'], start=1)]
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.closed = False
+
+    def execute(self, sql, params):
+        key = lambda row: (row['full_name'], row['patient_id'])
+        rows = sorted(self.rows, key=key)
+        if 'full_name >' in sql:
+            rows = [row for row in rows if key(row) > (params[0], params[2])]
+        if 'full_name <' in sql:
+            rows = [row for row in rows if key(row) < (params[0], params[2])]
+        if 'DESC' in sql:
+            rows.reverse()
+        self.result = iter(rows[:params[-1]])
+
+    def fetchone(self):
+        return next(self.result, None)
+
+    def fetchall(self):
+        return list(self.result)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def cursor(self, cursorclass=None):
+        self.last = FakeCursor(PATIENTS)
+        return self.last
+
+
+def names(page):
+    return [row['full_name'] for row in page]
+
+
+def test_cursor_round_trip_and_bad_input():
+    row = PATIENTS[2]
+    assert decode_cursor(encode_cursor(row)) == ('Cat', 3)
+    assert decode_cursor('not a cursor') is None
+    assert decode_cursor(None) is None
+
+
+def test_search_escapes_like_wildcards():
+    sql, params = build_query(search='50%_x')
+    assert params[0] == '50\\%\\_x%'
+
+
+def test_forward_pages_and_cursors():
+    first = PatientPage(FakeConnection(), limit=3)
+    assert names(first) == ['Ann', 'Bob', 'Cat']
+    assert first.prev_cursor is None
+
+    second = PatientPage(FakeConnection(), after=decode_cursor(first.next_cursor), limit=3)
+    assert names(second) == ['Dan', 'Eve', 'Fay']
+    assert decode_cursor(second.prev_cursor) == ('Dan', 4)
+
+    last = PatientPage(FakeConnection(), after=decode_cursor(second.next_cursor), limit=3)
+    assert names(last) == ['Gus']
+    assert last.next_cursor is None
+
+
+def test_backward_page():
+    page = PatientPage(FakeConnection(), before=decode_cursor(encode_cursor(PATIENTS[5])), limit=3)
+    assert names(page) == ['Cat', 'Dan', 'Eve']
+    assert decode_cursor(page.prev_cursor) == ('Cat', 3)
+    assert decode_cursor(page.next_cursor) == ('Eve', 5)
+
+
+def test_len_buffers_page_and_iteration_still_works():
+    conn = FakeConnection()
+    page = PatientPage(conn, limit=3)
+    assert len(page) == 3
+    assert conn.last.closed
+    assert decode_cursor(page.next_cursor) == ('Cat', 3)
+    assert names(page) == ['Ann', 'Bob', 'Cat']
+    assert len(page) == 3
+
+
+def test_empty_page():
+    page = PatientPage(FakeConnection(), after=('Zed', 99), limit=3)
+    assert not page
+    assert len(page) == 0
+    assert names(page) == []
@@ -0,0 +1,105 @@
+import threading
+
+import pytest
+
+from database import pool as pool_module
+from database.pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self):
+        self.open = True
+        self.rolled_back = 0
+        self.pings = 0
+
+    def rollback(self):
+        self.rolled_back += 1
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if not self.open:
+            raise ConnectionError("gone")
+
+    def close(self):
+        self.open = False
+
+
+@pytest.fixture
+def connect(monkeypatch):
+    made = []
+    failures = []
+
+    def fake_connect(**kwargs):
+        if failures and failures.pop(0):
+            raise ConnectionError("refused")
+        conn = FakeConnection()
+        made.append(conn)
+        return conn
+
+    monkeypatch.setattr(pool_module.pymysql, 'connect', fake_connect)
+    fake_connect.made = made
+    fake_connect.failures = failures
+    return fake_connect
+
+
+def test_rejects_invalid_sizes():
+    with pytest.raises(ValueError):
+        ConnectionPool({}, min_size=3, max_size=2)
+
+
+def test_acquire_reuses_released_connection(connect):
+    pool = ConnectionPool({}, max_size=2)
+    conn = pool.acquire()
+    pool.release(conn)
+    assert pool.acquire() is conn
+    assert conn.rolled_back == 1
+    assert pool.stats()['created'] == 1
+
+
+def test_acquire_times_out_when_exhausted(connect):
+    pool = ConnectionPool({}, max_size=1, timeout=0.05)
+    pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    stats = pool.stats()
+    assert stats['timeouts'] == 1
+    assert stats['exhausted'] == 1
+
+
+def test_release_wakes_waiter(connect):
+    pool = ConnectionPool({}, max_size=1, timeout=2)
+    conn = pool.acquire()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+    waiter.start()
+    pool.release(conn)
+    waiter.join(2)
+    assert got == [conn]
+
+
+def test_closed_connection_is_discarded_on_release(connect):
+    pool = ConnectionPool({}, max_size=1)
+    conn = pool.acquire()
+    conn.close()
+    pool.release(conn)
+    assert pool.stats()['size'] == 0
+    assert pool.acquire() is not conn
+
+
+def test_warm_opens_min_size(connect):
+    pool = ConnectionPool({}, min_size=3, max_size=5)
+    pool.warm()
+    stats = pool.stats()
+    assert stats['size'] == 3
+    assert stats['idle'] == 3
+
+
+def test_failed_warm_releases_every_reservation(connect):
+    connect.failures.extend([False, True])
+    pool = ConnectionPool({}, min_size=4, max_size=4, timeout=0.05)
+    with pytest.raises(ConnectionError):
+        pool.warm()
+    assert pool.stats()['size'] == 1
+    # All four slots are usable again, not just the one that failed
+    conns = [pool.acquire() for _ in range(4)]
+    assert len(set(map(id, conns))) == 4
@@ -0,0 +1,130 @@
+import csv
+import io
+import re
+from datetime import date
+
+from controllers import pdf_stream, record_export
+from controllers.pdf_stream import LINES_PER_PAGE, escape, render_lines
+from controllers.record_export import EXPORT_COLUMNS, csv_chunks, export_chunks
+
+
+def record(record_id, **fields):
+    row = dict.fromkeys(EXPORT_COLUMNS)
+    row.update(record_id=record_id, visit_date=date(2024, 1, record_id), patient_id=1, patient_name='Ann',
+               doctor_id=2, doctor_name='House', diagnosis='Flu')
+    row.update(fields)
+    return row
+
+
+def check_xref(pdf):
+    """Every xref entry must point at the start of its object"""
+    startxref = int(re.search(rb"startxref\n(\d+)\n%%EOF\n$", pdf).group(1))
+    assert pdf[startxref:].startswith(b"xref\n")
+    size = int(re.search(rb"xref\n0 (\d+)\n", pdf).group(1))
+    entries = re.findall(rb"(\d{10}) 00000 n \n", pdf[startxref:])
+    assert len(entries) == size - 1
+    for obj_id, offset in enumerate(entries, start=1):
+        assert pdf[int(offset):].startswith(b"%d 0 obj\n" % obj_id)
+
+
+def test_escape():
+    assert escape('a (b) \\ c') == 'a \\(b\\) \\\\ c'
+    assert escape('naïve ✓') == 'naïve ?'
+
+
+def test_single_page_document():
+    pdf = b''.join(render_lines(['hello (world)'], title='Records'))
+    assert pdf.startswith(b'%PDF-1.4')
+    assert b'/Count 1' in pdf
+    assert b'(hello \\(world\\)) Tj' in pdf
+    check_xref(pdf)
+
+
+def test_long_documents_are_paged_and_wrapped():
+    lines = ['x' * 250] + ['line %d' % i for i in range(LINES_PER_PAGE * 2)]
+    chunks = list(render_lines(lines, title='T'))
+    pdf = b''.join(chunks)
+    pages = int(re.search(rb"/Count (\d+)", pdf).group(1))
+    assert pages == 3
+    # header, one chunk per page, trailer
+    assert len(chunks) == pages + 2
+    assert b'(T    page 3) Tj' in pdf
+    check_xref(pdf)
+
+
+def test_empty_document_still_has_a_page():
+    pdf = b''.join(render_lines([]))
+    assert b'/Count 1' in pdf
+    check_xref(pdf)
+
+
+def test_csv_export_streams_in_chunks(monkeypatch):
+    monkeypatch.setattr(record_export, 'CHUNK_BYTES', 200)
+    rows = [record(i, notes=None, symptoms='cough, fever') for i in range(1, 11)]
+    chunks = list(csv_chunks(iter(rows)))
+    assert len(chunks) > 2
+    parsed = list(csv.DictReader(io.StringIO(b''.join(chunks).decode('utf-8'))))
+    assert [int(row['record_id']) for row in parsed] == list(range(1, 11))
+    assert parsed[0]['symptoms'] == 'cough, fever' and parsed[0]['notes'] == ''
+
+
+def test_pdf_export_describes_each_record():
+    rows = [record(1, prescription='Rest', follow_up_date=date(2024, 2, 1)), record(2, doctor_name=None)]
+    pdf = b''.join(export_chunks(iter(rows), 'pdf', title='Ann'))
+    assert b'(Prescription: Rest) Tj' in pdf
+    assert b'(Follow-up: 2024-02-01) Tj' in pdf
+    assert b'Dr. Unknown' in pdf
+    assert b'Symptoms' not in pdf
+    check_xref(pdf)
+
+
+def test_page_bytes_are_not_buffered_across_pages(monkeypatch):
+    monkeypatch.setattr(pdf_stream, 'LINES_PER_PAGE', 3)
+    sizes = [len(chunk) for chunk in render_lines(('line %d' % i for i in range(30)))][1:-1]
+    assert len(sizes) == 10 and max(sizes) - min(sizes) < 10
+
+
+class Cursor:
+    def __init__(self, executed):
+        self.executed = executed
+
+    def execute(self, sql, params):
+        self.executed.append((sql, params))
+
+    def __iter__(self):
+        return iter([record(1)])
+
+    def close(self):
+        pass
+
+
+class Pool:
+    def __init__(self):
+        self.executed = []
+        self.released = False
+
+    def acquire(self):
+        return self
+
+    def cursor(self, cursorclass=None):
+        return Cursor(self.executed)
+
+    def release(self, conn):
+        self.released = True
+
+
+def test_export_reads_the_archive_when_archiving():
+    pool = Pool()
+    assert len(list(record_export.patient_rows(pool, 7, archived=True))) == 1
+    sql, params = pool.executed[0]
+    assert 'FROM medical_records r' in sql and 'FROM medical_records_archive r' in sql
+    assert sql.count('r.patient_id = %s') == 2 and params == (7, 7)
+    assert sql.rstrip().endswith('ORDER BY visit_date, record_id')
+    assert pool.released
+
+
+def test_export_without_archive_reads_hot_table_only():
+    pool = Pool()
+    list(record_export.patient_rows(pool, 7))
+    sql, params = pool.executed[0]
+    assert 'medical_records_archive' not in sql and params == (7,)
@@ -0,0 +1,66 @@
+from datetime import date
+
+from controllers import record_search
+from controllers.record_search import PAGE_SIZE, boolean_query, rank_key, search
+from database.sharding import FanOutConnection
+
+
+def row(record_id, score, day=1):
+    return {'record_id': record_id, 'score': score, 'visit_date': date(2024, 1, day)}
+
+
+def ranked(rows):
+    return sorted(rows, key=rank_key, reverse=True)
+
+
+class FakeRouter:
+    """Each shard answers the window query with its own ranked rows"""
+
+    def __init__(self, *shards):
+        self.shards = shards
+        self.calls = []
+
+    def run_everywhere(self, sql, params=None):
+        self.calls.append((sql, params))
+        limit = params[-1]
+        return [ranked(rows)[:limit] for rows in self.shards]
+
+
+def test_boolean_query_builds_required_prefix_terms():
+    assert boolean_query('Amoxi +fever -"cough"') == '+amoxi* +fever* +cough*'
+    assert boolean_query("o'neil follow-up ab") == '+oneil* +follow*'
+    assert boolean_query('a an') == ''
+    assert len(boolean_query(' '.join(f'term{i}' for i in range(20))).split()) == record_search.MAX_TERMS
+
+
+def test_blank_query_does_not_touch_the_database():
+    assert search(None, '  ') == ([], False)
+
+
+def test_window_and_filters_are_passed_to_every_shard():
+    router = FakeRouter([row(1, 2.0)], [row(2, 1.0)])
+    conn = FanOutConnection(router, key=rank_key, reverse=True)
+    results, has_more = search(conn, 'fever', doctor_id=4, date_from=date(2024, 1, 1), page=3)
+    sql, params = router.calls[0]
+    assert 'AND r.doctor_id = %s' in sql and 'AND r.visit_date >= %s' in sql
+    assert params == ['+fever*', '+fever*', 4, date(2024, 1, 1), 3 * PAGE_SIZE + 1]
+    assert results == [] and not has_more
+
+
+def test_shards_are_merged_by_rank_and_paged():
+    one = [row(i, float(i % 7), day=i % 28 + 1) for i in range(1, 60, 2)]
+    two = [row(i, float(i % 7), day=i % 28 + 1) for i in range(2, 60, 2)]
+    conn = FanOutConnection(FakeRouter(one, two), key=rank_key, reverse=True)
+    everything = ranked(one + two)
+    first, more = search(conn, 'fever', page=1)
+    second, _ = search(conn, 'fever', page=2)
+    third, last_more = search(conn, 'fever', page=3)
+    assert first == everything[:PAGE_SIZE] and more
+    assert second == everything[PAGE_SIZE:2 * PAGE_SIZE]
+    assert third == everything[2 * PAGE_SIZE:] and not last_more
+
+
+def test_page_is_clamped():
+    router = FakeRouter([])
+    search(FanOutConnection(router), 'fever', page=999)
+    assert router.calls[0][1][-1] == record_search.MAX_PAGES * PAGE_SIZE + 1
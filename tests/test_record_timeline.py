@@ -0,0 +1,103 @@
+from datetime import date
+
+from controllers.cache import DictBackend
+from controllers.record_timeline import ARCHIVE_CURSOR, RecordTimeline, decode_cursor, encode_cursor
+
+
+def record(record_id, day):
+    return {'record_id': record_id, 'visit_date': date(2024, 1, day), 'patient_id': 1}
+
+
+class FakeMySQL:
+    """Serves the hot table and the archive from lists, newest first, honouring the cursor"""
+
+    def __init__(self, hot, archived=()):
+        self.tables = {'medical_records': hot, 'medical_records_archive': list(archived)}
+        self.queries = []
+
+    def patient_connection(self, patient_id, primary=False):
+        return self
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params):
+        table = 'medical_records_archive' if 'medical_records_archive' in sql else 'medical_records'
+        self.queries.append((table, 'r.tests_recommended, r.notes' in sql))
+        rows = self.tables[table]
+        if len(params) > 2:
+            cursor = (params[1], params[3])
+            rows = [row for row in rows if (row['visit_date'], row['record_id']) < cursor]
+        self.rows = rows[:params[-1]]
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def close(self):
+        pass
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(record(7, 3))) == (date(2024, 1, 3), 7)
+    assert decode_cursor('garbage') is None
+
+
+def test_pages_follow_cursor():
+    mysql = FakeMySQL([record(i, i) for i in range(5, 0, -1)])
+    timeline = RecordTimeline(mysql, page_size=2)
+    first = timeline.page(1)
+    assert [r['record_id'] for r in first['records']] == [5, 4]
+    second = timeline.page(1, first['next_cursor'])
+    assert [r['record_id'] for r in second['records']] == [3, 2]
+    last = timeline.page(1, second['next_cursor'])
+    assert [r['record_id'] for r in last['records']] == [1]
+    assert last['next_cursor'] is None
+
+
+def test_full_text_columns_are_optional():
+    mysql = FakeMySQL([record(1, 1)])
+    RecordTimeline(mysql).page(1)
+    RecordTimeline(mysql, full_text=True).page(1)
+    assert [full for _, full in mysql.queries] == [False, True]
+
+
+def test_newest_page_is_cached_and_invalidated_across_processes():
+    backend = DictBackend()
+    mysql = FakeMySQL([record(1, 1)])
+    worker_a = RecordTimeline(mysql, backend=backend)
+    worker_b = RecordTimeline(mysql, backend=backend)
+    worker_a.cache.check_interval = worker_b.cache.check_interval = 0
+    worker_b.page(1)
+    mysql.tables['medical_records'] = [record(2, 2), record(1, 1)]
+    worker_a.on_record_saved(patient_id=1)
+    assert [r['record_id'] for r in worker_b.page(1)['records']] == [2, 1]
+
+
+def test_archive_read_only_for_older_pages():
+    mysql = FakeMySQL([record(9, 9), record(8, 8)], archived=[record(i, i) for i in range(5, 0, -1)])
+    timeline = RecordTimeline(mysql, page_size=3, archived=True)
+    newest = timeline.page(1)
+    assert [r['record_id'] for r in newest['records']] == [9, 8]
+    # The hot page, then only the probe for older archived rows
+    assert [table for table, _ in mysql.queries] == ['medical_records', 'medical_records_archive']
+
+    older = timeline.page(1, newest['next_cursor'])
+    assert [r['record_id'] for r in older['records']] == [5, 4, 3]
+    assert older['next_cursor'] is not None
+
+
+def test_archive_cursor_for_patient_without_hot_records():
+    mysql = FakeMySQL([], archived=[record(1, 1)])
+    timeline = RecordTimeline(mysql, archived=True)
+    newest = timeline.page(1)
+    assert newest == {'records': [], 'next_cursor': ARCHIVE_CURSOR}
+    assert [r['record_id'] for r in timeline.page(1, ARCHIVE_CURSOR)['records']] == [1]
+
+
+def test_no_older_cursor_when_archive_is_empty():
+    mysql = FakeMySQL([record(2, 2), record(1, 1)])
+    assert RecordTimeline(mysql, archived=True).page(1)['next_cursor'] is None
+    assert RecordTimeline(FakeMySQL([]), archived=True).page(1) == {'records': [], 'next_cursor': None}
@@ -0,0 +1,117 @@
+import pytest
+from flask import Flask, session
+
+from database.replicas import ReplicaSet
+
+
+class FakePool:
+    def __init__(self, status=None, down=False):
+        self.status = status
+        self.down = down
+        self.checked_out = 0
+
+    def acquire(self):
+        if self.down:
+            raise ConnectionError('refused')
+        self.checked_out += 1
+        return self
+
+    def release(self, conn):
+        self.checked_out -= 1
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchone(self):
+        return self.status
+
+    def close(self):
+        pass
+
+
+def replica_set(*pools, max_lag=5):
+    replicas = ReplicaSet({}, [(f'db{i}', 3306) for i in range(len(pools))], max_lag=max_lag,
+                          check_interval=0, sticky_seconds=10)
+    for replica, pool in zip(replicas.replicas, pools):
+        replica.pool = pool
+    return replicas
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    return app
+
+
+def test_lagging_and_stopped_replicas_leave_rotation():
+    fresh = FakePool({'Seconds_Behind_Source': 1})
+    lagging = FakePool({'Seconds_Behind_Source': 60})
+    stopped = FakePool({'Seconds_Behind_Source': None})
+    replicas = replica_set(fresh, lagging, stopped)
+    replicas.check()
+    assert [r.healthy for r in replicas.replicas] == [True, False, False]
+    assert {replicas.acquire()[1] for _ in range(4)} == {fresh}
+
+    lagging.status = {'Seconds_Behind_Master': 2}
+    replicas.check()
+    assert {replicas.acquire()[1] for _ in range(4)} == {fresh, lagging}
+    assert replicas.stats()['healthy'] == 2
+
+
+def test_no_healthy_replica_falls_back_to_primary():
+    replicas = replica_set(FakePool(down=True))
+    assert replicas.acquire() == (None, None)
+    assert replicas.stats()['fallbacks'] == 1
+    assert not replicas.replicas[0].healthy
+
+
+def test_get_reads_from_a_replica_once_per_request(app):
+    pool = FakePool()
+    replicas = replica_set(pool)
+    with app.test_request_context('/'):
+        assert replicas.request_connection() is pool
+        assert replicas.request_connection() is pool
+        assert pool.checked_out == 1
+        replicas.release()
+    assert pool.checked_out == 0
+    with app.test_request_context('/', method='POST'):
+        assert replicas.request_connection() is None
+
+
+def test_use_primary_pins_the_rest_of_the_request(app):
+    replicas = replica_set(FakePool())
+    with app.test_request_context('/'):
+        replicas.use_primary()
+        assert replicas.request_connection() is None
+
+
+def test_reads_stick_to_the_primary_after_a_write(app):
+    replicas = replica_set(FakePool())
+    app.after_request(replicas.remember_write)
+    seen = []
+
+    @app.route('/read')
+    def read():
+        seen.append(replicas.request_connection() is not None)
+        return 'ok'
+
+    @app.route('/write', methods=['POST'])
+    def write():
+        return 'ok'
+
+    @app.route('/expire')
+    def expire():
+        session['_primary_until'] = 0
+        return 'ok'
+
+    client = app.test_client()
+    client.get('/read')
+    client.post('/write')
+    client.get('/read')
+    client.get('/expire')
+    client.get('/read')
+    assert seen == [True, False, True]
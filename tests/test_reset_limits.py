@@ -0,0 +1,73 @@
+import pytest
+
+from controllers import cache
+from controllers.cache import DictBackend
+from controllers.ratelimit import RateLimiter
+from controllers.reset_tokens import ExpiredTokenSweeper, ResetTokenCoalescer
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, 'time', clock.time)
+    return clock
+
+
+def test_bucket_allows_burst_then_limits(clock):
+    limiter = RateLimiter('t', per_minute=60, burst=3)
+    assert [limiter.hit('ip')[0] for _ in range(4)] == [True, True, True, False]
+    allowed, retry_after = limiter.hit('ip')
+    assert not allowed and retry_after == pytest.approx(1.0)
+    assert limiter.stats() == {'allowed': 3, 'limited': 2}
+
+
+def test_bucket_refills_at_rate(clock):
+    limiter = RateLimiter('t', per_minute=60, burst=2)
+    limiter.hit('ip')
+    limiter.hit('ip')
+    assert not limiter.hit('ip')[0]
+    clock.now += 1.0
+    assert limiter.hit('ip')[0]
+    assert not limiter.hit('ip')[0]
+
+
+def test_buckets_are_per_key_and_shared_through_backend(clock):
+    backend = DictBackend()
+    one = RateLimiter('t', per_minute=60, burst=1, backend=backend)
+    two = RateLimiter('t', per_minute=60, burst=1, backend=backend)
+    assert one.hit('a')[0]
+    assert one.hit('b')[0]
+    assert not two.hit('a')[0]
+
+
+def test_coalescer_reuses_token_still_in_table():
+    tokens = ResetTokenCoalescer(ttl=3600)
+    tokens.remember('patient', 'a@example.com', 'tok', 'Ann')
+    assert tokens.outstanding('patient', 'a@example.com', still_valid=lambda token: True)['token'] == 'tok'
+    assert tokens.coalesced == 1
+
+
+def test_coalescer_drops_token_gone_from_table():
+    tokens = ResetTokenCoalescer(ttl=3600)
+    tokens.remember('patient', 'a@example.com', 'tok', 'Ann')
+    assert tokens.outstanding('patient', 'a@example.com', still_valid=lambda token: None) is None
+    assert tokens.outstanding('patient', 'a@example.com') is None
+    assert tokens.stale == 1
+
+
+@pytest.mark.parametrize('table, column', [
+    ('password_resets; DROP TABLE patients', 'expires_at'),
+    ('password_resets', 'expires_at < NOW() OR 1'),
+    ('', 'expires_at'),
+])
+def test_sweeper_rejects_non_identifiers(table, column):
+    with pytest.raises(ValueError):
+        ExpiredTokenSweeper(None, table=table, expires_column=column)
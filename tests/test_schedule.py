@@ -0,0 +1,86 @@
+from datetime import date, datetime, timedelta
+
+from controllers.schedule import DaySchedule, ScheduleIndex, day_key
+
+
+def row(appointment_id, hour, status='Scheduled'):
+    return {'appointment_id': appointment_id, 'appointment_time': timedelta(hours=hour), 'status': status}
+
+
+class FakeShards:
+    sharded = False
+
+
+class FakeMySQL:
+    """Answers DAY_QUERY and ARCHIVE_DAY_QUERY from two row lists"""
+
+    shards = FakeShards()
+
+    def __init__(self, hot, archived=()):
+        self.hot = hot
+        self.archived = list(archived)
+        self.queries = []
+
+    @property
+    def primary_connection(self):
+        return self
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params):
+        archive = 'appointments_archive' in sql
+        self.queries.append('archive' if archive else 'hot')
+        self.rows = self.archived if archive else self.hot
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def close(self):
+        pass
+
+
+def test_day_key_normalizes():
+    assert day_key(date(2024, 3, 1)) == '2024-03-01'
+    assert day_key(datetime(2024, 3, 1, 10)) == '2024-03-01'
+    assert day_key('2024-03-01') == '2024-03-01'
+
+
+def test_rows_sorted_and_filtered_by_status():
+    day = DaySchedule([row(2, 11, 'Completed'), row(1, 9), row(3, 10, 'Cancelled')])
+    assert [r['appointment_id'] for r in day.rows] == [1, 3, 2]
+    assert [r['appointment_id'] for r in day.select('Completed')] == [2]
+    assert [r['appointment_id'] for r in day.select()] == [1, 3, 2]
+    assert day.counts() == {'Scheduled': 1, 'Completed': 1, 'Cancelled': 1}
+
+
+def test_set_status_moves_bit():
+    day = DaySchedule([row(1, 9), row(2, 10)])
+    assert day.set_status(2, 'Cancelled')
+    assert day.select('Scheduled') == [day.rows[0]]
+    assert [r['appointment_id'] for r in day.select('Cancelled')] == [2]
+    assert not day.set_status(99, 'Cancelled')
+
+
+def test_add_reindexes_and_ignores_duplicates():
+    day = DaySchedule([row(1, 10)])
+    day.add(row(2, 9))
+    day.add(row(2, 9))
+    assert [r['appointment_id'] for r in day.select('Scheduled')] == [2, 1]
+
+
+def test_index_caches_days():
+    mysql = FakeMySQL([row(1, 9)])
+    index = ScheduleIndex(mysql)
+    index.lookup(1, '2024-03-01')
+    index.lookup(1, '2024-03-01')
+    assert mysql.queries == ['hot']
+    assert index.stats()['hits'] == 1
+
+
+def test_archived_days_also_read_archive():
+    mysql = FakeMySQL([row(1, 10)], archived=[row(2, 9, 'Completed')])
+    index = ScheduleIndex(mysql, archived_before=lambda: date(2024, 1, 1))
+    assert [r['appointment_id'] for r in index.lookup(1, '2023-06-01')] == [2, 1]
+    index.lookup(1, '2024-06-01')
+    assert mysql.queries == ['hot', 'archive', 'hot']
@@ -0,0 +1,71 @@
+from flask import Flask, session
+
+from controllers.cache import DictBackend
+from controllers.sessions import ServerSessionInterface, SessionStore
+
+
+def make_app(store):
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.session_interface = ServerSessionInterface(store)
+
+    @app.route('/login/<int:user_id>')
+    def login(user_id):
+        session['user_type'] = 'doctor'
+        session['user_id'] = user_id
+        return 'ok'
+
+    @app.route('/whoami')
+    def whoami():
+        return str(session.get('user_id'))
+
+    return app
+
+
+def test_store_round_trip_and_sweep():
+    store = SessionStore(lifetime=60, sweep_interval=0)
+    store.save('a', {'user_type': 'patient', 'user_id': 1})
+    assert store.load('a') == {'user_type': 'patient', 'user_id': 1}
+    store._entries['a'] = ({}, 0, 'patient:1')
+    assert store.sweep() == 1
+    assert store.load('a') is None
+
+
+def test_shared_tier_is_seen_by_another_process():
+    backend = DictBackend()
+    SessionStore(backend=backend, sweep_interval=0).save('a', {'user_type': 'doctor', 'user_id': 2})
+    assert SessionStore(backend=backend, sweep_interval=0).load('a')['user_id'] == 2
+
+
+def test_revoke_user_reaches_sessions_saved_by_other_processes():
+    backend = DictBackend()
+    one = SessionStore(backend=backend, sweep_interval=0)
+    two = SessionStore(backend=backend, sweep_interval=0)
+    one.save('a', {'user_type': 'doctor', 'user_id': 3})
+    two.save('b', {'user_type': 'doctor', 'user_id': 3})
+    two.save('c', {'user_type': 'doctor', 'user_id': 4})
+    assert one.revoke_user('doctor', '3') == 2
+    assert backend.get('session:b') is None
+    assert backend.get('session:c') is not None
+
+
+def test_login_issues_fresh_session_id():
+    store = SessionStore(sweep_interval=0)
+    client = make_app(store).test_client()
+    client.get('/whoami')
+    client.get('/login/5')
+    first = client.get_cookie('session').value
+    client.get('/login/6')
+    second = client.get_cookie('session').value
+    assert first != second
+    assert store.load(first) is None
+    assert client.get('/whoami').text == '6'
+
+
+def test_revoked_user_is_logged_out():
+    store = SessionStore(sweep_interval=0)
+    client = make_app(store).test_client()
+    client.get('/login/7')
+    assert client.get('/whoami').text == '7'
+    store.revoke_user('doctor', 7)
+    assert client.get('/whoami').text == 'None'
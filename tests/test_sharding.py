@@ -0,0 +1,183 @@
+import re
+
+import pytest
+
+from database.sharding import BUCKETS, Resharder, ShardMoving, ShardRouter, bucket_of
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rowcount = 0
+        self._rows = []
+
+    def execute(self, sql, params=None):
+        sql = ' '.join(sql.split())
+        self._rows, self.rowcount = self.db.run(sql, params or ()), 0
+        if isinstance(self._rows, int):
+            self.rowcount, self._rows = self._rows, []
+
+    def executemany(self, sql, rows):
+        for params in rows:
+            self.execute(sql, params)
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def close(self):
+        pass
+
+
+class FakeDatabase:
+    """Just enough SQL for the router and the resharder, over dicts"""
+
+    def __init__(self, tables=None, buckets=None):
+        self.tables = {name: [dict(row) for row in rows] for name, rows in (tables or {}).items()}
+        self.buckets = dict(buckets or {})
+        self.states = []
+        self.connect_args = {'host': 'fake'}
+
+    def acquire(self):
+        return self
+
+    def release(self, conn):
+        pass
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def run(self, sql, params):
+        if sql.startswith('SELECT bucket, shard, state FROM shard_buckets'):
+            return [{'bucket': b, 'shard': s, 'state': state} for b, (s, state) in self.buckets.items()]
+        if sql.startswith('INSERT INTO shard_buckets'):
+            bucket, shard, state = params
+            self.buckets[bucket] = (shard, state)
+            self.states.append((bucket, shard, state))
+            return 0
+        if 'information_schema.COLUMNS' in sql:
+            rows = self.tables.get(params[0])
+            return [{'COLUMN_NAME': column} for column in rows[0]] if rows else []
+        match = re.match(r'SELECT (.+) FROM (\w+) WHERE (\w+) > %s AND MOD\(patient_id, %s\) = %s', sql)
+        if match:
+            table, key = match.group(2), match.group(3)
+            last, buckets, bucket, limit = params
+            rows = sorted((r for r in self.tables.get(table, []) if r[key] > last
+                           and r['patient_id'] % buckets == bucket), key=lambda r: r[key])
+            return rows[:limit]
+        match = re.match(r'SELECT patient_id FROM (\w+) WHERE (\w+) = %s', sql)
+        if match:
+            return [{'patient_id': r['patient_id']} for r in self.tables.get(match.group(1), [])
+                    if r[match.group(2)] == params[0]][:1]
+        match = re.match(r'INSERT INTO (\w+) \((.+?)\) VALUES', sql)
+        if match:
+            row = dict(zip(match.group(2).split(', '), params))
+            rows = self.tables.setdefault(match.group(1), [])
+            key = next(iter(row))
+            rows[:] = [r for r in rows if r[key] != row[key]] + [row]
+            return 1
+        match = re.match(r'DELETE FROM (\w+) WHERE MOD\(patient_id, %s\) = %s LIMIT %s', sql)
+        if match:
+            buckets, bucket, limit = params
+            rows = self.tables.get(match.group(1), [])
+            doomed = [r for r in rows if r['patient_id'] % buckets == bucket][:limit]
+            rows[:] = [r for r in rows if r not in doomed]
+            return len(doomed)
+        if sql.startswith('SELECT'):
+            return [dict(row) for row in self.tables.get('rows', [])]
+        raise AssertionError(f"unexpected SQL: {sql}")
+
+
+def make_router(shards, buckets=None):
+    router = ShardRouter(FakeDatabase(buckets=buckets), refresh=0)
+    router.pools = shards
+    return router
+
+
+def test_bucket_map_overrides_default_routing():
+    a, b = FakeDatabase(), FakeDatabase()
+    router = make_router([a, b], buckets={5: (0, 'active')})
+    assert router.index_for(7) == 1
+    assert router.index_for(6) == 0
+    assert router.index_for(5) == 0
+    assert router.index_for(5 + BUCKETS) == 0
+    assert router.pool_for(7) is b
+
+
+def test_locked_bucket_rejects_writes():
+    router = make_router([FakeDatabase(), FakeDatabase()], buckets={3: (1, 'locked')})
+    with pytest.raises(ShardMoving):
+        router.check_writable(3 + BUCKETS)
+    router.check_writable(4)
+
+
+def test_fan_out_merges_rows_in_key_order():
+    a = FakeDatabase({'rows': [{'n': 1}, {'n': 4}, {'n': 9}]})
+    b = FakeDatabase({'rows': [{'n': 2}, {'n': 3}, {'n': 10}]})
+    router = make_router([a, b])
+
+    cursor = router.everywhere(key=lambda row: row['n']).cursor()
+    assert cursor.execute("SELECT n FROM rows ORDER BY n") == 6
+    assert [row['n'] for row in cursor.fetchall()] == [1, 2, 3, 4, 9, 10]
+    assert router.fan_outs == 1
+
+    a.tables['rows'].reverse()
+    b.tables['rows'].reverse()
+    cursor = router.everywhere(key=lambda row: row['n'], reverse=True).cursor()
+    cursor.execute("SELECT n FROM rows ORDER BY n DESC")
+    assert [row['n'] for row in cursor.fetchall()] == [10, 9, 4, 3, 2, 1]
+
+
+def test_fan_out_refuses_writes():
+    cursor = make_router([FakeDatabase(), FakeDatabase()]).everywhere().cursor()
+    with pytest.raises(ValueError):
+        cursor.execute("UPDATE patients SET age = 1")
+
+
+def test_locate_finds_the_shard_holding_a_row():
+    b = FakeDatabase({'appointments': [{'appointment_id': 41, 'patient_id': 7}]})
+    router = make_router([FakeDatabase(), b])
+    assert router.locate('appointments', 'appointment_id', 41) == 7
+    assert router.locate('appointments', 'appointment_id', 42) is None
+
+
+def test_plan_evens_out_buckets():
+    router = make_router([FakeDatabase(), FakeDatabase()],
+                         buckets={bucket: (0, 'active') for bucket in range(BUCKETS)})
+    moves = Resharder(router, settle=0).plan()
+    assert len(moves) == BUCKETS // 2
+    assert {target for _, target in moves} == {1}
+    assert len({bucket for bucket, _ in moves}) == len(moves)
+
+
+def test_move_copies_locks_switches_and_deletes():
+    bucket = 5
+    other = 6
+    source = FakeDatabase({
+        'patients': [{'patient_id': bucket, 'full_name': 'A'}, {'patient_id': other, 'full_name': 'B'}],
+        'appointments': [{'appointment_id': 1, 'patient_id': bucket},
+                         {'appointment_id': 2, 'patient_id': other}],
+        'medical_records': [{'record_id': 1, 'patient_id': bucket}],
+        'medical_records_archive': [{'record_id': 2, 'patient_id': bucket + BUCKETS}],
+    })
+    target = FakeDatabase()
+    router = make_router([source, target],
+                         buckets={b: (0, 'active') for b in range(BUCKETS)})
+
+    copied = Resharder(router, batch_size=1, settle=0).move(bucket, 1)
+
+    assert copied == 8
+    assert [state for b, _, state in router.catalog.states if b == bucket] == ['copying', 'locked', 'active']
+    assert router.catalog.buckets[bucket] == (1, 'active')
+    assert [r['patient_id'] for r in target.tables['patients']] == [bucket]
+    assert [r['appointment_id'] for r in target.tables['appointments']] == [1]
+    assert [r['record_id'] for r in target.tables['medical_records']] == [1]
+    assert [r['record_id'] for r in target.tables['medical_records_archive']] == [2]
+    assert 'appointments_archive' not in target.tables
+    assert all(bucket_of(r['patient_id']) != bucket for rows in source.tables.values() for r in rows)
+    assert [r['patient_id'] for r in source.tables['patients']] == [other]
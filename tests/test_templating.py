@@ -0,0 +1,123 @@
+import pytest
+from flask import Flask, render_template_string, session
+from jinja2 import TemplateSyntaxError
+
+from controllers import instrumentation, templating
+from controllers.cache import DictBackend
+
+
+class Stamps:
+    def __init__(self):
+        self.versions = {}
+
+    def get(self, keys):
+        return [self.versions.get(key, 0) for key in keys]
+
+
+def make_app(tmp_path, backend=None):
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.config['TEMPLATE_BYTECODE_DIR'] = str(tmp_path / 'bytecode')
+    stamps = Stamps()
+    cache = templating.init_app(app, stamps, backend=backend)
+    return app, stamps, cache
+
+
+TEMPLATE = "{% cache 'list', fragment_version('records', 1) %}{{ render() }}{% endcache %}"
+
+
+def test_cache_tag_requires_a_version(tmp_path):
+    app, _, _ = make_app(tmp_path)
+    with pytest.raises(TemplateSyntaxError, match='needs a version'):
+        app.jinja_env.from_string("{% cache 'list' %}x{% endcache %}")
+
+
+def test_fragment_is_reused_until_its_version_moves(tmp_path):
+    app, stamps, _ = make_app(tmp_path)
+    renders = []
+
+    def render():
+        renders.append(1)
+        return len(renders)
+
+    with app.test_request_context():
+        assert render_template_string(TEMPLATE, render=render) == '1'
+        assert render_template_string(TEMPLATE, render=render) == '1'
+        stamps.versions[('records', 1)] = 7
+        assert render_template_string(TEMPLATE, render=render) == '2'
+
+
+def test_fragments_are_per_viewer(tmp_path):
+    app, _, _ = make_app(tmp_path)
+    with app.test_request_context():
+        session.update(user_type='doctor', user_id=1)
+        assert render_template_string(TEMPLATE, render=lambda: 'doctor 1') == 'doctor 1'
+    with app.test_request_context():
+        session.update(user_type='doctor', user_id=2)
+        assert render_template_string(TEMPLATE, render=lambda: 'doctor 2') == 'doctor 2'
+
+
+def test_fragments_are_shared_through_the_backend(tmp_path):
+    backend = DictBackend()
+    one, _, _ = make_app(tmp_path, backend)
+    two, _, _ = make_app(tmp_path, backend)
+    with one.test_request_context():
+        render_template_string(TEMPLATE, render=lambda: '<b>one</b>')
+    with two.test_request_context():
+        assert render_template_string(TEMPLATE, render=lambda: 'two') == '&lt;b&gt;one&lt;/b&gt;'
+
+
+@pytest.fixture
+def metrics_client(tmp_path):
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.config['PERF_INSTRUMENTATION'] = True
+    app.config['METRICS_TOKEN'] = 'scrape-me'
+    app.config['METRICS_ALLOW'] = '10.0.0.9'
+
+    class Pool:
+        connect_args = {}
+
+        def stats(self):
+            return {}
+
+    class MySQL:
+        pool = Pool()
+
+    instrumentation.init_app(app, MySQL())
+
+    @app.route('/login/<user_type>')
+    def login(user_type):
+        session['user_type'] = user_type
+        session['user_id'] = 1
+        return 'ok'
+
+    return app.test_client()
+
+
+@pytest.mark.parametrize('path', ['/metrics/templates', '/metrics/slow-queries'])
+def test_template_and_query_samples_need_an_admin(metrics_client, path):
+    assert metrics_client.get(path).status_code == 403
+    metrics_client.get('/login/doctor')
+    assert metrics_client.get(path).status_code == 403
+    metrics_client.get('/login/admin')
+    assert metrics_client.get(path).status_code == 200
+
+
+def test_prometheus_endpoint_needs_token_allowlist_or_admin(metrics_client):
+    # Loopback is what every client looks like behind a local proxy
+    assert metrics_client.get('/metrics').status_code == 403
+    assert metrics_client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    assert metrics_client.get('/metrics', headers={'Authorization': 'Bearer scrape-me'}).status_code == 200
+    assert metrics_client.get('/metrics', environ_base={'REMOTE_ADDR': '10.0.0.9'}).status_code == 200
+    metrics_client.get('/login/admin')
+    assert metrics_client.get('/metrics').status_code == 200
+
+
+def test_prometheus_endpoint_exposes_request_metrics(metrics_client):
+    metrics_client.get('/login/doctor')
+    body = metrics_client.get('/metrics', headers={'Authorization': 'Bearer scrape-me'}).get_data(as_text=True)
+    assert 'medilink_requests_total{endpoint="login",status="200"}' in body
+    assert 'medilink_request_duration_seconds_count{endpoint="login"}' in body
+    assert '# TYPE medilink_request_db_seconds histogram' in body
+    assert 'endpoint="metrics"' not in body